@@ -8,4 +8,6 @@ admin.site.register(Listing)
 admin.site.register(Bid)
 admin.site.register(Comment)
 admin.site.register(Watchlist)
-admin.site.register(Category)
\ No newline at end of file
+admin.site.register(Category)
+admin.site.register(Job)
+admin.site.register(ListingImport)
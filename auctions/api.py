@@ -0,0 +1,341 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_http_methods
+
+from .models import Listing, ListingImport, Watchlist
+from .forms import NewListingForm, NewBidForm, NewCommentForm
+from .bids import place_bid, bid_history
+from .browse import parse_browse
+from .cache import get_version, get_versions, last_modified
+from .feeds import listing_feed, comment_feed
+from .watchlists import bulk_update, BULK_LIMIT
+from .imports import queue_import, ImportFailed
+from . import categories, events
+
+# most listings a batch request may ask for
+BATCH_LIMIT = 100
+# primary keys are BigAutoFields; larger ids fail in the database instead of matching nothing
+MAX_ID = 2 ** 63 - 1
+# most rows an import request may hold; larger catalogs go through manage.py import_listings
+IMPORT_LIMIT = 5000
+
+
+def _decimal(value):
+    return None if value is None else f'{value:.2f}'
+
+
+def _datetime(value):
+    return value.isoformat() if value else None
+
+
+# serializers per field; clients pick a subset with ?fields=id,item,current_price
+LISTING_FIELDS = {
+    'id': lambda listing: listing.id,
+    'item': lambda listing: listing.item,
+    'description': lambda listing: listing.description,
+    'starting_bid': lambda listing: _decimal(listing.starting_bid),
+    'current_price': lambda listing: _decimal(listing.current_price),
+    'bid_count': lambda listing: listing.bid_count,
+    'last_bid_at': lambda listing: _datetime(listing.last_bid_at),
+    'closed': lambda listing: listing.closed,
+    'starts_at': lambda listing: _datetime(listing.starts_at),
+    'ends_at': lambda listing: _datetime(listing.ends_at),
+    'category': lambda listing: listing.category_id,
+    'seller': lambda listing: listing.seller.username,
+    'image': lambda listing: listing.img.url if listing.img else None,
+}
+
+BID_FIELDS = {
+    'id': lambda bid: bid.id,
+    'bidder': lambda bid: bid.bidder.username if bid.bidder else None,
+    'bid': lambda bid: _decimal(bid.bid),
+    'created': lambda bid: _datetime(bid.created),
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.id,
+    'author': lambda comment: comment.author.username if comment.author else None,
+    'comment': lambda comment: comment.comment,
+    'created_at': lambda comment: _datetime(comment.created_at),
+}
+
+
+def _fields(request, available):
+    # unknown names are ignored; no usable names means every field
+    requested = [name for name in request.GET.get('fields', '').split(',') if name in available]
+    return requested or list(available)
+
+
+def _serialize(obj, fields, available):
+    return {name: available[name](obj) for name in fields}
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _is_id(value):
+    # json true and false are ints to isinstance
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_ID
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _unauthorized():
+    return _error("You must be logged in", 401)
+
+
+def _from_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+# validators come from the cached versions alone, so a matching If-None-Match or
+# If-Modified-Since is answered 304 before the view touches the database
+
+def _listing_etag(resource):
+    def etag(request, listing_id):
+        return f"{resource}-{listing_id}-{get_version('listing', listing_id)}-{request.GET.urlencode()}"
+    return etag
+
+
+def _listing_modified(request, listing_id):
+    return _from_timestamp(last_modified('listing', listing_id))
+
+
+def _listings_scope(request):
+    category = request.GET.get('category', '')
+    return ('category', int(category)) if category.isdigit() else ('catalog', '')
+
+
+def _listings_etag(request):
+    return f"listings-{get_version(*_listings_scope(request))}-{request.GET.urlencode()}"
+
+
+def _listings_modified(request):
+    return _from_timestamp(last_modified(*_listings_scope(request)))
+
+
+def _batch_ids(request):
+    # None when a part isn't an id; isdigit() alone also takes characters like '²' that int() refuses
+    ids = []
+    for part in filter(None, (part.strip() for part in request.GET.get('ids', '').split(','))):
+        ident = int(part) if part.isascii() and part.isdigit() else None
+        if not _is_id(ident):
+            return None
+        ids.append(ident)
+    return list(dict.fromkeys(ids))[:BATCH_LIMIT]
+
+
+def _batch_etag(request):
+    ids = _batch_ids(request)
+    if ids is None:
+        return None
+    versions = get_versions('listing', ids)
+    state = ','.join(f'{ident}:{version}' for ident, version in versions.items())
+    return hashlib.sha1(f"{state}|{request.GET.get('fields', '')}".encode()).hexdigest()
+
+
+@require_http_methods(["GET", "HEAD", "POST"])
+@condition(etag_func=_listings_etag, last_modified_func=_listings_modified)
+def listings(request):
+    if request.method == "POST":
+        return _create_listing(request)
+    browse, _ = parse_browse(request.GET)
+    scope, category = _listings_scope(request)
+    queryset = Listing.objects.select_related('seller')
+    if scope == 'category':
+        queryset = queryset.filter(category=category)
+    page = listing_feed(browse.apply(queryset), request.GET.get('cursor'), ordering=browse.ordering)
+    fields = _fields(request, LISTING_FIELDS)
+    return JsonResponse({
+        'results': [_serialize(listing, fields, LISTING_FIELDS) for listing in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+def _create_listing(request):
+    if not request.user.is_authenticated:
+        return _unauthorized()
+    data = _json_body(request)
+    if data is None:
+        return _error("Request body must be a JSON object", 400)
+    form = NewListingForm(dict(data, seller=request.user.id))
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    listing = form.save()
+    return JsonResponse(_serialize(listing, LISTING_FIELDS, LISTING_FIELDS), status=201)
+
+
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=_batch_etag)
+def listings_batch(request):
+    # many listings in one round trip: ?ids=1,2,3 in the requested order
+    ids = _batch_ids(request)
+    if ids is None:
+        return _error("ids must be a comma separated list of listing ids", 400)
+    found = Listing.objects.select_related('seller').in_bulk(ids)
+    fields = _fields(request, LISTING_FIELDS)
+    return JsonResponse({
+        'results': [_serialize(found[ident], fields, LISTING_FIELDS) for ident in ids if ident in found],
+        'missing': [ident for ident in ids if ident not in found],
+    })
+
+
+def _import_status(importing):
+    # the result keys (created, rejected, errors, truncated or error) appear once the import has run
+    return dict({
+        'id': importing.id,
+        'status': importing.status,
+        'url': reverse('api listings import status', args=[importing.id]),
+    }, **importing.result)
+
+
+@require_http_methods(["POST"])
+def listings_import(request):
+    # multipart upload: file, a CSV or JSONL file of listings with the create form's fields,
+    # and images, a zip archive of the files named in the img column. a large catalog takes
+    # longer than a request may, so the rows are imported by the worker: the answer is 202 and
+    # the import's url, which reports the outcome once it has run. valid rows are created
+    # even when others are rejected; rows past IMPORT_LIMIT are left out, counted in skipped
+    if not request.user.is_authenticated:
+        return _unauthorized()
+    upload = request.FILES.get('file')
+    if upload is None:
+        return _error("Upload the listings as file", 400)
+    try:
+        importing = queue_import(request.user, upload, request.FILES.get('images'), limit=IMPORT_LIMIT)
+    except ImportFailed as error:
+        return _error(str(error), 400)
+    status = _import_status(importing)
+    response = JsonResponse(status, status=202)
+    response['Location'] = status['url']
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def listings_import_status(request, import_id):
+    if not request.user.is_authenticated:
+        return _unauthorized()
+    importing = ListingImport.objects.filter(pk=import_id, seller=request.user).first()
+    if importing is None:
+        return _error("Import not found", 404)
+    return JsonResponse(_import_status(importing))
+
+
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=_listing_etag('listing'), last_modified_func=_listing_modified)
+def listing(request, listing_id):
+    listing = Listing.objects.select_related('seller').filter(pk=listing_id).first()
+    if listing is None:
+        return _error("Listing not found", 404)
+    return JsonResponse(_serialize(listing, _fields(request, LISTING_FIELDS), LISTING_FIELDS))
+
+
+@require_http_methods(["GET", "HEAD", "POST"])
+@condition(etag_func=_listing_etag('bids'), last_modified_func=_listing_modified)
+def listing_bids(request, listing_id):
+    if not Listing.objects.filter(pk=listing_id).exists():
+        return _error("Listing not found", 404)
+    if request.method == "POST":
+        if not request.user.is_authenticated:
+            return _unauthorized()
+        data = _json_body(request)
+        if data is None:
+            return _error("Request body must be a JSON object", 400)
+        form = NewBidForm({'bid': data.get('bid'), 'bidder': request.user.id})
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        result = place_bid(listing_id, request.user, form.cleaned_data['bid'])
+        if not result.accepted:
+            return _error(result.message, 409)
+        return JsonResponse(_serialize(result.bid, BID_FIELDS, BID_FIELDS), status=201)
+    fields = _fields(request, BID_FIELDS)
+    return JsonResponse({'results': [_serialize(bid, fields, BID_FIELDS) for bid in bid_history(listing_id)]})
+
+
+@require_http_methods(["GET", "HEAD", "POST"])
+@condition(etag_func=_listing_etag('comments'), last_modified_func=_listing_modified)
+def listing_comments(request, listing_id):
+    if not Listing.objects.filter(pk=listing_id).exists():
+        return _error("Listing not found", 404)
+    if request.method == "POST":
+        if not request.user.is_authenticated:
+            return _unauthorized()
+        data = _json_body(request)
+        if data is None:
+            return _error("Request body must be a JSON object", 400)
+        form = NewCommentForm({'comment': data.get('comment'), 'auction': listing_id, 'author': request.user.id})
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        comment = form.save()
+        events.publish(listing_id, 'comment', author=str(comment.author), comment=comment.comment)
+        return JsonResponse(_serialize(comment, COMMENT_FIELDS, COMMENT_FIELDS), status=201)
+    page = comment_feed(listing_id, request.GET.get('cursor'))
+    fields = _fields(request, COMMENT_FIELDS)
+    return JsonResponse({
+        'results': [_serialize(comment, fields, COMMENT_FIELDS) for comment in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@require_http_methods(["GET", "POST"])
+def watchlist(request):
+    if not request.user.is_authenticated:
+        return _unauthorized()
+    if request.method == "POST":
+        data = _json_body(request)
+        listing_id = data.get('listing') if data else None
+        if not _is_id(listing_id) or not Listing.objects.filter(pk=listing_id).exists():
+            return _error("Unknown listing", 400)
+        Watchlist.objects.get_or_create(user=request.user, listing_id=listing_id)
+        return JsonResponse({'listing': listing_id}, status=201)
+    watched = Listing.objects.filter(watchlist__user=request.user).select_related('seller')
+    page = listing_feed(watched, request.GET.get('cursor'))
+    fields = _fields(request, LISTING_FIELDS)
+    return JsonResponse({
+        'results': [_serialize(listing, fields, LISTING_FIELDS) for listing in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@require_http_methods(["POST"])
+def watchlist_bulk(request):
+    # {"add": [ids], "remove": [ids]} applied as one insert and one delete
+    if not request.user.is_authenticated:
+        return _unauthorized()
+    data = _json_body(request)
+    if data is None:
+        return _error("Request body must be a JSON object", 400)
+    add, remove = data.get('add', []), data.get('remove', [])
+    if not all(isinstance(ids, list) and all(_is_id(i) for i in ids) for ids in (add, remove)):
+        return _error("add and remove must be lists of listing ids", 400)
+    if len(add) + len(remove) > BULK_LIMIT:
+        return _error(f"At most {BULK_LIMIT} listings per request", 400)
+    added, removed = bulk_update(request.user, add, remove)
+    return JsonResponse({'added': added, 'removed': removed})
+
+
+@require_http_methods(["DELETE"])
+def watchlist_item(request, listing_id):
+    if not request.user.is_authenticated:
+        return _unauthorized()
+    request.user.watchlist.filter(listing=listing_id).delete()
+    return HttpResponse(status=204)
+
+
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=lambda request: f"categories-{categories.get_version()}")
+def category_list(request):
+    return JsonResponse({'results': [
+        {'id': category.id, 'category': category.category} for category in categories.get_categories()
+    ]})
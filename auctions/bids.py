@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Max, Q, Value, When
+from django.utils import timezone
+
+from .models import Listing, Bid
+from . import jobs, events
+from .cache import invalidate_listing
+
+# possible outcomes of a bid attempt
+ACCEPTED = 'accepted'
+BELOW_STARTING = 'below_starting'
+OUTBID = 'outbid'
+CLOSED = 'closed'
+NOT_STARTED = 'not_started'
+
+MESSAGES = {
+    BELOW_STARTING: "Bid must exceed starting bid and current bid",
+    OUTBID: "Bid must exceed current",
+    CLOSED: "This auction is closed",
+    NOT_STARTED: "This auction has not started yet",
+}
+
+# anti-sniping: a bid this close to the end pushes the end time out to this long after the bid
+SNIPE_WINDOW = timedelta(minutes=5)
+
+
+class BidResult:
+    def __init__(self, outcome, bid=None):
+        self.outcome = outcome
+        self.bid = bid
+
+    @property
+    def accepted(self):
+        return self.outcome == ACCEPTED
+
+    @property
+    def message(self):
+        return MESSAGES.get(self.outcome, "")
+
+    def __repr__(self):
+        return f"<BidResult {self.outcome}>"
+
+
+class _Rejected(Exception):
+    # raised inside the transaction to roll back the inserted bid row
+    def __init__(self, result):
+        self.result = result
+
+
+def _check(listing, amount, current_amount, now):
+    # an expired listing the closer has not swept yet is already closed to bidders
+    if listing.closed or (listing.ends_at and listing.ends_at <= now):
+        return BidResult(CLOSED)
+    if listing.starts_at > now:
+        return BidResult(NOT_STARTED)
+    if amount <= listing.starting_bid:
+        return BidResult(BELOW_STARTING)
+    if amount <= current_amount:
+        return BidResult(OUTBID)
+    return None
+
+
+def place_bid(listing_id, bidder, amount):
+    try:
+        with transaction.atomic():
+            return _place_bid(listing_id, bidder, amount)
+    except _Rejected as rejected:
+        return rejected.result
+
+
+def _place_bid(listing_id, bidder, amount):
+    now = timezone.now()
+    listing = Listing.objects.get(pk=listing_id)
+    rejected = _check(listing, amount, listing.current_price if listing.bid_count else 0, now)
+    if rejected:
+        return rejected
+
+    bid = Bid.objects.create(auction_id=listing_id, bidder=bidder, bid=amount)
+
+    # a single conditional update: it only matches while the listing is open and our amount
+    # still beats the price, so concurrent bidders serialize on the row lock and the database
+    # re-checks the condition for whoever waited. current_price starts at the starting bid,
+    # so this also enforces the starting price. the anti-sniping extension is part of the same
+    # statement, so the closer (which re-checks ends_at under the same row lock) never closes
+    # an auction whose last-second bid extended it.
+    extended_end = now + SNIPE_WINDOW
+    updated = Listing.objects.filter(
+        Q(ends_at__isnull=True) | Q(ends_at__gt=now),
+        pk=listing_id, closed=False, starts_at__lte=now, current_price__lt=amount,
+    ).update(
+        current_bid=bid,
+        current_price=amount,
+        bid_count=F('bid_count') + 1,
+        last_bid_at=bid.created,
+        ends_at=Case(When(ends_at__lt=extended_end, then=Value(extended_end)), default=F('ends_at')),
+    )
+    if updated:
+        return _accepted(listing, bid)
+
+    # somebody got there first: report against the state that won and roll our row back
+    listing = Listing.objects.get(pk=listing_id)
+    raise _Rejected(_check(listing, amount, listing.current_price if listing.bid_count else 0, now) or BidResult(OUTBID))
+
+
+def _accepted(listing, bid):
+    invalidate_listing(listing.id, listing.category_id)
+    # notifications go through the job queue so the request only pays for the bid itself
+    jobs.enqueue('bid_placed', listing_id=listing.id, bid_id=bid.id)
+    events.publish(listing.id, 'bid', amount=f"{bid.bid:.2f}")
+    return BidResult(ACCEPTED, bid)
+
+
+# ledger queries, served by the (auction, -bid) and (bidder, -created) indexes
+
+def bid_history(listing, limit=20):
+    return Bid.objects.filter(auction=listing).select_related('bidder').order_by('-bid')[:limit]
+
+def highest_bids_by_user(listing):
+    # leaderboard: each bidder's best bid on the listing, highest first
+    return (Bid.objects.filter(auction=listing)
+            .values('bidder', 'bidder__username')
+            .annotate(highest=Max('bid'))
+            .order_by('-highest'))
+
+def bids_by_user(user, limit=20):
+    return Bid.objects.filter(bidder=user).select_related('auction').order_by('-created')[:limit]
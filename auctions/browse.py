@@ -0,0 +1,85 @@
+from django import forms
+from django.utils.http import urlencode
+
+# whitelist of sort options: name -> (label, ordering). every ordering ends with the primary key,
+# so keyset pagination stays total, and is backed by the listing indexes on
+# (category, closed, current_price, id), (category, closed, -id) and (ends_at, id)
+SORTS = {
+    'newest': ('Newest first', ('-id',)),
+    'price': ('Lowest price', ('current_price', 'id')),
+    'price_desc': ('Highest price', ('-current_price', '-id')),
+    # only listings with an end time, served by the partial (ends_at, id) index
+    'ending': ('Ending soonest', ('ends_at', 'id')),
+}
+# search results are also sortable by rank, which search_listings annotates
+SEARCH_SORTS = {'relevance': ('Best match', ('-rank', '-id')), **SORTS}
+
+OPEN = 'open'
+CLOSED = 'closed'
+
+
+class BrowseForm(forms.Form):
+    sort = forms.ChoiceField(required=False)
+    status = forms.ChoiceField(required=False, choices=[
+        ('', 'Open and closed'),
+        (OPEN, 'Open only'),
+        (CLOSED, 'Closed only'),
+    ])
+    min_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    max_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+
+    def __init__(self, *args, sorts=SORTS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['sort'].choices = [(name, label) for name, (label, _) in sorts.items()]
+
+
+class BrowseQuery:
+    def __init__(self, sort, status, min_price, max_price, sorts=SORTS):
+        self.sort = sort
+        self.status = status
+        self.min_price = min_price
+        self.max_price = max_price
+        self.ordering = sorts[sort][1]
+
+    def apply(self, queryset):
+        if self.sort == 'ending':
+            queryset = queryset.filter(ends_at__isnull=False)
+        if self.status == OPEN:
+            queryset = queryset.filter(closed=False)
+        elif self.status == CLOSED:
+            queryset = queryset.filter(closed=True)
+        if self.min_price is not None:
+            queryset = queryset.filter(current_price__gte=self.min_price)
+        if self.max_price is not None:
+            queryset = queryset.filter(current_price__lte=self.max_price)
+        return queryset
+
+    @property
+    def key(self):
+        # normalized cache key: equivalent query strings (defaults spelled out or not, 10 vs 10.00) share it
+        return '|'.join([
+            self.sort,
+            self.status,
+            '' if self.min_price is None else f'{self.min_price:.2f}',
+            '' if self.max_price is None else f'{self.max_price:.2f}',
+        ])
+
+    @property
+    def params(self):
+        # query string for pager links, leaving out unset filters
+        params = {'sort': self.sort, 'status': self.status, 'min_price': self.min_price, 'max_price': self.max_price}
+        return urlencode({name: value for name, value in params.items() if value not in (None, '')})
+
+
+def parse_browse(params, sorts=SORTS):
+    # invalid or unknown parameters are dropped rather than rejected, the rest still apply
+    form = BrowseForm(params, sorts=sorts)
+    form.is_valid()
+    data = form.cleaned_data
+    return BrowseQuery(
+        sort=data.get('sort') or next(iter(sorts)),
+        status=data.get('status') or '',
+        min_price=data.get('min_price'),
+        max_price=data.get('max_price'),
+        sorts=sorts,
+    ), form
@@ -0,0 +1,198 @@
+import asyncio
+import math
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from . import replicas
+
+# rendered fragments are keyed on a version, so they only expire to free memory
+FRAGMENT_TIMEOUT = 60 * 60
+# seconds a recompute may hold a key's lock before another request may take over
+LOCK_TIMEOUT = 10
+# how long a request that missed waits for another request's recompute, polling every LOCK_POLL
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.05
+# how eagerly hits refresh a key ahead of its expiry, 1 is the usual choice
+EARLY_REFRESH_BETA = 1.0
+
+
+def _version_key(scope, ident):
+    return f'auctions:version:{scope}:{ident}'
+
+
+def _modified_key(scope, ident):
+    return f'auctions:modified:{scope}:{ident}'
+
+
+def get_version(scope, ident=''):
+    key = _version_key(scope, ident)
+    version = cache.get(key)
+    if version is None:
+        # seed with a timestamp so a flushed cache never reuses an older version number
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope, ident=''):
+    key = _version_key(scope, ident)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+    cache.set(_modified_key(scope, ident), int(time.time()), timeout=None)
+
+
+def get_versions(scope, idents):
+    # versions for many idents in one cache round trip, {ident: version}
+    keys = {_version_key(scope, ident): ident for ident in idents}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for ident in idents:
+        if ident not in versions:
+            versions[ident] = get_version(scope, ident)
+    return versions
+
+
+def last_modified(scope, ident=''):
+    # unix time of the last bump; unknown scopes count as modified now, which never yields a wrong 304
+    key = _modified_key(scope, ident)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, int(time.time()), timeout=None)
+        modified = cache.get(key)
+    return modified
+
+
+def _fragment_suffix(parts):
+    return ':'.join(str(part) for part in parts)
+
+
+def fragment_key(name, scope, ident='', *parts):
+    # cache key for a fragment that is valid as long as the (scope, ident) version is unchanged
+    return f'auctions:{name}:{scope}:{ident}:{get_version(scope, ident)}:{_fragment_suffix(parts)}'
+
+
+def _fragment_keys(name, scope, ident, parts):
+    latest = f'auctions:{name}:{scope}:{ident}:latest:{_fragment_suffix(parts)}'
+    return fragment_key(name, scope, ident, *parts), latest
+
+
+def cached_fragment(compute, name, scope, ident='', *parts):
+    # a fragment valid while the (scope, ident) version is unchanged. the latest copy of every
+    # version is also kept under a version-less key, served while the new version is rebuilt
+    key, latest = _fragment_keys(name, scope, ident, parts)
+    return remember(key, compute, stale_key=latest)
+
+
+async def acached_fragment(compute, name, scope, ident='', *parts):
+    key, latest = await sync_to_async(_fragment_keys)(name, scope, ident, parts)
+    return await aremember(key, compute, stale_key=latest)
+
+
+def _store(key, compute, timeout, stale_key):
+    start = time.perf_counter()
+    value = compute()
+    cost = time.perf_counter() - start
+    timeout = replicas.cache_timeout(timeout)
+    expires = None if timeout is None else time.time() + timeout
+    cache.set(key, (value, cost, expires), timeout)
+    if stale_key:
+        cache.set(stale_key, value, timeout)
+    return value
+
+
+def _recompute(key, compute, timeout, stale_key):
+    # None when another request holds the key's lock
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        return None
+    try:
+        return _store(key, compute, timeout, stale_key)
+    finally:
+        cache.delete(lock)
+
+
+def _refresh_early(cost, expires):
+    # probabilistic early expiration (XFetch): the closer to expiry and the costlier the
+    # recompute, the likelier a hit refreshes ahead of time, so hot keys rarely expire at all
+    if expires is None:
+        return False
+    return time.time() - cost * EARLY_REFRESH_BETA * math.log(1 - random.random()) >= expires
+
+
+def remember(key, compute, timeout=FRAGMENT_TIMEOUT, stale_key=None):
+    # the cached value of key, computed and stored on a miss. of the requests missing a key at
+    # the same time one recomputes under a short lock; the others serve the stale copy under
+    # stale_key if there is one, or else wait for the result. so a bid on a hot listing costs
+    # one rebuild instead of one per concurrent viewer. compute must not return None
+    entry = cache.get(key)
+    if entry is not None:
+        value, cost, expires = entry
+        if _refresh_early(cost, expires):
+            # one request refreshes, the rest keep serving the current value
+            refreshed = _recompute(key, compute, timeout, stale_key)
+            return value if refreshed is None else refreshed
+        return value
+
+    value = _recompute(key, compute, timeout, stale_key)
+    if value is not None:
+        return value
+    if stale_key and not replicas.read_your_writes():
+        value = cache.get(stale_key)
+        if value is not None:
+            return value
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    # the lock holder is slow or gone; serve this request without the cache
+    return compute()
+
+
+async def aremember(key, compute, timeout=FRAGMENT_TIMEOUT, stale_key=None):
+    # remember() for async views. compute is sync and runs in a thread; a request waiting
+    # for another request's rebuild waits on the event loop instead of holding a thread
+    entry = await cache.aget(key)
+    if entry is not None:
+        value, cost, expires = entry
+        if _refresh_early(cost, expires):
+            refreshed = await sync_to_async(_recompute)(key, compute, timeout, stale_key)
+            return value if refreshed is None else refreshed
+        return value
+
+    value = await sync_to_async(_recompute)(key, compute, timeout, stale_key)
+    if value is not None:
+        return value
+    if stale_key and not replicas.read_your_writes():
+        value = await cache.aget(stale_key)
+        if value is not None:
+            return value
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry[0]
+    return await sync_to_async(compute)()
+
+
+def _bump_listing(listing_id, category_id):
+    bump_version('listing', listing_id)
+    if category_id is not None:
+        bump_version('category', category_id)
+        bump_version('catalog')
+
+
+def invalidate_listing(listing_id, category_id=None):
+    # bump now, and again once the change commits: a reader that rebuilt a fragment
+    # before the commit saw the old data and must not keep it.
+    # category_id is None for changes that don't show on cards (comments).
+    _bump_listing(listing_id, category_id)
+    transaction.on_commit(lambda: _bump_listing(listing_id, category_id))
@@ -0,0 +1,31 @@
+from .models import Category
+from .cache import get_version as _get_version, bump_version, remember
+from . import replicas
+
+# process-local copy of the sorted category list, as a (version, categories) pair
+_local = (None, None)
+
+
+def get_version():
+    return _get_version('categories')
+
+
+def get_categories():
+    global _local
+    version = get_version()
+    local_version, local_categories = _local
+    if local_version == version:
+        return local_categories
+
+    def build():
+        return list(Category.objects.all().order_by('category')), replicas.current() is not None
+    categories, from_replica = remember(f'auctions:categories:{version}', build, timeout=None)
+
+    if not from_replica:
+        # a list read from a replica may be stale, only the shared cache keeps it and only briefly
+        _local = (version, categories)
+    return categories
+
+
+def invalidate():
+    bump_version('categories')
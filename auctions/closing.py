@@ -0,0 +1,59 @@
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Listing, Bid
+from .cache import invalidate_listing
+from . import jobs, events
+
+# listings closed per transaction by the sweep
+BATCH_SIZE = 500
+
+
+def _winner():
+    # the bidder of the listing's current bid, evaluated inside the closing UPDATE
+    return Subquery(Bid.objects.filter(pk=OuterRef('current_bid')).values('bidder')[:1])
+
+
+def _closed(listing_id, category_id):
+    invalidate_listing(listing_id, category_id)
+    jobs.enqueue('auction_closed', listing_id=listing_id)
+    events.publish(listing_id, 'closed')
+
+
+def close_auction(listing):
+    # seller closed the auction by hand; returns False if it was already closed
+    with transaction.atomic():
+        closed = Listing.objects.filter(pk=listing.pk, closed=False).update(closed=True, winner=_winner())
+        if closed:
+            _closed(listing.pk, listing.category_id)
+    return bool(closed)
+
+
+def close_expired(now=None, batch_size=BATCH_SIZE):
+    # close every open listing whose end time has passed, batch by batch. each batch is
+    # a range read on the partial (ends_at, id) index of open listings, so a sweep costs
+    # O(expired listings) no matter how many listings are open.
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            due = Listing.objects.filter(closed=False, ends_at__lte=now).order_by('ends_at', 'id')
+            if connection.features.has_select_for_update_skip_locked:
+                # rows a bidder is updating right now are picked up by the next sweep
+                due = due.select_for_update(skip_locked=True)
+            batch = dict(due.values_list('id', 'category_id')[:batch_size])
+            if not batch:
+                break
+            read = len(batch)
+            # re-check the end time: an anti-sniping bid may have extended it since the read
+            updated = Listing.objects.filter(pk__in=batch, closed=False, ends_at__lte=now).update(closed=True, winner=_winner())
+            if updated != read:
+                # only possible without row locks: find out which ones this statement closed
+                batch = dict(Listing.objects.filter(pk__in=batch, closed=True, ends_at__lte=now).values_list('id', 'category_id'))
+            for listing_id, category_id in batch.items():
+                _closed(listing_id, category_id)
+        total += updated
+        if read < batch_size:
+            break
+    return total
@@ -0,0 +1,73 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_version, last_modified
+
+# seconds a shared cache (CDN) may serve an anonymous page before revalidating it
+EDGE_MAX_AGE = 10
+
+
+def _state(request):
+    # everything besides the versions a page depends on: who is asking, the query string
+    # and the cache generation, which changes with deployments that change the markup
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    return f"{user}-{settings.CACHES['default']['VERSION']}-{request.GET.urlencode()}"
+
+
+class _Validators:
+    # the page's ETag and Last-Modified, and the 304 (or 412) they answer the request with, if any
+    def __init__(self, request, scope, ident, with_validators):
+        self.authenticated = request.user.is_authenticated
+        self.etag = self.modified = self.response = None
+        if with_validators and request.method in ('GET', 'HEAD'):
+            versions = f"{get_version(scope, ident)}-{get_version('categories')}"
+            self.etag = quote_etag(f"{scope}-{ident}-{versions}-{_state(request)}")
+            self.modified = max(last_modified(scope, ident), last_modified('categories'))
+            self.response = get_conditional_response(request, etag=self.etag, last_modified=self.modified)
+
+    def finish(self, request, response):
+        if request.method in ('GET', 'HEAD'):
+            if self.etag and not response.has_header('ETag'):
+                response['ETag'] = self.etag
+            if self.modified and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(self.modified)
+            if self.authenticated or response.cookies:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, max_age=0, s_maxage=EDGE_MAX_AGE)
+        # the page differs between signed in and anonymous visitors
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+
+def conditional_page(scope, ident=lambda kwargs: '', anonymous_only=False):
+    # answer GET and HEAD with 304 when the (scope, ident) and category versions are unchanged,
+    # before the view runs. validators cost a few cache reads and no queries.
+    # anonymous pages hold no per-user state or csrf token, so shared caches may keep them
+    # briefly; anything rendered for a user is private. with anonymous_only, pages of signed
+    # in users depend on more than the versions and get no validators at all
+    def validators(request, kwargs):
+        return _Validators(request, scope, ident(kwargs), not (anonymous_only and request.user.is_authenticated))
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # loading the user and reading the cache are sync
+                checked = await sync_to_async(validators)(request, kwargs)
+                response = checked.response or await view(request, *args, **kwargs)
+                return checked.finish(request, response)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            checked = validators(request, kwargs)
+            response = checked.response or view(request, *args, **kwargs)
+            return checked.finish(request, response)
+        return wrapper
+    return decorator
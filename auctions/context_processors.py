@@ -1,4 +1,5 @@
-
 def categories(request):
-    from auctions.models import Category
-    return {'categories': Category.objects.all().order_by('category')}
\ No newline at end of file
+    from auctions.categories import get_categories
+    from auctions.replicas import reading_replica
+    with reading_replica(request):
+        return {'categories': get_categories()}
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# seconds between keep-alive comments on an idle stream
+KEEPALIVE = 15
+# events buffered per subscriber before a slow client starts missing them
+QUEUE_SIZE = 100
+EVENTS_PATH = re.compile(r'^/listing/(\d+)/events$')
+# seconds before a lost redis subscription is retried
+RECONNECT_DELAY = 1
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    # fans events out to the subscribers connected to this process, so it only serves a
+    # single web worker and never hears events published by the clock or job processes.
+    # a broker for several processes implements the same subscribe/unsubscribe/publish
+    # methods and is selected with AUCTIONS_EVENT_BROKER, see RedisBroker
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, listing_id):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(listing_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, listing_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(listing_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(listing_id, None)
+
+    def publish(self, listing_id, event):
+        # safe to call from sync views running in worker threads
+        with self._lock:
+            subscribers = list(self._subscribers.get(listing_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+class RedisBroker(InProcessBroker):
+    # publishes through redis pub/sub, so a bid taken by one web worker, or a close made by
+    # the clock process, reaches the subscribers of every worker. each process holds one
+    # pattern subscription per event loop and fans what it hears out to its own subscribers
+    CHANNEL = 'auctions:events:'
+
+    def __init__(self, url=None):
+        super().__init__()
+        self._url = url or settings.AUCTIONS_EVENT_REDIS_URL
+        self._redis = redis.Redis.from_url(self._url)
+        self._listeners = {}
+
+    def subscribe(self, listing_id):
+        queue = super().subscribe(listing_id)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._listeners or self._listeners[loop].done():
+                self._listeners[loop] = loop.create_task(self._listen())
+        return queue
+
+    def publish(self, listing_id, event):
+        # runs after the change committed; a redis outage costs the live update, not the request
+        try:
+            self._redis.publish(f'{self.CHANNEL}{listing_id}', json.dumps(event))
+        except redis.RedisError:
+            logger.warning("could not publish %s event for listing %s", event['type'], listing_id, exc_info=True)
+
+    async def _listen(self):
+        while True:
+            client = redis.asyncio.Redis.from_url(self._url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f'{self.CHANNEL}*')
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        listing_id = int(message['channel'].rsplit(b':', 1)[1])
+                        super().publish(listing_id, json.loads(message['data']))
+            except (redis.RedisError, OSError):
+                logger.warning("listing event subscription lost, retrying", exc_info=True)
+            finally:
+                await pubsub.close()
+                await client.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.AUCTIONS_EVENT_BROKER)()
+    return _broker
+
+
+def publish(listing_id, event_type, **data):
+    # only announce changes that actually committed
+    event = {"type": event_type, "data": data}
+    transaction.on_commit(lambda: get_broker().publish(listing_id, event))
+
+
+def _format(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n".encode()
+
+
+async def stream_events(listing_id, receive, send):
+    # server-sent events for one listing, held open until the client disconnects
+    broker = get_broker()
+    queue = broker.subscribe(listing_id)
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnect = asyncio.ensure_future(disconnected())
+    next_event = asyncio.ensure_future(queue.get())
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        while True:
+            done, _ = await asyncio.wait({disconnect, next_event}, timeout=KEEPALIVE, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                break
+            if next_event in done:
+                await send({'type': 'http.response.body', 'body': _format(next_event.result()), 'more_body': True})
+                next_event = asyncio.ensure_future(queue.get())
+            else:
+                await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+    finally:
+        disconnect.cancel()
+        next_event.cancel()
+        broker.unsubscribe(listing_id, queue)
+
+
+def with_listing_events(application):
+    # ASGI middleware answering /listing/<id>/events itself and passing everything else to Django
+    async def app(scope, receive, send):
+        if scope['type'] == 'http':
+            match = EVENTS_PATH.match(scope['path'])
+            if match:
+                return await stream_events(int(match[1]), receive, send)
+        return await application(scope, receive, send)
+    return app
@@ -0,0 +1,135 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .models import Comment
+
+# number of cards rendered per page of a listing feed
+PAGE_SIZE = 24
+# number of comments per page under a listing
+COMMENT_PAGE_SIZE = 20
+
+
+class FeedPage:
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    # cursors are opaque to clients: urlsafe base64 of the json encoded sort key
+    raw = json.dumps([str(value) if value is not None else None for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    # returns None for missing or malformed cursors so the feed restarts at the first page.
+    # the values are still strings, see _cursor_values
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+
+def _field_value(item, field):
+    value = item
+    for part in field.split('__'):
+        value = getattr(value, part)
+    return value
+
+
+def _keyset_filter(ordering, values):
+    # rows strictly after the cursor in (f1, f2, ..., fn) order:
+    # f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _ordering_field(queryset, name):
+    # model field or annotation (search rank) a feed is ordered by
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    model = queryset.model
+    for part in name.split('__'):
+        field = model._meta.get_field(part)
+        model = field.related_model
+    return field
+
+
+def _cursor_values(queryset, ordering, cursor):
+    # the cursor's values cleaned by their ordering fields, or None when a tampered cursor
+    # holds a value the field wouldn't accept, so the feed restarts at the first page
+    values = decode_cursor(cursor, len(ordering))
+    if values is None or None in values:
+        return None
+    try:
+        return [_ordering_field(queryset, field.lstrip('-')).clean(value, None) for field, value in zip(ordering, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _page_query(queryset, cursor, ordering, page_size):
+    # ordering must end with a unique field so the keyset is total and the cursor stable
+    queryset = queryset.order_by(*ordering)
+    values = _cursor_values(queryset, ordering, cursor)
+    if values is not None:
+        queryset = queryset.filter(_keyset_filter(ordering, values))
+    # fetch one extra row to learn whether there is a next page without a COUNT query
+    return queryset[:page_size + 1]
+
+
+def _page(items, ordering, page_size):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor([_field_value(last, field.lstrip('-')) for field in ordering])
+    return FeedPage(items, next_cursor)
+
+
+def paginate(queryset, cursor=None, ordering=('-id',), page_size=PAGE_SIZE):
+    return _page(list(_page_query(queryset, cursor, ordering, page_size)), ordering, page_size)
+
+
+async def apaginate(queryset, cursor=None, ordering=('-id',), page_size=PAGE_SIZE):
+    items = [item async for item in _page_query(queryset, cursor, ordering, page_size)]
+    return _page(items, ordering, page_size)
+
+
+def listing_feed(queryset, cursor=None, page_size=PAGE_SIZE, ordering=('-id',)):
+    # cards read the denormalized price columns, so only the category is joined in
+    return paginate(queryset.select_related('category'), cursor, ordering, page_size)
+
+
+async def alisting_feed(queryset, cursor=None, page_size=PAGE_SIZE, ordering=('-id',)):
+    return await apaginate(queryset.select_related('category'), cursor, ordering, page_size)
+
+
+def comment_feed(listing_id, cursor=None, page_size=COMMENT_PAGE_SIZE):
+    # newest first on the (auction, -created_at, -id) index, authors joined in
+    queryset = Comment.objects.filter(auction=listing_id).select_related('author')
+    return paginate(queryset, cursor, ('-created_at', '-id'), page_size)
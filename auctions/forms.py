@@ -1,19 +1,36 @@
-from django.forms import ModelForm, HiddenInput, NumberInput, ModelChoiceField
+from django.forms import ModelForm, HiddenInput, NumberInput, DateTimeInput, ModelChoiceField, ValidationError
+from django.utils import timezone
 from .models import *
 
 class NewListingForm(ModelForm):
     class Meta:
         model = Listing
-        fields = ['item', 'description', 'starting_bid', 'category', 'img', 'seller']
+        fields = ['item', 'description', 'starting_bid', 'category', 'img', 'ends_at', 'seller']
+        labels = {
+            'ends_at': 'Ends at (optional)'
+        }
         widgets = {
             'seller': HiddenInput(),
-            'starting_bid': NumberInput(attrs={'step': 'any'})
+            'starting_bid': NumberInput(attrs={'step': 'any'}),
+            'ends_at': DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M')
         }
 
         def __init__(self, *args, **kwargs):
             super(NewListingForm, self).__init__(*args, **kwargs)
             self.fields['category'].widget = ModelChoiceField(queryset=Category.objects.all())
 
+    def clean_ends_at(self):
+        ends_at = self.cleaned_data['ends_at']
+        if ends_at and ends_at <= timezone.now():
+            raise ValidationError("End time must be in the future")
+        return ends_at
+
+# NewListingForm for one row of a bulk import. the importer resolves the category and
+# seller against lists it loaded once and checks the image itself, instead of a query per row
+class ImportListingForm(NewListingForm):
+    class Meta(NewListingForm.Meta):
+        fields = ['item', 'description', 'starting_bid', 'ends_at']
+
 class NewBidForm(ModelForm):
     class Meta:
         model = Bid
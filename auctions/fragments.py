@@ -0,0 +1,53 @@
+from functools import partial
+
+from django.template.loader import render_to_string
+
+from .cache import cached_fragment, acached_fragment
+from .feeds import listing_feed, comment_feed
+from .models import Listing
+
+
+def _listing_body(listing_id):
+    listing = Listing.objects.select_related('category', 'current_bid__bidder', 'seller').get(pk=listing_id)
+    # only the first page of comments, the rest load on demand from the comments endpoint
+    comments = comment_feed(listing_id)
+    return {"listing": listing, "comments": comments.items, "comments_cursor": comments.next_cursor}
+
+
+def listing_body(listing_id):
+    # the parts of a listing page that are the same for every visitor, valid until the listing version changes
+    return cached_fragment(partial(_listing_body, listing_id), 'body', 'listing', listing_id)
+
+
+async def alisting_body(listing_id):
+    return await acached_fragment(partial(_listing_body, listing_id), 'body', 'listing', listing_id)
+
+
+def _card_grid(built, queryset, cursor, browse):
+    if browse:
+        page = listing_feed(browse.apply(queryset), cursor, ordering=browse.ordering)
+    else:
+        page = listing_feed(queryset, cursor)
+    built["listings"] = page.items
+    return {
+        "html": render_to_string('auctions/card.html', {"listings": page.items}),
+        "next_cursor": page.next_cursor,
+    }
+
+
+def _grid_key(scope, ident, cursor, browse):
+    return ('grid', scope, ident, browse.key if browse else '', cursor or '')
+
+
+def card_grid(scope, ident, queryset, cursor=None, browse=None):
+    # rendered page of cards, valid until the (scope, ident) version changes.
+    # "listings" is only present when the page was built on this request
+    built = {}
+    grid = cached_fragment(partial(_card_grid, built, queryset, cursor, browse), *_grid_key(scope, ident, cursor, browse))
+    return dict(grid, **built)
+
+
+async def acard_grid(scope, ident, queryset, cursor=None, browse=None):
+    built = {}
+    grid = await acached_fragment(partial(_card_grid, built, queryset, cursor, browse), *_grid_key(scope, ident, cursor, browse))
+    return dict(grid, **built)
@@ -0,0 +1,94 @@
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .models import Listing
+from .cache import invalidate_listing
+
+# variant widths cover the mini card (250px), card (350px) and listing (400px) slots at 1x and 2x
+WIDTHS = (250, 400, 800)
+VARIANT_DIR = 'variants'
+# every width is written in both formats; webp for browsers that accept it, jpeg as the fallback
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(source, width, ext):
+    # the whole source name, extension included, so hat.jpg and hat.png don't share variants
+    return f'{VARIANT_DIR}/{source}-{width}w.{ext}'
+
+
+def _encode(image, fmt, options):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        # jpeg has no alpha channel: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(source, storage=default_storage):
+    # resize and recompress the uploaded image, returns the variant manifest stored on Listing.img_variants
+    try:
+        with storage.open(source, 'rb') as file:
+            image = Image.open(file)
+            image.load()
+    except (OSError, ValueError, UnidentifiedImageError):
+        return {}
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    widths = []
+    for width in WIDTHS:
+        # never upscale; an image narrower than a slot gets a single variant at its own width
+        actual = min(width, image.width)
+        if actual in widths:
+            break
+        resized = image.copy()
+        resized.thumbnail((actual, image.height), Image.Resampling.LANCZOS)
+        for ext, (fmt, options) in FORMATS.items():
+            name = variant_name(source, actual, ext)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(_encode(resized, fmt, options)))
+        widths.append(actual)
+    return {'source': source, 'widths': widths}
+
+
+def delete_variants(variants, storage=default_storage):
+    for width in variants.get('widths', []):
+        for ext in FORMATS:
+            storage.delete(variant_name(variants['source'], width, ext))
+
+
+def update_listing_variants(listing):
+    source = listing.img.name if listing.img else ''
+    old = listing.img_variants or {}
+    if old.get('source') == source:
+        return old
+    # listings sharing an image (like the default one) share its variants
+    variants = (Listing.objects.filter(variants_source=source)
+                .values_list('img_variants', flat=True).first()) if source else None
+    if not variants:
+        variants = generate_variants(source) if source else {}
+    listing.img_variants, listing.variants_source = variants, variants.get('source', '')
+    Listing.objects.filter(pk=listing.pk).update(img_variants=listing.img_variants, variants_source=listing.variants_source)
+    invalidate_listing(listing.pk, listing.category_id)
+    # drop the variants of a replaced image once nothing references it
+    if old.get('source') and not Listing.objects.filter(variants_source=old['source']).exists():
+        delete_variants(old)
+    return variants
+
+
+def srcset(variants, ext, storage=default_storage):
+    return ', '.join(
+        f"{storage.url(variant_name(variants['source'], width, ext))} {width}w"
+        for width in variants.get('widths', [])
+    )
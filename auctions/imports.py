@@ -0,0 +1,300 @@
+import csv
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from io import BytesIO, TextIOWrapper
+
+from PIL import Image, UnidentifiedImageError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .models import Listing, ListingImport
+from .forms import ImportListingForm
+from .images import generate_variants, delete_variants
+from .cache import bump_version
+from . import categories, jobs, search
+
+# row formats by file extension
+CSV = 'csv'
+JSONL = 'jsonl'
+FORMATS = {'.csv': CSV, '.jsonl': JSONL, '.ndjson': JSONL}
+
+# rows validated, then inserted and indexed in one transaction
+BATCH_SIZE = 500
+# threads resizing images; Pillow releases the GIL while decoding, resizing and encoding
+IMAGE_WORKERS = 4
+# archive members larger than this are rejected without being read
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+# rejected rows reported with their errors, the rest are only counted
+MAX_ERRORS = 100
+# storage directory of uploads waiting for the import_listings job
+UPLOAD_DIR = 'imports'
+
+INVALID_IMAGE = "Upload a valid image. The file you uploaded was either not an image or a corrupted image."
+
+
+class ImportFailed(Exception):
+    # the file or archive as a whole can't be read; rows already imported stay imported
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.rejected = 0
+        self.errors = []
+        self.truncated = False
+        # rows past the limit, counted but not imported
+        self.skipped = 0
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'rejected': self.rejected, 'errors': self.errors,
+                'truncated': self.truncated, 'skipped': self.skipped}
+
+    def __repr__(self):
+        return f"<ImportResult created={self.created} rejected={self.rejected}>"
+
+
+def format_for(filename):
+    fmt = FORMATS.get(os.path.splitext(filename)[1].lower())
+    if fmt is None:
+        raise ImportFailed(f"Unsupported file type, use one of {', '.join(sorted(FORMATS))}")
+    return fmt
+
+
+def read_rows(stream, fmt):
+    # (line number, row) pairs from a text stream, one row in memory at a time.
+    # a JSONL line that isn't an object comes through as None
+    try:
+        if fmt == CSV:
+            reader = csv.DictReader(stream)
+            try:
+                for row in reader:
+                    yield reader.line_num, row
+            except csv.Error as error:
+                raise ImportFailed(f"line {reader.line_num}: {error}")
+            return
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    except UnicodeDecodeError:
+        raise ImportFailed("File is not UTF-8 text")
+
+
+def _category_ids():
+    # rows name their category by id or by name
+    ids = {}
+    for category in categories.get_categories():
+        ids[str(category.id)] = ids[category.category.lower()] = category.id
+    return ids
+
+
+def _store_image(archive, name, storage):
+    # read, check and save one archive member, then build its variants. runs in a worker thread
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        raise ValueError(f"{name} is not in the image archive")
+    if info.file_size > MAX_IMAGE_BYTES:
+        raise ValueError(f"{name} is larger than {MAX_IMAGE_BYTES // (1024 * 1024)} MB")
+    content = archive.read(info)
+    try:
+        Image.open(BytesIO(content)).verify()
+    except (OSError, ValueError, UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValueError(INVALID_IMAGE)
+    source = storage.save(os.path.basename(name), ContentFile(content))
+    return source, generate_variants(source, storage)
+
+
+class _Importer:
+    def __init__(self, seller, archive, storage, workers, batch_size):
+        self.seller = seller
+        self.archive = archive
+        self.storage = storage
+        self.batch_size = batch_size
+        self.category_ids = _category_ids()
+        self.pool = ThreadPoolExecutor(max_workers=workers) if archive else None
+        self.result = ImportResult()
+        self._default_variants = None
+
+    def default_variants(self):
+        # listings sharing an image share its variants, as in images.update_listing_variants
+        if self._default_variants is None:
+            source = Listing._meta.get_field('img').get_default()
+            self._default_variants = (Listing.objects.filter(variants_source=source)
+                                      .values_list('img_variants', flat=True).first()) or generate_variants(source, self.storage)
+        return self._default_variants
+
+    def listing(self, row):
+        # an unsaved listing for a valid row, or the row's errors
+        if row is None:
+            return None, {'__all__': ["Not a JSON object"]}
+        form = ImportListingForm({name: row.get(name) for name in ImportListingForm._meta.fields})
+        errors = {} if form.is_valid() else {field: list(messages) for field, messages in form.errors.items()}
+        category_id = self.category_ids.get(str(row.get('category') or '').strip().lower())
+        if category_id is None:
+            errors['category'] = ["Select a valid choice. That choice is not one of the available choices."]
+        if row.get('img') and not self.archive:
+            errors['img'] = ["No image archive was uploaded"]
+        if errors:
+            return None, errors
+        listing = form.save(commit=False)
+        # bulk_create skips Listing.save, which fills these in
+        listing.category_id = category_id
+        listing.seller = self.seller
+        listing.current_price = listing.starting_bid
+        if not row.get('img'):
+            listing.img_variants = self.default_variants()
+            listing.variants_source = listing.img_variants.get('source', '')
+        return listing, None
+
+    def run(self, rows, limit=None):
+        batch = []
+        rows = iter(rows)
+        try:
+            for line, row in rows:
+                if limit is not None and self.result.created + self.result.rejected + len(batch) >= limit:
+                    self.result.truncated = True
+                    self.result.skipped = 1
+                    break
+                listing, errors = self.listing(row)
+                if errors:
+                    self.result.reject(line, errors)
+                    continue
+                # images are read and resized while the rest of the batch is validated
+                name = row.get('img')
+                image = self.pool.submit(_store_image, self.archive, name, self.storage) if name else None
+                batch.append((line, listing, image))
+                if len(batch) >= self.batch_size:
+                    pending, batch = batch, []
+                    self.insert(pending)
+            pending, batch = batch, []
+            self.insert(pending)
+            if self.result.truncated:
+                self.count_skipped(rows)
+        except BaseException:
+            # a batch cut short by a file that stops parsing; insert discards its own on failure
+            self.discard(batch)
+            raise
+        finally:
+            if self.pool:
+                self.pool.shutdown(cancel_futures=True)
+        return self.result
+
+    def insert(self, batch):
+        listings = []
+        try:
+            for line, listing, image in batch:
+                if image:
+                    try:
+                        listing.img, listing.img_variants = image.result()
+                        listing.variants_source = listing.img_variants.get('source', '')
+                    except ValueError as error:
+                        self.result.reject(line, {'img': [str(error)]})
+                        continue
+                listings.append(listing)
+            if not listings:
+                return
+            with transaction.atomic():
+                created = Listing.objects.bulk_create(listings)
+                # bulk_create sends no post_save, so index here instead of in the signal handler
+                search.index_listings(Listing.objects.filter(pk__in=[listing.pk for listing in created]))
+        except BaseException:
+            self.discard(batch)
+            raise
+        self.result.created += len(created)
+        for category_id in {listing.category_id for listing in created}:
+            bump_version('category', category_id)
+        bump_version('catalog')
+
+    def count_skipped(self, rows):
+        # the rest of the file is only parsed, to tell the caller how much was left out
+        try:
+            for _ in rows:
+                self.result.skipped += 1
+        except ImportFailed:
+            # unreadable past the limit; those rows were not going to be imported either way
+            pass
+
+    def discard(self, batch):
+        # images are stored before their rows are inserted; remove those of a batch that wasn't
+        for line, listing, image in batch:
+            if image is None or image.cancel():
+                continue
+            try:
+                source, variants = image.result()
+            except Exception:
+                continue
+            self.storage.delete(source)
+            delete_variants(variants, self.storage)
+
+
+def import_listings(rows, seller, archive=None, storage=default_storage, workers=IMAGE_WORKERS, batch_size=BATCH_SIZE, limit=None):
+    # create listings for seller from (line, row) pairs, see read_rows. rows carry the NewListingForm
+    # fields and are checked with its rules; img names a member of archive, an open zipfile.ZipFile.
+    # every valid row is imported, so a bad row doesn't cost the rest of a large catalog
+    return _Importer(seller, archive, storage, workers, batch_size).run(rows, limit)
+
+
+def open_archive(file):
+    # file is a path or a seekable binary file
+    try:
+        return zipfile.ZipFile(file)
+    except (zipfile.BadZipFile, OSError) as error:
+        raise ImportFailed(f"Image archive is not a zip file: {error}")
+
+
+def queue_import(seller, upload, images=None, limit=None, storage=default_storage):
+    # store the uploaded rows and image archive and queue the import_listings job that runs them,
+    # see run_import. the file type and the archive are checked first, so they are refused at once
+    format_for(upload.name)
+    if images is not None:
+        open_archive(images.file).close()
+    names = [storage.save(f'{UPLOAD_DIR}/{os.path.basename(file.name)}', file) for file in filter(None, (upload, images))]
+    try:
+        with transaction.atomic():
+            importing = ListingImport.objects.create(seller=seller, file=names[0], images=names[1] if images else '')
+            # an import runs at most once, a retry would create the rows of the first attempt again
+            jobs.enqueue('import_listings', max_attempts=1, import_id=importing.pk, limit=limit)
+    except BaseException:
+        for name in names:
+            storage.delete(name)
+        raise
+    return importing
+
+
+def run_import(import_id, limit=None, storage=default_storage):
+    # run a queued import and record its result on the ListingImport. the status only moves
+    # from pending once, so a job handed out again after its lease ran out does nothing
+    if not ListingImport.objects.filter(pk=import_id, status=ListingImport.PENDING).update(status=ListingImport.RUNNING):
+        return
+    importing = ListingImport.objects.select_related('seller').get(pk=import_id)
+    status, result = ListingImport.FAILED, {'error': "The import stopped unexpectedly"}
+    try:
+        with ExitStack() as stack:
+            archive = None
+            if importing.images:
+                archive = stack.enter_context(open_archive(stack.enter_context(storage.open(importing.images, 'rb'))))
+            stream = TextIOWrapper(stack.enter_context(storage.open(importing.file, 'rb')), encoding='utf-8-sig', newline='')
+            result = import_listings(read_rows(stream, format_for(importing.file)), importing.seller, archive,
+                                     storage=storage, limit=limit).as_dict()
+        status = ListingImport.DONE
+    except ImportFailed as error:
+        result = {'error': str(error)}
+    finally:
+        ListingImport.objects.filter(pk=import_id).update(status=status, result=result)
+        for name in filter(None, (importing.file, importing.images)):
+            storage.delete(name)
@@ -0,0 +1,78 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# how long a worker may hold a job before it is considered lost and retried
+LEASE = timedelta(minutes=5)
+# retry delay is BACKOFF * 2 ** (attempts - 1)
+BACKOFF = timedelta(seconds=10)
+
+_handlers = {}
+
+
+def handler(name):
+    # register a function to run jobs called name; it receives the job payload as keyword arguments
+    def register(func):
+        _handlers[name] = func
+        return func
+    return register
+
+
+def enqueue(name, delay=None, max_attempts=5, **payload):
+    # the job row is written in the caller's transaction, so it only becomes visible if the primary write commits
+    run_at = timezone.now() + delay if delay else timezone.now()
+    return Job.objects.create(name=name, payload=payload, run_at=run_at, max_attempts=max_attempts)
+
+
+def claim(batch_size=10, lease=LEASE):
+    now = timezone.now()
+    expired = Q(status=Job.RUNNING, locked_until__lt=now)
+    ready = Job.objects.filter(
+        Q(status=Job.PENDING, run_at__lte=now) | expired & Q(attempts__lt=F('max_attempts'))
+    ).order_by('run_at')
+    with transaction.atomic():
+        # a job that takes its worker down is never marked failed by run_job, so its attempts
+        # are counted here: once a lost lease used up the last one, the job is given up
+        Job.objects.filter(expired, attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, locked_until=None, last_error="worker lost the job on its last attempt")
+        if connection.features.has_select_for_update_skip_locked:
+            # concurrent workers skip rows another worker is claiming
+            ready = ready.select_for_update(skip_locked=True)
+        ids = list(ready.values_list('id', flat=True)[:batch_size])
+        Job.objects.filter(id__in=ids).update(status=Job.RUNNING, locked_until=now + lease, attempts=F('attempts') + 1)
+    return list(Job.objects.filter(id__in=ids).order_by('run_at'))
+
+
+def run_job(job):
+    func = _handlers.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"no handler registered for job {job.name!r}")
+        func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts)
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, locked_until=None, last_error=error)
+        else:
+            retry_at = timezone.now() + BACKOFF * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(status=Job.PENDING, run_at=retry_at, locked_until=None, last_error=error)
+        return False
+    # finished jobs are removed so the ready index stays small
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def run_pending(batch_size=10):
+    jobs = claim(batch_size)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
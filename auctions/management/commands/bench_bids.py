@@ -0,0 +1,76 @@
+import itertools
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, DatabaseError
+
+from auctions.models import User, Category, Listing
+from auctions.bids import place_bid, ACCEPTED
+
+
+class Command(BaseCommand):
+    help = "Hammer a single listing with concurrent bids and report accepted bids per second"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--bids', type=int, default=200, help="bids attempted per thread")
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        bids_per_thread = options['bids']
+
+        category, _ = Category.objects.get_or_create(category='Misc')
+        seller = User.objects.create(username=f'bench-seller-{time.time_ns()}')
+        bidders = [User.objects.create(username=f'bench-bidder-{i}-{time.time_ns()}') for i in range(threads)]
+        listing = Listing.objects.create(item='Bid benchmark', starting_bid=Decimal('1.00'), seller=seller, category=category)
+
+        # amounts come from a shared counter so threads race on nearly increasing bids
+        amounts = itertools.count(1)
+        outcomes = []
+        lock = threading.Lock()
+
+        def worker(bidder):
+            results = []
+            try:
+                for _ in range(bids_per_thread):
+                    amount = listing.starting_bid + Decimal(next(amounts)) / 100
+                    try:
+                        results.append((place_bid(listing.id, bidder, amount).outcome, amount))
+                    except DatabaseError:
+                        results.append(('error', amount))
+            finally:
+                connection.close()
+            with lock:
+                outcomes.extend(results)
+
+        workers = [threading.Thread(target=worker, args=(bidder,)) for bidder in bidders]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            counts = {}
+            for outcome, _ in outcomes:
+                counts[outcome] = counts.get(outcome, 0) + 1
+            accepted = [amount for outcome, amount in outcomes if outcome == ACCEPTED]
+            listing.refresh_from_db()
+            final = listing.current_price
+
+            self.stdout.write(f"threads: {threads}, attempts: {len(outcomes)}, elapsed: {elapsed:.3f}s")
+            for outcome, count in sorted(counts.items()):
+                self.stdout.write(f"  {outcome}: {count}")
+            self.stdout.write(f"accepted bids/s: {len(accepted) / elapsed:.1f}")
+            self.stdout.write(f"attempts/s: {len(outcomes) / elapsed:.1f}")
+            # the price must never move down: the final bid is the highest accepted one
+            if accepted and final != max(accepted):
+                self.stderr.write(self.style.ERROR(f"inconsistent: final bid {final}, highest accepted {max(accepted)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS("final price consistent with accepted bids"))
+        finally:
+            listing.delete()
+            User.objects.filter(pk__in=[seller.pk] + [bidder.pk for bidder in bidders]).delete()
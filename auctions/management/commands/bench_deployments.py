@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = "Serve the app under each gunicorn profile in turn and compare throughput and tail latency at rising concurrency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default=','.join(PROFILES))
+        parser.add_argument('--concurrency', default='1,8,32', help="comma separated client counts")
+        parser.add_argument('--requests', type=int, default=300, help="requests per flow and concurrency")
+        parser.add_argument('--flows', default='browse,listing,watchlist', help="run_benchmarks flows, the read paths by default")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes, the same for every profile")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--prefix', default='seed', help="username prefix of the seeded users")
+        parser.add_argument('--output', default='deployment-results.json')
+
+    def handle(self, *args, **options):
+        profiles = [profile for profile in options['profiles'].split(',') if profile]
+        if set(profiles) - set(PROFILES):
+            raise CommandError(f"profiles are {', '.join(PROFILES)}")
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        url = f"http://127.0.0.1:{options['port']}"
+        if 'asgi' in profiles and settings.AUCTIONS_EVENT_BROKER == 'auctions.events.InProcessBroker':
+            self.stderr.write("without REDIS_URL live events only reach the asgi worker that published them, see commerce/gunicorn.py")
+
+        results = {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'workers': options['workers'],
+            'requests': options['requests'],
+            'profiles': {},
+        }
+        for profile in profiles:
+            self.stdout.write(f"starting gunicorn, {profile} profile")
+            server = self.serve(profile, options['port'], options['workers'])
+            try:
+                self.wait_until_up(url, server)
+                results['profiles'][profile] = {}
+                for level in levels:
+                    results['profiles'][profile][level] = self.measure(url, level, options)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+            output.write('\n')
+        self.report(results, levels)
+        self.stdout.write(self.style.SUCCESS(f"results written to {options['output']}"))
+
+    def serve(self, profile, port, workers):
+        env = dict(os.environ, GUNICORN_PROFILE=profile, WEB_CONCURRENCY=str(workers))
+        config = os.path.join(settings.BASE_DIR, 'commerce', 'gunicorn.py')
+        return subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', config, '--bind', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def wait_until_up(self, url, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"gunicorn exited with {server.returncode}")
+            try:
+                urllib.request.urlopen(url, timeout=1).close()
+                return
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+        raise CommandError(f"gunicorn did not answer on {url}")
+
+    def measure(self, url, concurrency, options):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('run_benchmarks', url=url, concurrency=concurrency, requests=options['requests'],
+                         flows=options['flows'], prefix=options['prefix'], output=output, stdout=self.stdout)
+            with open(output) as results:
+                return json.load(results)['flows']
+
+    def report(self, results, levels):
+        profiles = results['profiles']
+        flows = sorted({flow for runs in profiles.values() for run in runs.values() for flow in run})
+        for flow in flows:
+            self.stdout.write(f"\n{flow}")
+            self.stdout.write(f"{'clients':>8}" + ''.join(f"{profile + ' rps':>12}{profile + ' p99':>12}" for profile in profiles))
+            for level in levels:
+                row = f"{level:>8}"
+                for runs in profiles.values():
+                    run = runs[level].get(flow, {})
+                    row += f"{run.get('throughput') or '-':>12}{run.get('p99_ms') or '-':>12}"
+                self.stdout.write(row)
@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from auctions.models import Listing
+from auctions.images import generate_variants
+from auctions.cache import bump_version
+
+# listings whose cached cards and pages are dropped together
+BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = "Generate resized image variants for listings that are missing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="processes to use, defaults to the CPU count")
+        parser.add_argument('--force', action='store_true', help="regenerate variants that already exist")
+
+    def handle(self, *args, **options):
+        pending = set()
+        listings = Listing.objects.exclude(img='').exclude(img__isnull=True)
+        for source, variants_source in listings.values_list('img', 'variants_source').iterator():
+            if options['force'] or variants_source != source:
+                pending.add(source)
+        sources = sorted(pending)
+        if not sources:
+            self.stdout.write("all listing images have variants")
+            return
+
+        # child processes open their own connections
+        connections.close_all()
+        done = 0
+        updated = []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for source, variants in zip(sources, pool.map(generate_variants, sources, chunksize=8)):
+                listings = Listing.objects.filter(img=source)
+                updated += listings.values_list('id', 'category_id')
+                listings.update(img_variants=variants, variants_source=variants.get('source', ''))
+                done += 1
+                if not variants:
+                    self.stderr.write(f"could not read {source}")
+                if len(updated) >= BATCH_SIZE:
+                    self.invalidate(updated)
+                    updated = []
+        self.invalidate(updated)
+        self.stdout.write(self.style.SUCCESS(f"processed {done} images"))
+
+    def invalidate(self, listings):
+        # update() sends no signals: drop the cached pages and cards that show the old pictures
+        for listing_id, category_id in listings:
+            bump_version('listing', listing_id)
+        for category_id in {category_id for listing_id, category_id in listings}:
+            bump_version('category', category_id)
+        if listings:
+            bump_version('catalog')
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions.closing import close_expired, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Close auctions whose end time has passed, then keep sweeping on a timer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=15.0, help="seconds between sweeps")
+        parser.add_argument('--once', action='store_true', help="sweep once and exit")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                closed = close_expired(batch_size=options['batch_size'])
+                if closed:
+                    self.stdout.write(f"closed {closed} auctions")
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write("closer stopped")
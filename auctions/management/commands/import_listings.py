@@ -0,0 +1,43 @@
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.models import User
+from auctions.imports import import_listings, read_rows, format_for, open_archive, ImportFailed, BATCH_SIZE, IMAGE_WORKERS
+
+
+class Command(BaseCommand):
+    help = "Create listings for a seller from a CSV or JSONL file, with their images from a zip archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="rows with the create form's fields: item, description, starting_bid, category, ends_at, img")
+        parser.add_argument('--seller', required=True, help="username the listings are created for")
+        parser.add_argument('--images', help="zip archive holding the files named in the img column")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="defaults to the file extension")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=IMAGE_WORKERS, help="threads processing images")
+
+    def handle(self, *args, **options):
+        seller = User.objects.filter(username=options['seller']).first()
+        if seller is None:
+            raise CommandError(f"no user named {options['seller']}")
+        start = time.perf_counter()
+        try:
+            fmt = options['format'] or format_for(options['file'])
+            with ExitStack() as stack:
+                archive = stack.enter_context(open_archive(options['images'])) if options['images'] else None
+                # utf-8-sig drops the byte order mark spreadsheets put in front of exported CSV
+                stream = stack.enter_context(open(options['file'], encoding='utf-8-sig', newline=''))
+                result = import_listings(read_rows(stream, fmt), seller, archive,
+                                         workers=options['workers'], batch_size=options['batch_size'])
+        except (ImportFailed, OSError) as error:
+            raise CommandError(str(error))
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: " + '; '.join(
+                f"{field}: {' '.join(messages)}" for field, messages in error['errors'].items()))
+        if result.rejected > len(result.errors):
+            self.stderr.write(f"... and {result.rejected - len(result.errors)} more rejected rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"created {result.created} listings, rejected {result.rejected} rows in {time.perf_counter() - start:.1f}s"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from auctions import recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the shared watch (users who watched this also watched) table from the watchlist"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = recommendations.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"rebuilt {created} shared watch pairs"))
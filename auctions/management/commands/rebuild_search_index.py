@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from auctions.models import Listing
+from auctions import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for every listing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        search.index_listings(Listing.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"indexed {Listing.objects.count()} listings"))
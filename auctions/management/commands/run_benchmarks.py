@@ -0,0 +1,273 @@
+import http.cookiejar
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test import Client
+from django.urls import reverse
+
+from auctions.models import User, Category, Listing
+from auctions.management.commands.seed_data import PASSWORD, WORDS
+
+FLOWS = ('browse', 'listing', 'bid', 'watchlist')
+# the api's answer to a bid that was refused, such as one outbid by a concurrent client
+REJECTED = 409
+
+
+def percentile(samples, p):
+    # nearest rank on sorted samples
+    if not samples:
+        return None
+    rank = max(0, math.ceil(p / 100 * len(samples)) - 1)
+    return samples[rank]
+
+
+def summarize(latencies, errors, elapsed, rejected=0):
+    latencies = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 2)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rejected': rejected,
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+    }
+
+
+class TestClientSession:
+    # requests go through the full middleware stack in this process, no server needed
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def get(self, path, params=None):
+        return self.client.get(path, params or {}).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data).status_code
+
+    def post_json(self, path, data):
+        return self.client.post(path, data, content_type='application/json').status_code
+
+    def close(self):
+        connection.close()
+
+
+class HttpSession:
+    # a logged in browser against a running server, csrf token and all
+    def __init__(self, base_url, username):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.get(reverse('login'))
+        self.post(reverse('login'), {'username': username, 'password': PASSWORD})
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def open(self, request):
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def get(self, path, params=None):
+        query = f'?{urllib.parse.urlencode(params)}' if params else ''
+        return self.open(urllib.request.Request(self.base_url + path + query))
+
+    def post(self, path, data):
+        token = self.csrf_token()
+        body = urllib.parse.urlencode(dict(data, csrfmiddlewaretoken=token)).encode()
+        return self.open(urllib.request.Request(self.base_url + path, body, headers={
+            'X-CSRFToken': token, 'Referer': self.base_url + path,
+        }))
+
+    def post_json(self, path, data):
+        token = self.csrf_token()
+        return self.open(urllib.request.Request(self.base_url + path, json.dumps(data).encode(), headers={
+            'Content-Type': 'application/json', 'X-CSRFToken': token, 'Referer': self.base_url + path,
+        }))
+
+    def close(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Drive the browse, listing, bid and watchlist flows and write throughput and latency percentiles as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="requests per flow")
+        parser.add_argument('--concurrency', type=int, default=4, help="client threads per flow")
+        parser.add_argument('--warmup', type=int, default=20, help="untimed requests per flow")
+        parser.add_argument('--flows', default=','.join(FLOWS), help="comma separated subset of " + ', '.join(FLOWS))
+        parser.add_argument('--url', help="base url of a running server; default is the in-process test client")
+        parser.add_argument('--prefix', default='seed', help="username prefix of the seeded users")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--compare', help="earlier results file to print the differences against")
+
+    def handle(self, *args, **options):
+        flows = [flow for flow in options['flows'].split(',') if flow]
+        unknown = set(flows) - set(FLOWS)
+        if unknown:
+            raise CommandError(f"unknown flows: {', '.join(sorted(unknown))}")
+        self.rng = random.Random(options['seed'])
+        self.rng_lock = threading.Lock()
+
+        users = list(User.objects.filter(username__startswith=f"{options['prefix']}-").order_by('id')[:options['concurrency']])
+        if not users:
+            raise CommandError("no seeded users found, run seed_data first")
+        # listings that take bids for the length of a run
+        now = datetime.now(timezone.utc)
+        self.listings = list(Listing.objects.filter(
+            Q(ends_at__isnull=True) | Q(ends_at__gt=now + timedelta(hours=1)), closed=False, starts_at__lte=now,
+        ).order_by('?').values_list('id', flat=True)[:1000])
+        self.categories = list(Category.objects.values_list('id', flat=True))
+        if not self.listings:
+            raise CommandError("no open listings found, run seed_data first")
+        # the next amount each listing is bid, shared by all threads so most bids are accepted
+        self.prices = dict(Listing.objects.filter(pk__in=self.listings).values_list('id', 'current_price'))
+
+        if options['url']:
+            sessions = [HttpSession(options['url'], user.username) for user in users]
+        else:
+            sessions = [TestClientSession(user) for user in users]
+
+        results = {
+            'commit': self.commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'target': options['url'] or 'test client',
+            'database': connection.vendor,
+            'listings': Listing.objects.count(),
+            'requests': options['requests'],
+            'concurrency': len(sessions),
+            'flows': {},
+        }
+        for flow in flows:
+            step = getattr(self, f'{flow}_step')
+            self.run(sessions, step, options['warmup'])
+            results['flows'][flow] = self.run(sessions, step, options['requests'])
+            self.stdout.write(f"{flow}: {json.dumps(results['flows'][flow])}")
+
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+            output.write('\n')
+        self.stdout.write(self.style.SUCCESS(f"results written to {options['output']}"))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def choice(self, items):
+        with self.rng_lock:
+            return self.rng.choice(items)
+
+    def run(self, sessions, step, count):
+        # count requests of the flow shared between one thread per session. a refused bid is
+        # counted apart from the errors: the server answered it correctly
+        latencies, errors, rejected = [], [0], [0]
+        messages = set()
+        lock = threading.Lock()
+        remaining = iter(range(count))
+
+        def worker(session):
+            timings, failed, refused = [], 0, 0
+            try:
+                for _ in remaining:
+                    start = time.perf_counter()
+                    try:
+                        status = step(session)
+                    except Exception as error:
+                        # a locked database, a view's exception re-raised by the test client, a
+                        # refused connection: an error like any 5xx, and the thread carries on
+                        status = None
+                        with lock:
+                            messages.add(f"{type(error).__name__}: {error}")
+                    timings.append(time.perf_counter() - start)
+                    refused += status == REJECTED
+                    failed += status is None or (status >= 400 and status != REJECTED)
+            finally:
+                # worker threads hold their own database connections
+                if len(sessions) > 1:
+                    session.close()
+            with lock:
+                latencies.extend(timings)
+                errors[0] += failed
+                rejected[0] += refused
+
+        start = time.perf_counter()
+        if len(sessions) == 1:
+            worker(sessions[0])
+        else:
+            threads = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        for message in sorted(messages):
+            self.stderr.write(message)
+        return summarize(latencies, errors[0], time.perf_counter() - start, rejected[0])
+
+    # one request of each flow
+
+    def browse_step(self, session):
+        page = self.choice(('index', 'category', 'search', 'sorted'))
+        if page == 'category':
+            return session.get(reverse('category', args=[self.choice(self.categories)]))
+        if page == 'search':
+            return session.get(reverse('search'), {'q': self.choice(WORDS)})
+        if page == 'sorted':
+            return session.get(reverse('index'), {'sort': self.choice(('price', 'price_desc', 'ending'))})
+        return session.get(reverse('index'))
+
+    def listing_step(self, session):
+        return session.get(reverse('listing', args=[self.choice(self.listings)]))
+
+    def bid_step(self, session):
+        # through the api, which answers 201 for an accepted bid and 409 for a refused one; the
+        # listing page answers 200 either way and would count refused bids as served
+        listing_id = self.choice(self.listings)
+        with self.rng_lock:
+            self.prices[listing_id] += Decimal('1.00')
+            amount = self.prices[listing_id]
+        return session.post_json(reverse('api listing bids', args=[listing_id]), {'bid': str(amount)})
+
+    def watchlist_step(self, session):
+        # toggle a watch, then read the watchlist back
+        status = session.post(reverse('listing', args=[self.choice(self.listings)]), {'button': 'Watchlist'})
+        return max(status, session.get(reverse('watchlist')))
+
+    def compare(self, path, results):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(f"compared with {previous.get('commit')} ({path}):")
+        for flow, current in results['flows'].items():
+            before = previous.get('flows', {}).get(flow)
+            if not before:
+                continue
+            changes = []
+            for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms'):
+                if before.get(key) and current.get(key) is not None:
+                    changes.append(f"{key} {before[key]} -> {current[key]} ({(current[key] / before[key] - 1) * 100:+.1f}%)")
+            self.stdout.write(f"  {flow}: {', '.join(changes)}")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from auctions import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (image processing, notifications)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--sleep', type=float, default=1.0, help="seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="drain the ready jobs and exit")
+
+    def handle(self, *args, **options):
+        self.stdout.write("worker started")
+        try:
+            while True:
+                close_old_connections()
+                ran = jobs.run_pending(options['batch_size'])
+                if ran:
+                    self.stdout.write(f"ran {ran} jobs")
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write("worker stopped")
@@ -0,0 +1,149 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from auctions.models import User, Category, Listing, Bid, Watchlist, Comment
+from auctions import recommendations, search
+
+WORDS = (
+    'vintage', 'camera', 'lens', 'guitar', 'amplifier', 'console', 'controller', 'laptop', 'monitor',
+    'keyboard', 'watch', 'leather', 'jacket', 'sneakers', 'bicycle', 'helmet', 'drone', 'speaker',
+    'turntable', 'vinyl', 'record', 'poster', 'lamp', 'chair', 'desk', 'mirror', 'rug', 'vase',
+    'painting', 'print', 'coin', 'stamp', 'comic', 'figure', 'lego', 'puzzle', 'board', 'game',
+    'tent', 'backpack', 'kayak', 'fishing', 'rod', 'telescope', 'microscope', 'piano', 'violin',
+    'red', 'blue', 'black', 'silver', 'gold', 'wooden', 'retro', 'classic', 'rare', 'limited',
+)
+CATEGORIES = (
+    'Electronics', 'Fashion', 'Home', 'Toys', 'Collectibles', 'Sports', 'Music', 'Art', 'Outdoors', 'Misc',
+)
+# every seeded user gets this password, so benchmark clients can log in
+PASSWORD = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible synthetic data set of users, listings, bids, watches and comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--listings', type=int, default=100000)
+        parser.add_argument('--bids', type=int, default=5, help="average bids per listing")
+        parser.add_argument('--watches', type=int, default=10, help="average watched listings per user")
+        parser.add_argument('--comments', type=int, default=2, help="average comments per listing")
+        parser.add_argument('--seed', type=int, default=1, help="same seed, same data")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='seed', help="username prefix, must be unused")
+        parser.add_argument('--skip-index', action='store_true', help="skip the search index and recommendation rebuild")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        start = time.perf_counter()
+
+        categories = self.seed_categories()
+        users = self.seed_users(options['users'], options['prefix'])
+        listings = self.seed_listings(options['listings'], users, categories, options['bids'], options['comments'],
+                                      index=not options['skip_index'])
+        self.seed_watches(users, listings, options['watches'])
+        if not options['skip_index']:
+            self.stdout.write("rebuilding recommendations")
+            recommendations.rebuild(self.batch_size)
+        self.stdout.write(f"seeded in {time.perf_counter() - start:.1f}s")
+
+    def batches(self, items):
+        for i in range(0, len(items), self.batch_size):
+            yield items[i:i + self.batch_size]
+
+    def seed_categories(self):
+        categories = [Category.objects.get_or_create(category=name)[0] for name in CATEGORIES]
+        return [category.id for category in categories]
+
+    def seed_users(self, count, prefix):
+        password = make_password(PASSWORD)
+        ids = []
+        for batch in self.batches(range(count)):
+            created = User.objects.bulk_create([
+                User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com', password=password)
+                for i in batch
+            ])
+            ids += [user.id for user in created]
+        self.stdout.write(f"{len(ids)} users")
+        return ids
+
+    def title(self):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(2, 5))).capitalize()
+
+    def seed_listings(self, count, users, categories, bids_per_listing, comments_per_listing, index=True):
+        rng = self.rng
+        ids = []
+        totals = {'bids': 0, 'comments': 0}
+        for batch in self.batches(range(count)):
+            # decide each listing's bids up front so the denormalized price columns are written with the row
+            rows = []
+            for _ in batch:
+                starting_bid = Decimal(rng.randint(100, 100000)) / 100
+                created = self.now - timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+                amounts, amount = [], starting_bid
+                for _ in range(rng.randint(0, bids_per_listing * 2)):
+                    amount += Decimal(rng.randint(1, 5000)) / 100
+                    amounts.append(amount)
+                ends_at = created + timedelta(days=rng.randint(1, 30)) if rng.random() < 0.5 else None
+                listing = Listing(
+                    item=self.title(),
+                    description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))),
+                    starting_bid=starting_bid,
+                    current_price=amounts[-1] if amounts else starting_bid,
+                    bid_count=len(amounts),
+                    last_bid_at=self.now if amounts else None,
+                    category_id=rng.choice(categories),
+                    seller_id=rng.choice(users),
+                    starts_at=created,
+                    ends_at=ends_at,
+                    closed=bool(ends_at and ends_at < self.now),
+                )
+                rows.append((listing, amounts))
+
+            with transaction.atomic():
+                created = Listing.objects.bulk_create([listing for listing, _ in rows])
+                batch_ids = [listing.id for listing in created]
+                Bid.objects.bulk_create([
+                    Bid(auction_id=listing.id, bidder_id=rng.choice(users), bid=amount)
+                    for listing, amounts in rows for amount in amounts
+                ], batch_size=self.batch_size)
+                Comment.objects.bulk_create([
+                    Comment(auction_id=listing_id, author_id=rng.choice(users), comment=self.title(),
+                            created_at=self.now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)))
+                    for listing_id in batch_ids for _ in range(rng.randint(0, comments_per_listing * 2))
+                ], batch_size=self.batch_size)
+                # point every listing at its highest bid and record winners of the closed ones
+                top = Bid.objects.filter(auction=OuterRef('pk')).order_by('-bid')
+                Listing.objects.filter(pk__in=batch_ids, bid_count__gt=0).update(current_bid=Subquery(top.values('pk')[:1]))
+                Listing.objects.filter(pk__in=batch_ids, bid_count__gt=0, closed=True).update(winner=Subquery(top.values('bidder')[:1]))
+                if index:
+                    # by pk range: one IN list of every seeded id overruns sqlite's limit on query parameters
+                    search.index_listings(Listing.objects.filter(pk__gte=min(batch_ids), pk__lte=max(batch_ids)), self.batch_size)
+
+            ids += batch_ids
+            totals['bids'] += sum(len(amounts) for _, amounts in rows)
+            self.stdout.write(f"{len(ids)} listings")
+        self.stdout.write(f"{totals['bids']} bids")
+        return ids
+
+    def seed_watches(self, users, listings, watches_per_user):
+        rng = self.rng
+        total = 0
+        for batch in self.batches(users):
+            rows = []
+            for user_id in batch:
+                count = min(rng.randint(0, watches_per_user * 2), len(listings))
+                rows += [Watchlist(user_id=user_id, listing_id=listing_id) for listing_id in rng.sample(listings, count)]
+            Watchlist.objects.bulk_create(rows, batch_size=self.batch_size, ignore_conflicts=True)
+            total += len(rows)
+        self.stdout.write(f"{total} watches")
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends import django as django_backend
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# log a request that repeats this many statements, the usual sign of an N+1 loop
+DUPLICATE_WARNING = 10
+# with AUCTIONS_METRICS_DIR set, each process writes its registry there at most this often
+FLUSH_SECONDS = 1.0
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = {}
+        self.rendering = False
+
+    @property
+    def duplicates(self):
+        # executions of a statement (sql text, parameters aside) beyond its first
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.clear()
+
+    def observe(self, view, value):
+        with self._lock:
+            counts, total, count = self._series.get(view) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[view] = (counts, total + value, count + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {view: [list(counts), total, count] for view, (counts, total, count) in self._series.items()}
+
+    @staticmethod
+    def merge(into, snapshot):
+        for view, (counts, total, count) in snapshot.items():
+            merged = into.setdefault(view, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+
+    def samples(self, snapshot=None):
+        if snapshot is None:
+            snapshot = self.snapshot()
+        series = sorted((view, counts, total, count) for view, (counts, total, count) in snapshot.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for view, counts, total, count in series:
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{view="{view}",le="{bound}"}} {bucket}')
+            lines.append(f'{self.name}_bucket{{view="{view}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{view="{view}"}} {total}')
+            lines.append(f'{self.name}_count{{view="{view}"}} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series = {}
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self.clear()
+
+    def inc(self, view, amount=1):
+        with self._lock:
+            self._values[view] = self._values.get(view, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(into, snapshot):
+        for view, value in snapshot.items():
+            into[view] = into.get(view, 0) + value
+
+    def samples(self, snapshot=None):
+        if snapshot is None:
+            snapshot = self.snapshot()
+        values = sorted(snapshot.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{{view="{view}"}} {value}' for view, value in values]
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+
+# per-process registry. gunicorn workers share one port, so a scrape reaches whichever worker
+# accepts it; with AUCTIONS_METRICS_DIR set every process also writes its registry to a file
+# there and a scrape adds up the files of all of them
+REQUEST_SECONDS = Histogram('auctions_request_duration_seconds', "Time spent handling the request", LATENCY_BUCKETS)
+DB_SECONDS = Histogram('auctions_db_duration_seconds', "Time spent in database queries per request", LATENCY_BUCKETS)
+TEMPLATE_SECONDS = Histogram('auctions_template_duration_seconds', "Time spent rendering templates per request", LATENCY_BUCKETS)
+QUERIES = Histogram('auctions_db_queries', "Database queries per request", QUERY_BUCKETS)
+DUPLICATE_QUERIES = Counter('auctions_duplicate_queries_total', "Repeated database statements")
+METRICS = (REQUEST_SECONDS, DB_SECONDS, TEMPLATE_SECONDS, QUERIES, DUPLICATE_QUERIES)
+
+
+_flushed = 0.0
+
+
+def flush_metrics(directory):
+    # this process's registry as <pid>.json, replaced in one rename so a scrape never reads
+    # half a file. files of exited workers are kept, their requests still count towards the totals
+    global _flushed
+    _flushed = time.monotonic()
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as file:
+        json.dump({metric.name: metric.snapshot() for metric in METRICS}, file)
+    os.replace(f'{path}.tmp', path)
+
+
+def _read_snapshots(directory):
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            # removed since listdir, or left broken by a killed worker
+            continue
+
+
+def render_metrics():
+    directory = settings.AUCTIONS_METRICS_DIR
+    if directory:
+        flush_metrics(directory)
+        merged = {metric.name: {} for metric in METRICS}
+        for snapshot in _read_snapshots(directory):
+            for metric in METRICS:
+                metric.merge(merged[metric.name], snapshot.get(metric.name, {}))
+    lines = []
+    for metric in METRICS:
+        lines += metric.samples(merged[metric.name] if directory else None)
+    return '\n'.join(lines) + '\n'
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries += 1
+        stats.statements[sql] = stats.statements.get(sql, 0) + 1
+
+
+def _install(connection, **kwargs):
+    # the wrapper stays on every connection and only records while a request is measured. async
+    # views run their queries in other threads, on connections a per-request wrapper would miss
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install)
+
+
+_render = django_backend.Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    # top-level renders only: includes render inside this call and are not counted twice
+    stats = _current.get()
+    if stats is None or stats.rendering:
+        return _render(self, context, request)
+    stats.rendering = True
+    start = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        stats.template_time += time.perf_counter() - start
+        stats.rendering = False
+
+
+# wrap the template backend once, when the middleware is loaded
+django_backend.Template.render = _timed_render
+
+
+class InstrumentationMiddleware:
+    # records query count, repeated statements, database, template and total time for every request,
+    # reports them in a Server-Timing header and in the histograms served by the metrics view.
+    # the cost is a perf_counter pair and a dict update per query, cheap enough to leave on
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # connections opened before this module was loaded
+        for connection in connections.all():
+            _install(connection)
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as a coroutine function so Django calls it on the event loop
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    def record(self, request, response, stats, total):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        if view != 'metrics':
+            REQUEST_SECONDS.observe(view, total)
+            DB_SECONDS.observe(view, stats.db_time)
+            TEMPLATE_SECONDS.observe(view, stats.template_time)
+            QUERIES.observe(view, stats.queries)
+            if stats.duplicates:
+                DUPLICATE_QUERIES.inc(view, stats.duplicates)
+            directory = settings.AUCTIONS_METRICS_DIR
+            if directory and time.monotonic() - _flushed >= FLUSH_SECONDS:
+                try:
+                    flush_metrics(directory)
+                except OSError:
+                    logger.exception("could not write metrics to %s", directory)
+        if stats.duplicates >= DUPLICATE_WARNING:
+            logger.warning("%s repeated %s database statements (%s queries)", request.path, stats.duplicates, stats.queries)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries, {stats.duplicates} repeated"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    # whitenoise's middleware is sync only, and a single sync middleware makes Django hold a
+    # thread for the whole of every request under ASGI, async views included. static files
+    # are found with a dict lookup and served as before; everything else stays on the event loop
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
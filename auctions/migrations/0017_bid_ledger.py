@@ -0,0 +1,43 @@
+# Generated by Django 4.1 on 2026-10-18 13:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_alter_listing_category'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='category',
+            options={'verbose_name_plural': 'categories'},
+        ),
+        migrations.AddField(
+            model_name='bid',
+            name='auction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bids', to='auctions.listing'),
+        ),
+        migrations.AddField(
+            model_name='bid',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='listing',
+            name='category',
+            field=models.ForeignKey(default=(), on_delete=django.db.models.deletion.RESTRICT, to='auctions.category'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['auction', '-bid'], name='bid_auction_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['bidder', '-created'], name='bid_bidder_created_idx'),
+        ),
+    ]
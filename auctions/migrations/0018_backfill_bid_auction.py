@@ -0,0 +1,23 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+# link existing bids to their listing through the Listing.current_bid pointer.
+# earlier bids were never linked to a listing and cannot be attributed.
+def backfill_bid_auction(apps, schema_editor):
+    Bid = apps.get_model('auctions', 'Bid')
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid.objects.filter(auction__isnull=True).update(
+        auction=Subquery(Listing.objects.filter(current_bid=OuterRef('pk')).values('pk')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_bid_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_bid_auction, migrations.RunPython.noop),
+    ]
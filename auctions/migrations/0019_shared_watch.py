@@ -0,0 +1,50 @@
+# Generated by Django 4.1 on 2026-10-18 13:19
+
+from django.db import migrations, models
+from django.db.models import F, Count
+import django.db.models.deletion
+
+
+# populate the table from the existing watchlist rows
+def populate_shared_watches(apps, schema_editor):
+    Watchlist = apps.get_model('auctions', 'Watchlist')
+    SharedWatch = apps.get_model('auctions', 'SharedWatch')
+    pairs = (Watchlist.objects.filter(listing__isnull=False)
+             .annotate(other=F('user__watchlist__listing'))
+             .filter(other__isnull=False)
+             .exclude(other=F('listing'))
+             .values('listing', 'other')
+             .annotate(watchers=Count('user', distinct=True))
+             .order_by())
+    SharedWatch.objects.bulk_create(
+        [SharedWatch(listing_id=row['listing'], other_id=row['other'], watchers=row['watchers']) for row in pairs],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0018_backfill_bid_auction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedWatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watchers', models.PositiveIntegerField(default=0)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shared_watches', to='auctions.listing')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auctions.listing')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='sharedwatch',
+            index=models.Index(fields=['listing', '-watchers'], name='shared_watch_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sharedwatch',
+            constraint=models.UniqueConstraint(fields=('listing', 'other'), name='shared_watch_unique_pair'),
+        ),
+        migrations.RunPython(populate_shared_watches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.1 on 2026-10-18 13:21
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+import django.db.models.deletion
+
+from auctions.search import term_weights
+
+
+# GIN index over the tsvector document, PostgreSQL only
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE INDEX listing_search_vector_idx ON auctions_listing USING gin (search_vector)')
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS listing_search_vector_idx')
+
+# index the existing listings
+def backfill_search(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    SearchTerm = apps.get_model('auctions', 'SearchTerm')
+    if schema_editor.connection.vendor == 'postgresql':
+        Listing.objects.update(search_vector=(
+            SearchVector('item', weight='A', config='english') +
+            SearchVector('description', weight='B', config='english')
+        ))
+        return
+    terms = []
+    for pk, item, description in Listing.objects.values_list('pk', 'item', 'description').iterator():
+        for term, weight in term_weights(item, description).items():
+            terms.append(SearchTerm(listing_id=pk, term=term, weight=weight))
+    SearchTerm.objects.bulk_create(terms, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_shared_watch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='auctions.listing')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'listing'], name='search_term_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_search, migrations.RunPython.noop),
+    ]
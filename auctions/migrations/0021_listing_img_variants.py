@@ -0,0 +1,27 @@
+# Generated by Django 4.1 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0020_listing_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='img_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='variants_source',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['variants_source'], name='listing_variants_source_idx'),
+        ),
+    ]
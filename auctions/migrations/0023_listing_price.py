@@ -0,0 +1,62 @@
+# Generated by Django 4.1 on 2026-10-18 13:32
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_listing_price(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    ledger = Bid.objects.filter(auction=OuterRef('pk')).order_by().values('auction')
+    Listing.objects.update(
+        current_price=Coalesce(
+            Subquery(Bid.objects.filter(pk=OuterRef('current_bid')).values('bid')[:1]),
+            'starting_bid',
+        ),
+        bid_count=Coalesce(Subquery(ledger.annotate(n=Count('pk')).values('n')), 0),
+        last_bid_at=Subquery(ledger.annotate(last=Max('created')).values('last')),
+    )
+    # bids placed before the ledger existed were never linked to their listing
+    Listing.objects.filter(current_bid__isnull=False, bid_count=0).update(
+        bid_count=1,
+        last_bid_at=Subquery(Bid.objects.filter(pk=OuterRef('current_bid')).values('created')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0022_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='current_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='last_bid_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_listing_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['category', 'closed', 'current_price', 'id'], name='listing_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['category', 'closed', '-id'], name='listing_cat_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['closed', 'current_price', 'id'], name='listing_open_price_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1 on 2026-10-18 13:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+# auctions closed before winners were recorded went to their highest bidder
+def backfill_winner(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    Listing.objects.filter(closed=True, current_bid__isnull=False).update(
+        winner=Subquery(Bid.objects.filter(pk=OuterRef('current_bid')).values('bidder')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0023_listing_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='starts_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='winner',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='won_listings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_winner, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('closed', False)), fields=['ends_at', 'id'], name='listing_open_ends_idx'),
+        ),
+    ]
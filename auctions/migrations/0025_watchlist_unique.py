@@ -0,0 +1,29 @@
+# Generated by Django 4.1 on 2026-10-18 13:41
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+# double-clicked watch buttons left duplicate rows; keep the oldest of each (user, listing)
+def remove_duplicate_watches(apps, schema_editor):
+    Watchlist = apps.get_model('auctions', 'Watchlist')
+    keep = (Watchlist.objects.values('user', 'listing')
+            .annotate(first=Min('id'))
+            .values_list('first', flat=True)
+            .order_by())
+    Watchlist.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0024_listing_schedule'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_watches, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('user', 'listing'), name='watchlist_unique_user_listing'),
+        ),
+    ]
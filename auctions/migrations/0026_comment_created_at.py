@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 13:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0025_watchlist_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['auction', '-created_at', '-id'], name='comment_auction_created_idx'),
+        ),
+    ]
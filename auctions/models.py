@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 from django.core.validators import MinValueValidator
+from django.contrib.postgres.search import SearchVectorField
 
 class User(AbstractUser):
     pass
@@ -18,44 +20,185 @@ class Category(models.Model):
 
 # one to many: 1 user can have many listings
 class Listing(models.Model):
+    class Meta:
+        indexes = [
+            # browse pages: open listings of a category by price or newest first
+            models.Index(fields=['category', 'closed', 'current_price', 'id'], name='listing_cat_price_idx'),
+            models.Index(fields=['category', 'closed', '-id'], name='listing_cat_newest_idx'),
+            # the same across all categories
+            models.Index(fields=['closed', 'current_price', 'id'], name='listing_open_price_idx'),
+            # the closer's sweep and the "ending soonest" sort only ever look at open listings
+            models.Index(fields=['ends_at', 'id'], condition=models.Q(closed=False), name='listing_open_ends_idx'),
+            # listings sharing an image share its variants, see auctions.images
+            models.Index(fields=['variants_source'], name='listing_variants_source_idx'),
+        ]
 
     item = models.CharField(max_length=200, blank=False)
     description = models.TextField(null=True, blank=True, max_length=500)
     starting_bid = models.DecimalField(decimal_places=2, max_digits=10, null=False, validators=[MinValueValidator(Decimal('0.01'))])
     current_bid = models.ForeignKey('Bid', null=True, blank=True, on_delete=models.SET_NULL)
+    # denormalized from the bid ledger and maintained by auctions.bids.place_bid.
+    # current_price is the highest bid, or the starting bid until someone bids
+    current_price = models.DecimalField(decimal_places=2, max_digits=10, default=0, editable=False)
+    bid_count = models.PositiveIntegerField(default=0, editable=False)
+    last_bid_at = models.DateTimeField(null=True, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.RESTRICT, default=Category.objects.filter(pk=0), null=False, blank=False)
     img = models.ImageField(upload_to='', default='default_img.png', null=True, blank=True)
+    # manifest of the resized copies of img, see auctions.images
+    img_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # the image the variants were made from, img_variants['source'] as an indexed column
+    variants_source = models.CharField(max_length=100, blank=True, default='', editable=False)
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='listings')
     closed = models.BooleanField(default=False)
+    starts_at = models.DateTimeField(default=timezone.now)
+    # open-ended listings (no end time) run until the seller closes them
+    ends_at = models.DateTimeField(null=True, blank=True)
+    # set when the auction closes with a bid on it
+    winner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='won_listings', editable=False)
+    # full-text document on PostgreSQL (GIN indexed by migration), unused on other databases
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         return self.item
 
+    def save(self, *args, **kwargs):
+        if not self.bid_count:
+            if self._state.adding and self.current_bid_id:
+                # created with a bid already attached (fixtures, tests)
+                self.current_price = self.current_bid.bid
+                self.bid_count = 1
+                self.last_bid_at = self.current_bid.created
+            else:
+                self.current_price = self.starting_bid
+        super().save(*args, **kwargs)
+
     def get_current_bid(self):
         return self.current_bid.bid if self.current_bid else 0
 
     def get_current_bidder(self):
         return self.current_bid.bidder if self.current_bid else 0
 
+# bid ledger: every bid placed on a listing, the highest one is referenced by Listing.current_bid
 class Bid(models.Model):
+    class Meta:
+        indexes = [
+            # per-listing history and highest bid lookups
+            models.Index(fields=['auction', '-bid'], name='bid_auction_amount_idx'),
+            # a user's bidding activity, newest first
+            models.Index(fields=['bidder', '-created'], name='bid_bidder_created_idx'),
+        ]
+
+    auction = models.ForeignKey(Listing, null=True, blank=True, on_delete=models.CASCADE, related_name='bids')
     bidder = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='bids')
     bid = models.DecimalField(decimal_places=2, max_digits=10, null=False, validators=[MinValueValidator(Decimal('0.01'))])
+    created = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.bid} - {self.bidder}"
 
 class Watchlist(models.Model):
+    class Meta:
+        constraints = [
+            # also the index behind a user's watchlist and the "is this watched" check
+            models.UniqueConstraint(fields=['user', 'listing'], name='watchlist_unique_user_listing'),
+        ]
+
     user = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name="watchlist")
     listing = models.ForeignKey(Listing, null=True, on_delete=models.CASCADE)
 
     def __str__(self):
         return f"{self.user} is watching {self.listing}"
 
+# materialized "users who watched this also watched": number of users watching both listings.
+# each pair is stored in both directions so lookups only need the listing column
+class SharedWatch(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'other'], name='shared_watch_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['listing', '-watchers'], name='shared_watch_top_idx'),
+        ]
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='shared_watches')
+    other = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='+')
+    watchers = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.listing} and {self.other} watched by {self.watchers}"
+
+# inverted index for full-text search on databases without tsvector support
+class SearchTerm(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'listing'], name='search_term_idx'),
+        ]
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=40)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.term} in {self.listing}"
+
 # one to many: 1 listing can have many comments
 class Comment(models.Model):
+    class Meta:
+        indexes = [
+            # a listing's comments newest first, one keyset page at a time
+            models.Index(fields=['auction', '-created_at', '-id'], name='comment_auction_created_idx'),
+        ]
+
     auction = models.ForeignKey(Listing, null=True, on_delete=models.CASCADE)
     author = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
     comment = models.TextField(null=True, max_length=500)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     def __str__(self):
         return f"{self.author} commented on {self.auction}"
+
+# background work queue, see auctions.jobs
+class Job(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_ready_idx'),
+        ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # a running job whose lease expired is assumed lost and handed out again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+# a bulk import queued by the api; the import_listings job runs it and stores the outcome
+class ListingImport(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='imports')
+    # storage names of the uploaded rows and image archive, removed once the import has run
+    file = models.CharField(max_length=200)
+    images = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=PENDING)
+    # ImportResult.as_dict(), or {'error': ...} when the file could not be read
+    result = models.JSONField(default=dict, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"import {self.pk} by {self.seller} ({self.status})"
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import F, Q, Count
+
+from .models import Watchlist, SharedWatch
+
+# number of similar items shown on a listing page
+SIMILAR_LIMIT = 3
+
+# set while a bulk watchlist change updates the pairs itself, see batch()
+_in_batch = ContextVar('in_batch', default=False)
+
+
+def _watched(user_id):
+    return set(Watchlist.objects.filter(user_id=user_id, listing__isnull=False).values_list('listing_id', flat=True))
+
+
+def _pairs(changed, others):
+    # every ordered pair between a changed listing and another listing of the same user, each once:
+    # (changed, changed or other) and (other, changed)
+    return (Q(listing_id__in=changed, other_id__in=changed | others) |
+            Q(listing_id__in=others, other_id__in=changed)) & ~Q(listing_id=F('other_id'))
+
+
+def record_watches(user_id, listing_ids):
+    # called after the user's watch rows for listing_ids were created
+    added = set(listing_ids)
+    others = _watched(user_id) - added
+    if len(added) + len(others) < 2:
+        return
+    with transaction.atomic():
+        # create missing pairs, then bump every pair in a single statement
+        SharedWatch.objects.bulk_create(
+            [SharedWatch(listing_id=a, other_id=b) for a in added for b in added | others if a != b] +
+            [SharedWatch(listing_id=b, other_id=a) for a in added for b in others],
+            ignore_conflicts=True
+        )
+        SharedWatch.objects.filter(_pairs(added, others)).update(watchers=F('watchers') + 1)
+
+
+def remove_watches(user_id, listing_ids):
+    # called after the user's watch rows for listing_ids are gone
+    removed = set(listing_ids)
+    others = _watched(user_id) - removed
+    if len(removed) + len(others) < 2:
+        return
+    with transaction.atomic():
+        SharedWatch.objects.filter(_pairs(removed, others), watchers__gt=0).update(watchers=F('watchers') - 1)
+        SharedWatch.objects.filter(_pairs(removed, others), watchers=0).delete()
+
+
+def remove_user(user_id):
+    # called before a user is deleted. their watch rows go with them in one statement, so by
+    # the time the rows' post_delete signals run there are no other watches left to pair with
+    remove_watches(user_id, _watched(user_id))
+
+
+# single watch rows, from the model signals
+
+def record_watch(user_id, listing_id):
+    if not _in_batch.get():
+        record_watches(user_id, [listing_id])
+
+
+def remove_watch(user_id, listing_id):
+    if not _in_batch.get():
+        remove_watches(user_id, [listing_id])
+
+
+@contextmanager
+def batch():
+    # the caller changes many watch rows at once and calls record_watches/remove_watches
+    # for the whole set; per-row updates would miss the pairs between the changed rows
+    token = _in_batch.set(True)
+    try:
+        yield
+    finally:
+        _in_batch.reset(token)
+
+
+def _similar(listing, user, limit):
+    # one indexed range read on (listing, -watchers), with the cards joined in
+    shared = (SharedWatch.objects.filter(listing=listing)
+              .select_related('other__category')
+              .order_by('-watchers', 'other_id'))
+    if user is not None:
+        # no need to recommend what the user already watches
+        shared = shared.exclude(other__in=Watchlist.objects.filter(user=user).values('listing'))
+    return shared[:limit]
+
+
+def similar_listings(listing, user=None, limit=SIMILAR_LIMIT):
+    return [row.other for row in _similar(listing, user, limit)]
+
+
+async def asimilar_listings(listing, user=None, limit=SIMILAR_LIMIT):
+    return [row.other async for row in _similar(listing, user, limit)]
+
+
+def rebuild(batch_size=1000):
+    # count co-watchers for every ordered pair of listings in the database, then reload the table
+    pairs = (Watchlist.objects.filter(listing__isnull=False)
+             .annotate(other=F('user__watchlist__listing'))
+             .filter(other__isnull=False)
+             .exclude(other=F('listing'))
+             .values('listing', 'other')
+             .annotate(watchers=Count('user', distinct=True))
+             .order_by())
+    created = 0
+    with transaction.atomic():
+        SharedWatch.objects.all().delete()
+        batch = []
+        for row in pairs.iterator(chunk_size=batch_size):
+            batch.append(SharedWatch(listing_id=row['listing'], other_id=row['other'], watchers=row['watchers']))
+            if len(batch) >= batch_size:
+                SharedWatch.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        SharedWatch.objects.bulk_create(batch)
+        created += len(batch)
+    return created
@@ -0,0 +1,137 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+# set on the response of every write; while it is valid the client reads from the primary only
+# and is not served stale cached pages
+STICKY_COOKIE = 'primary_until'
+# read-mostly models a replica may serve. users and sessions always come from the primary,
+# so a fresh login or registration is never missing on a lagging replica
+REPLICA_MODELS = {
+    'auctions.category', 'auctions.listing', 'auctions.bid', 'auctions.comment',
+    'auctions.watchlist', 'auctions.sharedwatch', 'auctions.searchterm',
+}
+
+# replica alias chosen for the current request, None outside replica reads
+_replica = ContextVar('replica', default=None)
+# whether the current request must see its client's own writes; anything outside a request does
+_read_your_writes = ContextVar('read_your_writes', default=True)
+
+
+def is_pinned(request):
+    # true for a few seconds after the client wrote something, so it reads its own writes
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def reading_replica(request):
+    # route the reads of a safe, unpinned request to one replica, picked once per request
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or request.method not in ('GET', 'HEAD') or is_pinned(request) or _replica.get():
+        yield
+        return
+    token = _replica.set(random.choice(replicas))
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def read_your_writes():
+    # true for writes and for requests of clients that wrote recently. such requests read from
+    # the primary and are never served a stale cached copy
+    return _read_your_writes.get()
+
+
+def current():
+    # alias of the replica serving this request's reads, None when they go to the primary
+    return _replica.get()
+
+
+def cache_timeout(timeout):
+    # a cache fill read from a replica may predate the write that invalidated the old entry,
+    # so it is kept no longer than the replica is allowed to lag
+    if _replica.get() is None:
+        return timeout
+    lag = settings.AUCTIONS_REPLICA_STICKY_SECONDS
+    return lag if timeout is None else min(timeout, lag)
+
+
+def replica_reads(view):
+    # view decorator: GET and HEAD requests may be served from a replica. the alias is a
+    # context variable, so the queries async views run in threads see it too
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with reading_replica(request):
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reading_replica(request):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    # reads go to the replica picked for the request when a view opted in, everything else
+    # (writes, migrations, reads outside replica_reads) to the primary
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias and model._meta.label_lower in REPLICA_MODELS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def _writes(request):
+    return request.method not in ('GET', 'HEAD', 'OPTIONS')
+
+
+def _pin(request, response):
+    if _writes(request):
+        seconds = settings.AUCTIONS_REPLICA_STICKY_SECONDS
+        response.set_cookie(STICKY_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+    return response
+
+
+@sync_and_async_middleware
+def sticky_writes(get_response):
+    # pin a client to fresh data after any write it makes: bids, comments, watches, new listings
+    if asyncio.iscoroutinefunction(get_response):
+        async def async_middleware(request):
+            token = _read_your_writes.set(_writes(request) or is_pinned(request))
+            try:
+                response = await get_response(request)
+            finally:
+                _read_your_writes.reset(token)
+            return _pin(request, response)
+        return async_middleware
+
+    def middleware(request):
+        token = _read_your_writes.set(_writes(request) or is_pinned(request))
+        try:
+            response = get_response(request)
+        finally:
+            _read_your_writes.reset(token)
+        return _pin(request, response)
+    return middleware
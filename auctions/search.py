@@ -0,0 +1,89 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import F, Q, OuterRef, Subquery, Sum, Value
+
+from .models import Listing, SearchTerm
+
+# title matches rank above description matches
+ITEM_WEIGHT = 4
+DESCRIPTION_WEIGHT = 1
+MAX_TERM_LENGTH = 40
+MAX_QUERY_TERMS = 8
+TOKEN_RE = re.compile(r'\w+')
+
+OPEN = 'open'
+CLOSED = 'closed'
+
+
+def tokenize(text):
+    return [token[:MAX_TERM_LENGTH] for token in TOKEN_RE.findall((text or '').lower())]
+
+
+def uses_tsvector():
+    return connection.vendor == 'postgresql'
+
+
+def document():
+    return SearchVector('item', weight='A', config='english') + SearchVector('description', weight='B', config='english')
+
+
+def term_weights(item, description):
+    weights = {}
+    for term in tokenize(item):
+        weights[term] = weights.get(term, 0) + ITEM_WEIGHT
+    for term in tokenize(description):
+        weights[term] = weights.get(term, 0) + DESCRIPTION_WEIGHT
+    return weights
+
+
+def index_listing(listing):
+    index_listings(Listing.objects.filter(pk=listing.pk))
+
+
+def index_listings(queryset, batch_size=1000):
+    # refresh the search document of every listing in queryset
+    if uses_tsvector():
+        queryset.update(search_vector=document())
+        return
+    with transaction.atomic():
+        SearchTerm.objects.filter(listing__in=queryset.values('pk')).delete()
+        terms = []
+        for pk, item, description in queryset.values_list('pk', 'item', 'description').iterator(chunk_size=batch_size):
+            for term, weight in term_weights(item, description).items():
+                terms.append(SearchTerm(listing_id=pk, term=term, weight=weight))
+            if len(terms) >= batch_size:
+                SearchTerm.objects.bulk_create(terms)
+                terms = []
+        SearchTerm.objects.bulk_create(terms)
+
+
+def search_listings(query, category=None, status=None):
+    # every query term must match as a word prefix; results carry a 'rank' annotation
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    listings = Listing.objects.all()
+    if category:
+        listings = listings.filter(category=category)
+    if status == OPEN:
+        listings = listings.filter(closed=False)
+    elif status == CLOSED:
+        listings = listings.filter(closed=True)
+    if not terms:
+        # still annotated, so sorting by relevance works on an empty query
+        return listings.annotate(rank=Value(0.0)).none()
+
+    if uses_tsvector():
+        # tokens are \w+ only, so they are safe to splice into a raw tsquery
+        search_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='english')
+        return listings.filter(search_vector=search_query).annotate(rank=SearchRank(F('search_vector'), search_query))
+
+    any_term = Q()
+    for term in terms:
+        listings = listings.filter(pk__in=SearchTerm.objects.filter(term__startswith=term).values('listing'))
+        any_term |= Q(term__startswith=term)
+    rank = (SearchTerm.objects.filter(any_term, listing=OuterRef('pk'))
+            .values('listing')
+            .annotate(total=Sum('weight'))
+            .values('total'))
+    return listings.annotate(rank=Subquery(rank))
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import User, Watchlist, Category, Listing, Comment
+from .cache import invalidate_listing
+from . import recommendations, categories, search, jobs
+
+
+# keep the shared watch table current as watch rows come and go
+@receiver(post_save, sender=Watchlist)
+def watch_created(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.listing_id:
+        recommendations.record_watch(instance.user_id, instance.listing_id)
+
+@receiver(post_delete, sender=Watchlist)
+def watch_deleted(sender, instance, **kwargs):
+    if instance.user_id and instance.listing_id:
+        recommendations.remove_watch(instance.user_id, instance.listing_id)
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    recommendations.remove_user(instance.pk)
+
+
+# categories are cached for the navigation menu, rebuild it on any change
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    categories.invalidate()
+
+
+# keep the search index and image variants current as listings are created or edited
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'item', 'description'} & set(update_fields):
+        search.index_listing(instance)
+    if update_fields is None or 'img' in update_fields:
+        source = instance.img.name if instance.img else ''
+        if instance.variants_source != source:
+            # resizing is slow, leave it to the worker
+            jobs.enqueue('listing_image', listing_id=instance.pk)
+    invalidate_listing(instance.pk, instance.category_id)
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted(sender, instance, **kwargs):
+    invalidate_listing(instance.pk, instance.category_id)
+
+
+# comments are part of the cached listing body
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    if instance.auction_id:
+        invalidate_listing(instance.auction_id)
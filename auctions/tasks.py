@@ -0,0 +1,57 @@
+from django.core.mail import send_mass_mail
+from django.urls import reverse
+
+from .jobs import handler
+from .models import Listing, Bid, User
+from . import images, imports
+
+
+@handler('listing_image')
+def listing_image(listing_id):
+    listing = Listing.objects.filter(pk=listing_id).first()
+    if listing:
+        images.update_listing_variants(listing)
+
+
+@handler('import_listings')
+def import_listings(import_id, limit=None):
+    imports.run_import(import_id, limit)
+
+
+def _watcher_emails(listing, exclude=()):
+    return list(User.objects.filter(watchlist__listing=listing)
+                .exclude(pk__in=[user.pk for user in exclude if user])
+                .exclude(email='')
+                .values_list('email', flat=True)
+                .distinct())
+
+
+def _notify(recipients, subject, message):
+    if recipients:
+        send_mass_mail([(subject, message, None, [recipient]) for recipient in recipients])
+
+
+@handler('bid_placed')
+def bid_placed(listing_id, bid_id):
+    bid = Bid.objects.select_related('auction', 'bidder').filter(pk=bid_id).first()
+    if not bid or not bid.auction:
+        return
+    listing = bid.auction
+    url = reverse('listing', args=[listing.id])
+    _notify(
+        _watcher_emails(listing, exclude=[bid.bidder]),
+        f"New bid on {listing.item}",
+        f"{listing.item} now has a bid of ${bid.bid:.2f}.\n{url}"
+    )
+
+
+@handler('auction_closed')
+def auction_closed(listing_id):
+    listing = Listing.objects.select_related('winner').filter(pk=listing_id).first()
+    if not listing:
+        return
+    winner = listing.winner
+    url = reverse('listing', args=[listing.id])
+    if winner and winner.email:
+        _notify([winner.email], f"You won {listing.item}", f"Your bid of ${listing.current_price:.2f} won.\n{url}")
+    _notify(_watcher_emails(listing, exclude=[winner]), f"{listing.item} has closed", f"The auction for {listing.item} has ended.\n{url}")
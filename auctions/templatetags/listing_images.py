@@ -0,0 +1,21 @@
+from django import template
+
+from auctions.images import srcset
+
+register = template.Library()
+
+
+# renders a <picture> with webp and jpeg srcsets, falling back to the original upload
+@register.inclusion_tag('auctions/picture.html')
+def listing_picture(listing, sizes, css_class=''):
+    variants = listing.img_variants or {}
+    context = {
+        'alt': listing.item,
+        'css_class': css_class,
+        'sizes': sizes,
+        'src': listing.img.url if listing.img else '',
+    }
+    if variants.get('widths'):
+        context['webp_srcset'] = srcset(variants, 'webp')
+        context['jpg_srcset'] = srcset(variants, 'jpg')
+    return context
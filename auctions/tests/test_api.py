@@ -0,0 +1,120 @@
+import json
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from auctions.models import *
+from auctions.bids import place_bid
+
+class TestApi(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.category1 = Category.objects.create(category='test category')
+        self.listing1 = Listing.objects.create(item='Item 1', starting_bid=Decimal('10.00'), seller=self.user1, category=self.category1)
+        self.listing2 = Listing.objects.create(item='Item 2', starting_bid=Decimal('20.00'), seller=self.user1, category=self.category1)
+        self.listing_url = reverse('api listing', args=[self.listing1.id])
+
+    def post_json(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    def test_listing_detail(self):
+        data = self.client.get(self.listing_url).json()
+        self.assertEquals(data['item'], 'Item 1')
+        self.assertEquals(data['current_price'], '10.00')
+        self.assertEquals(data['seller'], 'user1')
+
+    def test_sparse_fields(self):
+        data = self.client.get(self.listing_url, {'fields': 'id,current_price,bogus'}).json()
+        self.assertEquals(data, {'id': self.listing1.id, 'current_price': '10.00'})
+
+    def test_unchanged_listing_answers_304_without_queries(self):
+        etag = self.client.get(self.listing_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.listing_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+
+    def test_if_modified_since_answers_304(self):
+        modified = self.client.get(self.listing_url)['Last-Modified']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.listing_url, HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEquals(response.status_code, 304)
+
+    def test_bid_changes_etag(self):
+        etag = self.client.get(self.listing_url)['ETag']
+        place_bid(self.listing1.id, self.user2, Decimal('12.00'))
+        response = self.client.get(self.listing_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['current_price'], '12.00')
+
+    def test_batch_keeps_order_and_reports_missing(self):
+        response = self.client.get(reverse('api listings batch'), {'ids': f'{self.listing2.id},999,{self.listing1.id}', 'fields': 'id'})
+        self.assertEquals(response.json(), {
+            'results': [{'id': self.listing2.id}, {'id': self.listing1.id}],
+            'missing': [999],
+        })
+
+    def test_listings_collection_uses_browse_parameters(self):
+        data = self.client.get(reverse('api listings'), {'sort': 'price_desc', 'fields': 'item'}).json()
+        self.assertEquals(data['results'], [{'item': 'Item 2'}, {'item': 'Item 1'}])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_create_listing(self):
+        self.client.force_login(self.user1)
+        response = self.post_json(reverse('api listings'), {'item': 'Item 3', 'starting_bid': '5.00', 'category': self.category1.id})
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(Listing.objects.get(pk=response.json()['id']).seller, self.user1)
+
+    def test_writes_require_login(self):
+        response = self.post_json(reverse('api listing bids', args=[self.listing1.id]), {'bid': '12.00'})
+        self.assertEquals(response.status_code, 401)
+
+    def test_place_bid(self):
+        self.client.force_login(self.user2)
+        url = reverse('api listing bids', args=[self.listing1.id])
+        self.assertEquals(self.post_json(url, {'bid': '12.00'}).status_code, 201)
+        response = self.post_json(url, {'bid': '11.00'})
+        self.assertEquals(response.status_code, 409)
+        self.assertEquals(response.json()['error'], "Bid must exceed current")
+        self.assertEquals(self.client.get(url).json()['results'][0]['bid'], '12.00')
+
+    def test_comments(self):
+        self.client.force_login(self.user2)
+        url = reverse('api listing comments', args=[self.listing1.id])
+        self.assertEquals(self.post_json(url, {'comment': 'Nice'}).status_code, 201)
+        self.assertEquals(self.client.get(url, {'fields': 'id,author,comment'}).json()['results'], [
+            {'id': Comment.objects.get().id, 'author': 'user2', 'comment': 'Nice'}
+        ])
+
+    def test_watchlist(self):
+        self.client.force_login(self.user2)
+        self.assertEquals(self.post_json(reverse('api watchlist'), {'listing': self.listing1.id}).status_code, 201)
+        data = self.client.get(reverse('api watchlist'), {'fields': 'id'}).json()
+        self.assertEquals(data['results'], [{'id': self.listing1.id}])
+        self.client.delete(reverse('api watchlist item', args=[self.listing1.id]))
+        self.assertFalse(Watchlist.objects.exists())
+
+    def test_watchlist_rejects_booleans(self):
+        # true is 1 to isinstance(value, int)
+        self.client.force_login(self.user2)
+        self.assertEquals(self.post_json(reverse('api watchlist'), {'listing': True}).status_code, 400)
+        self.assertEquals(self.post_json(reverse('api watchlist bulk'), {'add': [True], 'remove': []}).status_code, 400)
+        self.assertFalse(Watchlist.objects.exists())
+
+    def test_ids_outside_the_key_range_are_rejected(self):
+        self.client.force_login(self.user2)
+        for ident in (0, -1, 2 ** 63):
+            with self.subTest(ident):
+                self.assertEquals(self.post_json(reverse('api watchlist'), {'listing': ident}).status_code, 400)
+                self.assertEquals(self.post_json(reverse('api watchlist bulk'), {'add': [], 'remove': [ident]}).status_code, 400)
+        for ids in (str(2 ** 63), f'{self.listing1.id},abc', '²'):
+            with self.subTest(ids):
+                self.assertEquals(self.client.get(reverse('api listings batch'), {'ids': ids}).status_code, 400)
+        self.assertFalse(Watchlist.objects.exists())
+
+    def test_categories(self):
+        response = self.client.get(reverse('api categories'))
+        self.assertEquals(response.json()['results'], [{'id': self.category1.id, 'category': 'test category'}])
+        self.assertEquals(self.client.get(reverse('api categories'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
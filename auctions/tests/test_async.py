@@ -0,0 +1,54 @@
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.test import TestCase
+from django.urls import reverse
+from auctions.models import *
+
+class TestAsyncViews(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create(username='seller')
+        self.watcher = User.objects.create(username='watcher')
+        self.category = Category.objects.create(category='Toys')
+        self.listing = Listing.objects.create(item='Train set', starting_bid=Decimal('10.00'), seller=self.seller, category=self.category)
+        self.other = Listing.objects.create(item='Kite', starting_bid=Decimal('5.00'), seller=self.seller, category=self.category)
+        Watchlist.objects.create(user=self.watcher, listing=self.listing)
+
+    def test_middleware_chain_stays_async(self):
+        # a sync middleware would make Django hold a thread for every request
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+
+    async def test_read_views(self):
+        for url in (reverse('index'), reverse('category', args=[self.category.id]), reverse('listing', args=[self.listing.id])):
+            with self.subTest(url):
+                response = await self.async_client.get(url)
+                self.assertContains(response, 'Train set')
+
+    async def test_anonymous_watchlist_redirects(self):
+        response = await self.async_client.get(reverse('watchlist'))
+        self.assertEquals(response.status_code, 302)
+        self.assertEquals(response['Location'], f"{settings.LOGIN_URL}?next={reverse('watchlist')}")
+
+    # signed in: the sync client logs in and drives the same async views
+
+    def test_signed_in_listing(self):
+        self.client.force_login(self.watcher)
+        response = self.client.get(reverse('listing', args=[self.listing.id]))
+        self.assertContains(response, 'Remove from Watchlist')
+        self.assertTrue(response.context['watched'])
+
+    def test_watchlist(self):
+        self.client.force_login(self.watcher)
+        response = self.client.get(reverse('watchlist'))
+        self.assertEquals(response.context['listings'], [self.listing])
+
+    def test_post_goes_to_the_sync_view(self):
+        self.client.force_login(self.watcher)
+        response = self.client.post(reverse('listing', args=[self.listing.id]), {'bidder': self.watcher.id, 'bid': '12.00'})
+        self.assertRedirects(response, reverse('listing', args=[self.listing.id]), fetch_redirect_response=False)
+        self.listing.refresh_from_db()
+        self.assertEquals(self.listing.current_price, Decimal('12.00'))
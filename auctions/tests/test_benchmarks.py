@@ -0,0 +1,104 @@
+import json
+import os
+import random
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from auctions.models import *
+from auctions import search
+from auctions.management.commands.run_benchmarks import Command, TestClientSession, percentile
+
+class TestSeedData(TestCase):
+
+    def seed(self, prefix, seed=7):
+        call_command('seed_data', users=5, listings=30, bids=2, watches=3, comments=1, seed=seed,
+                     batch_size=10, prefix=prefix, stdout=StringIO())
+        listings = Listing.objects.filter(seller__username__startswith=f'{prefix}-').order_by('id')
+        return [(listing.item, listing.current_price, listing.bid_count) for listing in listings]
+
+    def test_seeds_every_table(self):
+        self.seed('a')
+        self.assertEquals(User.objects.filter(username__startswith='a-').count(), 5)
+        self.assertEquals(Listing.objects.count(), 30)
+        self.assertTrue(Bid.objects.exists())
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Watchlist.objects.exists())
+
+    def test_denormalized_columns_match_bids(self):
+        self.seed('a')
+        for listing in Listing.objects.filter(bid_count__gt=0).select_related('current_bid'):
+            self.assertEquals(listing.bid_count, listing.bids.count())
+            self.assertEquals(listing.current_bid.bid, listing.current_price)
+        for listing in Listing.objects.filter(bid_count=0):
+            self.assertIsNone(listing.current_bid)
+            self.assertEquals(listing.current_price, listing.starting_bid)
+
+    def test_listings_indexed_batch_by_batch(self):
+        with mock.patch.object(search, 'index_listings', wraps=search.index_listings) as index:
+            self.seed('a')
+        # a batch's listings at a time, never one query naming every seeded id
+        self.assertEquals([call.args[0].count() for call in index.call_args_list], [10, 10, 10])
+        self.assertEquals(Listing.objects.filter(search_terms__isnull=True).count(), 0)
+
+    def test_same_seed_same_data(self):
+        self.assertEquals(self.seed('a'), self.seed('b'))
+        self.assertNotEquals(self.seed('c', seed=8), self.seed('d'))
+
+
+class TestRunBenchmarks(TestCase):
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEquals(percentile(samples, 50), 50)
+        self.assertEquals(percentile(samples, 99), 99)
+        self.assertEquals(percentile([5], 95), 5)
+        self.assertIsNone(percentile([], 50))
+
+    def test_writes_results(self):
+        call_command('seed_data', users=2, listings=20, seed=1, batch_size=10, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('run_benchmarks', requests=4, warmup=1, concurrency=1, output=output, stdout=StringIO())
+            with open(output) as results_file:
+                results = json.load(results_file)
+            self.assertEquals(set(results['flows']), {'browse', 'listing', 'bid', 'watchlist'})
+            for flow in results['flows'].values():
+                self.assertEquals(flow['requests'], 4)
+                self.assertEquals(flow['errors'], 0)
+                self.assertLessEqual(flow['p50_ms'], flow['p99_ms'])
+            self.assertEquals(results['flows']['bid']['rejected'], 0)
+
+            # a second run can be compared against the first
+            out = StringIO()
+            call_command('run_benchmarks', requests=2, warmup=0, concurrency=1, flows='bid', output=output,
+                         compare=output, stdout=out)
+            self.assertIn('compared with', out.getvalue())
+
+    def test_refused_bids_are_counted(self):
+        call_command('seed_data', users=2, listings=5, seed=1, batch_size=10, stdout=StringIO())
+        listing = Listing.objects.filter(closed=False).first()
+        command = Command()
+        command.rng, command.rng_lock = random.Random(1), threading.Lock()
+        command.listings = [listing.id]
+        session = TestClientSession(User.objects.exclude(pk=listing.seller_id).first())
+        command.prices = {listing.id: listing.current_price}
+        self.assertEquals(command.bid_step(session), 201)
+        # another client got there first
+        command.prices = {listing.id: listing.current_price - 10}
+        self.assertEquals(command.bid_step(session), 409)
+        self.assertEquals(command.run([session], command.bid_step, 3)['rejected'], 3)
+
+    def test_exceptions_are_counted_as_errors(self):
+        command = Command(stderr=StringIO())
+        responses = iter([200, RuntimeError('database is locked'), 500, 200])
+        def step(session):
+            response = next(responses)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        results = command.run([None], step, 4)
+        self.assertEquals((results['requests'], results['errors']), (4, 2))
+        self.assertIn('RuntimeError: database is locked', command.stderr.getvalue())
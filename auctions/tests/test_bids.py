@@ -0,0 +1,100 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase
+from django.db.models import F
+from auctions.models import *
+from auctions.bids import *
+
+class TestBids(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create(username='seller')
+        self.bidder1 = User.objects.create(username='bidder1')
+        self.bidder2 = User.objects.create(username='bidder2')
+        self.category1 = Category.objects.create(category='test category')
+        self.listing1 = Listing.objects.create(
+            item='Item 1',
+            starting_bid=Decimal('10.00'),
+            seller=self.seller,
+            category=self.category1
+        )
+
+    def test_accepted_bid_becomes_current(self):
+        result = place_bid(self.listing1.id, self.bidder1, Decimal('11.00'))
+        self.assertTrue(result.accepted)
+        self.listing1.refresh_from_db()
+        self.assertEquals(self.listing1.current_bid, result.bid)
+        self.assertEquals(self.listing1.get_current_bidder(), self.bidder1)
+
+    def test_accepted_bid_updates_price_columns(self):
+        place_bid(self.listing1.id, self.bidder1, Decimal('11.00'))
+        result = place_bid(self.listing1.id, self.bidder2, Decimal('13.50'))
+        self.listing1.refresh_from_db()
+        self.assertEquals(self.listing1.current_price, Decimal('13.50'))
+        self.assertEquals(self.listing1.bid_count, 2)
+        self.assertEquals(self.listing1.last_bid_at, result.bid.created)
+
+    def test_rejected_bid_leaves_price_columns(self):
+        place_bid(self.listing1.id, self.bidder1, Decimal('9.00'))
+        self.listing1.refresh_from_db()
+        self.assertEquals(self.listing1.current_price, Decimal('10.00'))
+        self.assertEquals(self.listing1.bid_count, 0)
+        self.assertIsNone(self.listing1.last_bid_at)
+
+    def test_below_starting_bid_rejected(self):
+        result = place_bid(self.listing1.id, self.bidder1, Decimal('10.00'))
+        self.assertEquals(result.outcome, BELOW_STARTING)
+        self.assertEquals(result.message, "Bid must exceed starting bid and current bid")
+        self.assertFalse(Bid.objects.exists())
+
+    def test_outbid_rejected(self):
+        place_bid(self.listing1.id, self.bidder1, Decimal('12.00'))
+        result = place_bid(self.listing1.id, self.bidder2, Decimal('11.50'))
+        self.assertEquals(result.outcome, OUTBID)
+        self.assertEquals(Bid.objects.count(), 1)
+        self.listing1.refresh_from_db()
+        self.assertEquals(self.listing1.get_current_bid(), Decimal('12.00'))
+
+    def test_closed_listing_rejected(self):
+        self.listing1.closed = True
+        self.listing1.save()
+        result = place_bid(self.listing1.id, self.bidder1, Decimal('50.00'))
+        self.assertEquals(result.outcome, CLOSED)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_concurrent_higher_bid_wins(self):
+        # a competing bid lands between our read and our swap
+        create = Bid.objects.create
+        def race(**kwargs):
+            competing = create(bidder=self.bidder2, bid=Decimal('20.00'))
+            Listing.objects.filter(pk=self.listing1.id).update(
+                current_bid=competing, current_price=competing.bid, bid_count=F('bid_count') + 1)
+            return create(**kwargs)
+        with mock.patch.object(Bid.objects, 'create', side_effect=race):
+            result = place_bid(self.listing1.id, self.bidder1, Decimal('15.00'))
+        # the conditional update rejects the stale bid and rolls its row back
+        self.assertEquals(result.outcome, OUTBID)
+        self.assertFalse(Bid.objects.filter(bid=Decimal('15.00')).exists())
+
+    def test_bid_recorded_against_listing(self):
+        result = place_bid(self.listing1.id, self.bidder1, Decimal('11.00'))
+        self.assertEquals(result.bid.auction, self.listing1)
+
+    def test_bid_history_highest_first(self):
+        place_bid(self.listing1.id, self.bidder1, Decimal('11.00'))
+        place_bid(self.listing1.id, self.bidder2, Decimal('12.00'))
+        place_bid(self.listing1.id, self.bidder1, Decimal('13.00'))
+        amounts = [bid.bid for bid in bid_history(self.listing1)]
+        self.assertEquals(amounts, [Decimal('13.00'), Decimal('12.00'), Decimal('11.00')])
+
+    def test_highest_bids_by_user(self):
+        place_bid(self.listing1.id, self.bidder1, Decimal('11.00'))
+        place_bid(self.listing1.id, self.bidder2, Decimal('12.00'))
+        place_bid(self.listing1.id, self.bidder1, Decimal('13.00'))
+        leaderboard = [(row['bidder'], row['highest']) for row in highest_bids_by_user(self.listing1)]
+        self.assertEquals(leaderboard, [(self.bidder1.id, Decimal('13.00')), (self.bidder2.id, Decimal('12.00'))])
+
+    def test_bids_by_user_newest_first(self):
+        place_bid(self.listing1.id, self.bidder1, Decimal('11.00'))
+        place_bid(self.listing1.id, self.bidder1, Decimal('13.00'))
+        self.assertEquals([bid.bid for bid in bids_by_user(self.bidder1)], [Decimal('13.00'), Decimal('11.00')])
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from auctions.models import *
+from auctions.browse import *
+from auctions.bids import place_bid
+from auctions.feeds import PAGE_SIZE
+
+class TestBrowse(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.category1 = Category.objects.create(category='test category')
+        self.cheap = Listing.objects.create(item='Cheap', starting_bid=Decimal('5.00'), seller=self.user1, category=self.category1)
+        self.pricey = Listing.objects.create(item='Pricey', starting_bid=Decimal('50.00'), seller=self.user1, category=self.category1)
+        self.middle = Listing.objects.create(item='Middle', starting_bid=Decimal('10.00'), seller=self.user1, category=self.category1)
+        self.sold = Listing.objects.create(item='Sold', starting_bid=Decimal('20.00'), seller=self.user1, category=self.category1, closed=True)
+
+    def listings(self, url, **params):
+        response = self.client.get(url, params)
+        return [listing.item for listing in response.context['listings']]
+
+    def test_default_is_newest_first(self):
+        browse, _ = parse_browse(QueryDict())
+        self.assertEquals(browse.ordering, ('-id',))
+        self.assertEquals(self.listings(reverse('index')), ['Sold', 'Middle', 'Pricey', 'Cheap'])
+
+    def test_sort_by_price_uses_current_price(self):
+        place_bid(self.cheap.id, self.user2, Decimal('30.00'))
+        self.assertEquals(self.listings(reverse('index'), sort='price'), ['Middle', 'Sold', 'Cheap', 'Pricey'])
+        self.assertEquals(self.listings(reverse('index'), sort='price_desc'), ['Pricey', 'Cheap', 'Sold', 'Middle'])
+
+    def test_ending_soonest_skips_open_ended(self):
+        now = timezone.now()
+        Listing.objects.filter(pk=self.pricey.id).update(ends_at=now + timedelta(days=2))
+        Listing.objects.filter(pk=self.cheap.id).update(ends_at=now + timedelta(days=1))
+        self.assertEquals(self.listings(reverse('index'), sort='ending'), ['Cheap', 'Pricey'])
+
+    def test_status_and_price_range_filters(self):
+        listings = self.listings(reverse('category', args=[self.category1.id]), status='open', min_price='6', max_price='50')
+        self.assertEquals(listings, ['Middle', 'Pricey'])
+
+    def test_invalid_parameters_dropped(self):
+        browse, _ = parse_browse(QueryDict('sort=drop_table&status=maybe&min_price=abc&max_price=15'))
+        self.assertEquals(browse.key, 'newest|||15.00')
+
+    def test_equivalent_queries_share_key(self):
+        first, _ = parse_browse(QueryDict('min_price=10'))
+        second, _ = parse_browse(QueryDict('sort=newest&min_price=10.00&status='))
+        self.assertEquals(first.key, second.key)
+
+    def test_cached_grids_are_per_query(self):
+        self.listings(reverse('index'))
+        self.assertEquals(self.listings(reverse('index'), status='closed'), ['Sold'])
+
+    def test_pager_keeps_parameters(self):
+        for i in range(PAGE_SIZE):
+            Listing.objects.create(item=f'Extra {i}', starting_bid=Decimal('1.00'), seller=self.user1, category=self.category1)
+        response = self.client.get(reverse('index'), {'sort': 'price', 'status': 'open'})
+        self.assertContains(response, '?sort=price&amp;status=open&cursor=')
+
+    def test_search_sorts_by_relevance_by_default(self):
+        browse, _ = parse_browse(QueryDict(), SEARCH_SORTS)
+        self.assertEquals(browse.ordering, ('-rank', '-id'))
+        browse, _ = parse_browse(QueryDict('sort=relevance'))
+        self.assertEquals(browse.sort, 'newest')
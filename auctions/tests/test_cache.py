@@ -0,0 +1,113 @@
+import time
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from auctions.models import *
+from auctions.cache import *
+from auctions.fragments import listing_body
+from auctions.bids import place_bid
+from auctions import cache as auction_cache, replicas
+
+class TestRemember(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'value {self.calls}'
+
+    def test_computes_once(self):
+        self.assertEquals(remember('key', self.compute), 'value 1')
+        self.assertEquals(remember('key', self.compute), 'value 1')
+        self.assertEquals(self.calls, 1)
+        # the lock is released after the recompute
+        self.assertIsNone(cache.get('key:lock'))
+
+    def test_waits_for_the_lock_holder(self):
+        cache.add('key:lock', 1)
+        # another request finishes its recompute while this one waits
+        with mock.patch.object(auction_cache.time, 'sleep', lambda seconds: cache.set('key', ('theirs', 0.1, None))):
+            self.assertEquals(remember('key', self.compute), 'theirs')
+        self.assertEquals(self.calls, 0)
+
+    def test_gives_up_on_a_stuck_lock(self):
+        cache.add('key:lock', 1)
+        with mock.patch.object(auction_cache, 'LOCK_WAIT', 0.01), mock.patch.object(auction_cache, 'LOCK_POLL', 0.001):
+            self.assertEquals(remember('key', self.compute), 'value 1')
+        # the value is not stored by a request that never held the lock
+        self.assertIsNone(cache.get('key'))
+
+    def test_stale_copy_served_while_another_request_rebuilds(self):
+        cache.set('latest', 'stale')
+        cache.add('key:lock', 1)
+        token = replicas._read_your_writes.set(False)
+        try:
+            self.assertEquals(remember('key', self.compute, stale_key='latest'), 'stale')
+        finally:
+            replicas._read_your_writes.reset(token)
+        self.assertEquals(self.calls, 0)
+
+    def test_writers_never_get_the_stale_copy(self):
+        cache.set('latest', 'stale')
+        cache.add('key:lock', 1)
+        with mock.patch.object(auction_cache, 'LOCK_WAIT', 0.01), mock.patch.object(auction_cache, 'LOCK_POLL', 0.001):
+            self.assertEquals(remember('key', self.compute, stale_key='latest'), 'value 1')
+
+    def test_rebuild_updates_the_stale_copy(self):
+        remember('key', self.compute, stale_key='latest')
+        self.assertEquals(cache.get('latest'), 'value 1')
+
+    def test_refreshes_early_near_expiry(self):
+        cache.set('key', ('old', 0.5, time.time() - 0.001))
+        self.assertEquals(remember('key', self.compute), 'value 1')
+        # far from expiry a hit is a hit
+        cache.set('key', ('old', 0.5, time.time() + 3600))
+        self.assertEquals(remember('key', self.compute), 'old')
+
+    def test_one_early_refresh_at_a_time(self):
+        cache.set('key', ('old', 0.5, time.time() - 0.001))
+        cache.add('key:lock', 1)
+        self.assertEquals(remember('key', self.compute), 'old')
+        self.assertEquals(self.calls, 0)
+
+    def test_lock_released_when_compute_fails(self):
+        def fail():
+            raise RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            remember('key', fail)
+        self.assertIsNone(cache.get('key:lock'))
+
+
+class TestHotListing(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create(username='seller')
+        self.bidder = User.objects.create(username='bidder')
+        category = Category.objects.create(category='Toys')
+        self.listing = Listing.objects.create(item='Item', starting_bid=Decimal('10.00'), seller=seller, category=category)
+
+    def test_viewers_get_the_previous_page_during_a_rebuild(self):
+        listing_body(self.listing.id)
+        place_bid(self.listing.id, self.bidder, Decimal('20.00'))
+        # a viewer is rebuilding the page; the others are served the previous one without queries
+        cache.add(f"{fragment_key('body', 'listing', self.listing.id)}:lock", 1)
+        token = replicas._read_your_writes.set(False)
+        try:
+            with self.assertNumQueries(0):
+                body = listing_body(self.listing.id)
+        finally:
+            replicas._read_your_writes.reset(token)
+        self.assertEquals(body['listing'].current_price, Decimal('10.00'))
+
+
+class TestCacheSettings(TestCase):
+
+    def test_namespaced_and_versioned(self):
+        self.assertTrue(settings.CACHES['default']['KEY_PREFIX'])
+        self.assertIsInstance(settings.CACHES['default']['VERSION'], int)
+        self.assertEquals(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.cached_db')
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+from auctions.models import *
+from auctions.categories import *
+from auctions.context_processors import categories
+
+class TestCategories(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category_b = Category.objects.create(category='B category')
+        self.category_a = Category.objects.create(category='A category')
+
+    def test_sorted_by_name(self):
+        self.assertEquals(get_categories(), [self.category_a, self.category_b])
+
+    def test_warm_registry_costs_no_queries(self):
+        get_categories()
+        with self.assertNumQueries(0):
+            categories(RequestFactory().get('/'))
+
+    def test_save_invalidates(self):
+        get_categories()
+        category_c = Category.objects.create(category='C category')
+        self.assertEquals(get_categories(), [self.category_a, self.category_b, category_c])
+
+    def test_delete_invalidates(self):
+        get_categories()
+        self.category_b.delete()
+        self.assertEquals(get_categories(), [self.category_a])
+
+    def test_shared_cache_rebuilt_after_flush(self):
+        get_categories()
+        cache.clear()
+        Category.objects.filter(pk=self.category_b.pk).update(category='Z category')
+        # a fresh version forces a reload even though the process still holds the old list
+        self.assertEquals([str(c) for c in get_categories()], ['A category', 'Z category'])
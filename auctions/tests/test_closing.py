@@ -0,0 +1,94 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from auctions.models import *
+from auctions.bids import *
+from auctions.closing import close_expired, close_auction
+from auctions.forms import NewListingForm
+
+class TestClosing(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.seller = User.objects.create(username='seller')
+        self.bidder1 = User.objects.create(username='bidder1')
+        self.category1 = Category.objects.create(category='test category')
+
+    def create_listing(self, **kwargs):
+        return Listing.objects.create(item='Item', starting_bid=Decimal('10.00'), seller=self.seller, category=self.category1, **kwargs)
+
+    def test_sweep_closes_expired_and_records_winner(self):
+        listing = self.create_listing(ends_at=self.now + timedelta(hours=1))
+        place_bid(listing.id, self.bidder1, Decimal('11.00'))
+        unsold = self.create_listing(ends_at=self.now + timedelta(minutes=1))
+        self.assertEquals(close_expired(now=self.now + timedelta(hours=2)), 2)
+        listing.refresh_from_db()
+        unsold.refresh_from_db()
+        self.assertTrue(listing.closed)
+        self.assertEquals(listing.winner, self.bidder1)
+        self.assertTrue(unsold.closed)
+        self.assertIsNone(unsold.winner)
+        self.assertTrue(Job.objects.filter(name='auction_closed', payload={'listing_id': listing.id}).exists())
+
+    def test_sweep_leaves_running_and_open_ended_listings(self):
+        self.create_listing(ends_at=self.now + timedelta(hours=1))
+        self.create_listing()
+        self.assertEquals(close_expired(now=self.now), 0)
+        self.assertFalse(Listing.objects.filter(closed=True).exists())
+
+    def test_sweep_works_in_batches(self):
+        for i in range(5):
+            self.create_listing(ends_at=self.now - timedelta(minutes=i + 1))
+        self.assertEquals(close_expired(now=self.now, batch_size=2), 5)
+        self.assertEquals(Listing.objects.filter(closed=False).count(), 0)
+
+    def test_command_sweeps_once(self):
+        self.create_listing(ends_at=self.now - timedelta(minutes=1))
+        out = StringIO()
+        call_command('close_auctions', '--once', stdout=out)
+        self.assertIn('closed 1 auctions', out.getvalue())
+
+    def test_seller_close_records_winner(self):
+        listing = self.create_listing()
+        place_bid(listing.id, self.bidder1, Decimal('11.00'))
+        self.assertTrue(close_auction(listing))
+        self.assertFalse(close_auction(listing))
+        listing.refresh_from_db()
+        self.assertEquals(listing.winner, self.bidder1)
+
+    def test_late_bid_extends_end_time(self):
+        listing = self.create_listing(ends_at=timezone.now() + timedelta(minutes=1))
+        result = place_bid(listing.id, self.bidder1, Decimal('11.00'))
+        listing.refresh_from_db()
+        self.assertGreaterEqual(listing.ends_at, result.bid.created + SNIPE_WINDOW - timedelta(seconds=1))
+        # the extension keeps the listing out of a sweep at the original end time
+        self.assertEquals(close_expired(now=timezone.now() + timedelta(minutes=2)), 0)
+
+    def test_early_bid_keeps_end_time(self):
+        ends_at = timezone.now() + timedelta(hours=1)
+        listing = self.create_listing(ends_at=ends_at)
+        place_bid(listing.id, self.bidder1, Decimal('11.00'))
+        listing.refresh_from_db()
+        self.assertEquals(listing.ends_at, ends_at)
+
+    def test_bid_after_end_rejected_before_sweep(self):
+        listing = self.create_listing(ends_at=timezone.now() - timedelta(seconds=1))
+        self.assertEquals(place_bid(listing.id, self.bidder1, Decimal('11.00')).outcome, CLOSED)
+        self.assertFalse(Bid.objects.exists())
+
+    def test_bid_before_start_rejected(self):
+        listing = self.create_listing(starts_at=timezone.now() + timedelta(hours=1))
+        self.assertEquals(place_bid(listing.id, self.bidder1, Decimal('11.00')).outcome, NOT_STARTED)
+
+    def test_form_rejects_past_end_time(self):
+        form = NewListingForm(data={
+            'item': 'Item',
+            'starting_bid': 1.00,
+            'category': self.category1.id,
+            'seller': self.seller.id,
+            'ends_at': (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertIn('ends_at', form.errors)
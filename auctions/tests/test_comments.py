@@ -0,0 +1,50 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from auctions.models import *
+from auctions.feeds import comment_feed, COMMENT_PAGE_SIZE
+
+class TestComments(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.category1 = Category.objects.create(category='test category')
+        self.listing1 = Listing.objects.create(item='Item 1', starting_bid=1.00, seller=self.user1, category=self.category1)
+        start = timezone.now() - timedelta(hours=1)
+        for i in range(COMMENT_PAGE_SIZE + 5):
+            Comment.objects.create(auction=self.listing1, author=self.user2, comment=f'Comment {i}', created_at=start + timedelta(minutes=i))
+        self.listing_url = reverse('listing', args=[self.listing1.id])
+
+    def test_newest_first_in_pages(self):
+        page = comment_feed(self.listing1.id)
+        self.assertEquals(len(page), COMMENT_PAGE_SIZE)
+        self.assertEquals(page.items[0].comment, f'Comment {COMMENT_PAGE_SIZE + 4}')
+        rest = comment_feed(self.listing1.id, page.next_cursor)
+        self.assertEquals([comment.comment for comment in rest], [f'Comment {i}' for i in range(4, -1, -1)])
+        self.assertFalse(rest.has_next)
+
+    def test_page_loads_authors_in_one_query(self):
+        with self.assertNumQueries(1):
+            for comment in comment_feed(self.listing1.id):
+                str(comment.author)
+
+    def test_listing_page_shows_first_page(self):
+        response = self.client.get(self.listing_url)
+        self.assertEquals(len(response.context['comments']), COMMENT_PAGE_SIZE)
+        self.assertNotContains(response, 'Comment 4<')
+        self.assertContains(response, 'Older comments')
+
+    def test_comments_endpoint_serves_next_page(self):
+        cursor = self.client.get(self.listing_url).context['comments_cursor']
+        response = self.client.get(reverse('listing comments', args=[self.listing1.id]), {'cursor': cursor})
+        self.assertContains(response, 'Comment 4<')
+        self.assertNotContains(response, 'Older comments')
+
+    def test_new_comment_refreshes_cached_first_page(self):
+        self.client.get(self.listing_url)
+        Comment.objects.create(auction=self.listing1, author=self.user2, comment='Latest')
+        self.assertEquals(self.client.get(self.listing_url).context['comments'][0].comment, 'Latest')
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from auctions.models import *
+from auctions.bids import place_bid
+
+class TestConditionalPages(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create(username='seller')
+        self.bidder = User.objects.create(username='bidder')
+        self.category = Category.objects.create(category='Toys')
+        self.listing = Listing.objects.create(item='Item', starting_bid=Decimal('10.00'), seller=self.seller, category=self.category)
+        self.urls = {
+            'index': reverse('index'),
+            'category': reverse('category', args=[self.category.id]),
+            'listing': reverse('listing', args=[self.listing.id]),
+        }
+
+    def test_unchanged_pages_answer_304_without_queries(self):
+        for name, url in self.urls.items():
+            with self.subTest(name):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEquals(response.status_code, 304)
+
+    def test_a_bid_changes_every_page_it_shows_on(self):
+        etags = {name: self.client.get(url)['ETag'] for name, url in self.urls.items()}
+        place_bid(self.listing.id, self.bidder, Decimal('20.00'))
+        for name, url in self.urls.items():
+            with self.subTest(name):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[name])
+                self.assertEquals(response.status_code, 200)
+                self.assertContains(response, '20.00')
+
+    def test_query_string_is_part_of_the_etag(self):
+        url = self.urls['index']
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url, {'sort': 'price'})['ETag'])
+
+    def test_anonymous_pages_are_public_and_cookie_free(self):
+        for name, url in self.urls.items():
+            with self.subTest(name):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                self.assertFalse(response.cookies)
+                self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_signed_in_pages_are_private(self):
+        anonymous = self.client.get(self.urls['index'])['ETag']
+        self.client.force_login(self.bidder)
+        response = self.client.get(self.urls['index'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertNotEqual(response['ETag'], anonymous)
+        # the listing page holds per-user state the versions do not cover
+        response = self.client.get(self.urls['listing'])
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertContains(response, 'csrfmiddlewaretoken')
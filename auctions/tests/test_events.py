@@ -0,0 +1,95 @@
+import asyncio
+import os
+import unittest
+from decimal import Decimal
+from unittest import mock
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from auctions.models import *
+from auctions.events import *
+from auctions.bids import place_bid
+
+class TestEventStream(SimpleTestCase):
+
+    async def test_stream_delivers_published_events(self):
+        sent = []
+        done = asyncio.Event()
+
+        async def receive():
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message.get('body', b'').startswith(b'event:'):
+                done.set()
+
+        app = with_listing_events(None)
+        stream = asyncio.ensure_future(app({'type': 'http', 'path': '/listing/7/events'}, receive, send))
+        await asyncio.sleep(0.01)
+        get_broker().publish(7, {'type': 'bid', 'data': {'amount': '5.00'}})
+        await asyncio.wait_for(stream, 1)
+
+        self.assertEquals(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertEquals(sent[-1]['body'], b'event: bid\ndata: {"amount": "5.00"}\n\n')
+        # the subscriber is gone once the client disconnects
+        self.assertEquals(get_broker()._subscribers.get(7), None)
+
+    async def test_other_paths_reach_django(self):
+        django_app = mock.AsyncMock()
+        await with_listing_events(django_app)({'type': 'http', 'path': '/listing/7'}, None, None)
+        django_app.assert_awaited_once()
+
+    async def test_events_only_for_subscribed_listing(self):
+        broker = InProcessBroker()
+        queue = broker.subscribe(1)
+        broker.publish(2, {'type': 'bid', 'data': {}})
+        await asyncio.sleep(0)
+        self.assertTrue(queue.empty())
+        broker.publish(1, {'type': 'bid', 'data': {}})
+        await asyncio.sleep(0)
+        self.assertEquals(queue.get_nowait()['type'], 'bid')
+
+
+class TestRedisBroker(SimpleTestCase):
+
+    def test_publish_survives_redis_outage(self):
+        # nothing listens on port 1; the committed change must not turn into an error
+        with self.assertLogs('auctions.events', 'WARNING'):
+            RedisBroker('redis://127.0.0.1:1/0').publish(7, {'type': 'bid', 'data': {}})
+
+    @unittest.skipUnless(os.environ.get('REDIS_URL'), "needs a redis server")
+    async def test_events_cross_processes(self):
+        # two brokers stand in for two processes, say the clock and a web worker
+        publisher, subscriber = RedisBroker(os.environ['REDIS_URL']), RedisBroker(os.environ['REDIS_URL'])
+        queue = subscriber.subscribe(7)
+        await asyncio.sleep(0.2)
+        publisher.publish(7, {'type': 'closed', 'data': {}})
+        self.assertEquals((await asyncio.wait_for(queue.get(), 2))['type'], 'closed')
+        subscriber.unsubscribe(7, queue)
+
+
+class TestEventPublishing(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.category1 = Category.objects.create(category='test category')
+        self.listing1 = Listing.objects.create(item='Item 1', starting_bid=1.00, seller=self.user1, category=self.category1)
+
+    def test_accepted_bid_published_after_commit(self):
+        with mock.patch('auctions.events.get_broker') as get_broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.listing1.id, self.user2, Decimal('2.00'))
+        get_broker().publish.assert_called_once_with(self.listing1.id, {'type': 'bid', 'data': {'amount': '2.00'}})
+
+    def test_rejected_bid_not_published(self):
+        with mock.patch('auctions.events.get_broker') as get_broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.listing1.id, self.user2, Decimal('0.50'))
+        get_broker().publish.assert_not_called()
+
+    def test_wsgi_fallback_stops_reconnects(self):
+        response = self.client.get(reverse('listing events', args=[self.listing1.id]))
+        self.assertEquals(response.status_code, 204)
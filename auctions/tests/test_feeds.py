@@ -0,0 +1,95 @@
+from django.test import TestCase
+from django.urls import reverse
+from auctions.models import *
+from auctions.feeds import *
+
+class TestFeeds(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.category1 = Category.objects.create(category='test category')
+        # create 5 listings, each with a current bid
+        self.listings = []
+        for i in range(5):
+            bid = Bid.objects.create(bidder=self.user1, bid=10 + i)
+            self.listings.append(Listing.objects.create(
+                item=f'Item {i}',
+                starting_bid=1.00,
+                current_bid=bid,
+                seller=self.user1,
+                category=self.category1
+            ))
+
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor([42, 'abc'])
+        self.assertEquals(decode_cursor(cursor, 2), ['42', 'abc'])
+
+    def test_invalid_cursor_ignored(self):
+        self.assertIsNone(decode_cursor('not a cursor!', 1))
+        self.assertIsNone(decode_cursor(encode_cursor([1, 2]), 1))
+        self.assertIsNone(decode_cursor(None, 1))
+
+    def test_tampered_cursor_restarts(self):
+        first = listing_feed(Listing.objects.all(), page_size=2).items
+        for values in (['abc'], [None], [[1]]):
+            with self.subTest(values):
+                self.assertEquals(listing_feed(Listing.objects.all(), encode_cursor(values), page_size=2).items, first)
+        # values checked by the type of the field they are compared with
+        self.assertEquals(listing_feed(Listing.objects.all(), encode_cursor(['1.x', 1]), ordering=('current_price', 'id')).items,
+                          listing_feed(Listing.objects.all(), ordering=('current_price', 'id')).items)
+        self.assertEquals(comment_feed(self.listings[0].id, encode_cursor(['yesterday', 1])).items, [])
+
+    def test_tampered_cursor_in_views(self):
+        listing = self.listings[0]
+        Comment.objects.create(auction=listing, author=self.user1, comment='First')
+        for url, params in (
+            (reverse('index'), {'cursor': encode_cursor(['abc'])}),
+            (reverse('index'), {'cursor': encode_cursor(['1.x', 1]), 'sort': 'price'}),
+            (reverse('category', args=[self.category1.id]), {'cursor': encode_cursor([None])}),
+            (reverse('listing comments', args=[listing.id]), {'cursor': encode_cursor(['2020-13-45', 1])}),
+            (reverse('api listings'), {'cursor': encode_cursor(['not a date', 1]), 'sort': 'ending'}),
+        ):
+            with self.subTest(url=url, params=params):
+                self.assertEquals(self.client.get(url, params).status_code, 200)
+
+    def test_paginate_newest_first(self):
+        page = listing_feed(Listing.objects.all(), page_size=2)
+        self.assertEquals(page.items, [self.listings[4], self.listings[3]])
+        self.assertTrue(page.has_next)
+
+    def test_paginate_follows_cursor_to_end(self):
+        seen = []
+        cursor = None
+        while True:
+            page = listing_feed(Listing.objects.all(), cursor, page_size=2)
+            seen.extend(page.items)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        # every listing visited exactly once, newest first
+        self.assertEquals(seen, list(reversed(self.listings)))
+
+    def test_cursor_stable_under_inserts(self):
+        page = listing_feed(Listing.objects.all(), page_size=2)
+        # a listing created after the first page was served must not shift the second page
+        Listing.objects.create(item='New', starting_bid=1.00, seller=self.user1, category=self.category1)
+        next_page = listing_feed(Listing.objects.all(), page.next_cursor, page_size=2)
+        self.assertEquals(next_page.items, [self.listings[2], self.listings[1]])
+
+    def test_page_loads_related_in_one_query(self):
+        with self.assertNumQueries(1):
+            page = listing_feed(Listing.objects.all())
+            for listing in page:
+                str(listing.category)
+                listing.current_price
+
+    def test_index_query_count_does_not_grow(self):
+        for i in range(10):
+            Listing.objects.create(item=f'Extra {i}', starting_bid=1.00, seller=self.user1, category=self.category1)
+        # page query + category navigation
+        with self.assertNumQueries(2):
+            self.client.get(reverse('index'))
+
+    def test_index_next_cursor(self):
+        response = self.client.get(reverse('index'))
+        self.assertIsNone(response.context['next_cursor'])
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from auctions.models import *
+from auctions.bids import place_bid
+
+class TestFragments(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.category1 = Category.objects.create(category='test category')
+        self.listing1 = Listing.objects.create(
+            item='Item 1',
+            starting_bid=Decimal('10.00'),
+            seller=self.user1,
+            category=self.category1
+        )
+        self.listing_url = reverse('listing', args=[self.listing1.id])
+
+    def test_anonymous_listing_hit_skips_orm(self):
+        self.client.get(self.listing_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.listing_url)
+        self.assertContains(response, 'Item 1')
+
+    def test_anonymous_index_hit_skips_orm(self):
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Item 1')
+
+    def test_anonymous_category_hit_skips_orm(self):
+        url = reverse('category', args=[self.category1.id])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Category: test category')
+
+    def test_bid_refreshes_listing_and_grid(self):
+        self.client.get(self.listing_url)
+        self.client.get(reverse('index'))
+        place_bid(self.listing1.id, self.user2, Decimal('12.50'))
+        self.assertContains(self.client.get(self.listing_url), '$12.50')
+        self.assertContains(self.client.get(reverse('index')), 'Current Bid: $12.50')
+
+    def test_comment_refreshes_listing(self):
+        self.client.get(self.listing_url)
+        Comment.objects.create(auction=self.listing1, author=self.user2, comment='Nice item')
+        self.assertContains(self.client.get(self.listing_url), 'Nice item')
+
+    def test_close_refreshes_grid(self):
+        self.client.get(reverse('index'))
+        self.listing1.closed = True
+        self.listing1.save(update_fields=['closed'])
+        self.assertContains(self.client.get(reverse('index')), 'Sold!')
+
+    def test_user_specific_parts_not_cached(self):
+        # an anonymous visit warms the cache, the seller still gets the close button
+        self.client.get(self.listing_url)
+        self.client.force_login(self.user1)
+        self.assertContains(self.client.get(self.listing_url), 'Close Auction')
@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Template, Context
+from django.test import TestCase, override_settings
+from auctions.models import *
+from auctions.images import *
+from auctions.jobs import run_pending
+from auctions.cache import get_version
+
+MEDIA_DIR = tempfile.mkdtemp()
+
+def make_image(width, height, fmt='PNG'):
+    buffer = BytesIO()
+    Image.new('RGBA' if fmt == 'PNG' else 'RGB', (width, height), (200, 30, 30)).save(buffer, fmt)
+    return buffer.getvalue()
+
+@override_settings(MEDIA_ROOT=MEDIA_DIR)
+class TestImages(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.category1 = Category.objects.create(category='test category')
+
+    def create_listing(self, content, name='photo.png'):
+        listing = Listing.objects.create(
+            item='Item 1',
+            starting_bid=1.00,
+            seller=self.user1,
+            category=self.category1,
+            img=SimpleUploadedFile(name=name, content=content, content_type='image/png')
+        )
+        # variants are built by the background worker
+        run_pending()
+        listing.refresh_from_db()
+        return listing
+
+    def test_variants_generated_on_save(self):
+        listing = self.create_listing(make_image(1200, 900))
+        self.assertEquals(listing.img_variants['widths'], [250, 400, 800])
+        with default_storage.open(variant_name(listing.img.name, 400, 'webp')) as file:
+            self.assertEquals(Image.open(file).size, (400, 300))
+        with default_storage.open(variant_name(listing.img.name, 250, 'jpg')) as file:
+            self.assertEquals(Image.open(file).format, 'JPEG')
+
+    def test_small_image_not_upscaled(self):
+        listing = self.create_listing(make_image(300, 300))
+        self.assertEquals(listing.img_variants['widths'], [250, 300])
+
+    def test_invalid_image_has_no_variants(self):
+        listing = self.create_listing(b'not an image', name='broken.png')
+        self.assertEquals(listing.img_variants, {})
+
+    def test_same_stem_different_extension(self):
+        jpg = self.create_listing(make_image(600, 400, 'JPEG'), name='hat.jpg')
+        png = self.create_listing(make_image(500, 400), name='hat.png')
+        self.assertNotEqual(variant_name(jpg.img.name, 250, 'webp'), variant_name(png.img.name, 250, 'webp'))
+        # replacing one image removes its variants and leaves the other's in place
+        jpg.img = SimpleUploadedFile(name='cap.png', content=make_image(300, 300), content_type='image/png')
+        jpg.save()
+        run_pending()
+        self.assertFalse(default_storage.exists(variant_name('hat.jpg', 250, 'webp')))
+        with default_storage.open(variant_name(png.img.name, 250, 'webp')) as file:
+            self.assertEquals(Image.open(file).size, (250, 200))
+
+    def test_shared_image_found_by_variants_source(self):
+        listing = self.create_listing(make_image(600, 400))
+        other = Listing.objects.create(item='Item 2', starting_bid=1.00, seller=self.user1, category=self.category1, img=listing.img.name)
+        with self.assertNumQueries(2):
+            # lookup of the shared manifest, then the update
+            self.assertEquals(update_listing_variants(other), listing.img_variants)
+        self.assertEquals(Listing.objects.get(pk=other.pk).variants_source, listing.img.name)
+
+    def test_command_builds_missing_variants(self):
+        listing = self.create_listing(make_image(500, 500))
+        Listing.objects.filter(pk=listing.pk).update(img_variants={}, variants_source='')
+        # a listing without a picture at all
+        Listing.objects.create(item='Item 2', starting_bid=1.00, seller=self.user1, category=self.category1)
+        Listing.objects.filter(item='Item 2').update(img=None)
+        versions = get_version('listing', listing.id), get_version('category', self.category1.id), get_version('catalog')
+        out = StringIO()
+        call_command('build_image_variants', workers=1, stdout=out)
+        self.assertIn('processed 1 images', out.getvalue())
+        listing.refresh_from_db()
+        self.assertEquals(listing.variants_source, listing.img.name)
+        self.assertEquals(listing.img_variants['widths'], [250, 400, 500])
+        # cached pages and cards showing the listing are rebuilt
+        self.assertNotEqual(get_version('listing', listing.id), versions[0])
+        self.assertNotEqual(get_version('category', self.category1.id), versions[1])
+        self.assertNotEqual(get_version('catalog'), versions[2])
+
+    def test_picture_tag_emits_srcset(self):
+        listing = self.create_listing(make_image(1200, 900))
+        html = Template('{% load listing_images %}{% listing_picture listing "350px" "card-img-top" %}').render(Context({'listing': listing}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'{variant_name(listing.img.name, 800, "webp")} 800w', html)
+        self.assertIn('sizes="350px"', html)
+
+    def test_picture_tag_without_variants(self):
+        listing = Listing.objects.create(item='Item 1', starting_bid=1.00, seller=self.user1, category=self.category1)
+        html = Template('{% load listing_images %}{% listing_picture listing "350px" %}').render(Context({'listing': listing}))
+        self.assertIn(f'src="{listing.img.url}"', html)
+        self.assertNotIn('srcset', html)
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_DIR, ignore_errors=True)
@@ -0,0 +1,220 @@
+import json
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from auctions.models import *
+from auctions.imports import import_listings, read_rows, run_import, ImportFailed, CSV, JSONL, UPLOAD_DIR
+from auctions.images import WIDTHS, FORMATS, variant_name
+from auctions.jobs import run_pending
+from auctions.search import search_listings
+from auctions import api
+from auctions.cache import get_version
+
+MEDIA_DIR = tempfile.mkdtemp()
+
+def make_archive(**members):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+def make_image(width=600, height=400):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (30, 30, 200)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+@override_settings(MEDIA_ROOT=MEDIA_DIR)
+class TestImports(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create(username='seller')
+        self.toys = Category.objects.create(category='Toys')
+        self.books = Category.objects.create(category='Books')
+
+    def import_csv(self, text, **kwargs):
+        return import_listings(read_rows(StringIO(text), CSV), self.seller, **kwargs)
+
+    def test_csv_rows_become_listings(self):
+        result = self.import_csv(
+            "item,description,starting_bid,category\n"
+            "Wooden train,Painted engine,12.50,Toys\n"
+            f"Atlas,,5,{self.books.id}\n"
+        )
+        self.assertEquals((result.created, result.rejected), (2, 0))
+        train = Listing.objects.get(item='Wooden train')
+        self.assertEquals(train.seller, self.seller)
+        self.assertEquals(train.category, self.toys)
+        self.assertEquals(train.current_price, Decimal('12.50'))
+        self.assertEquals(Listing.objects.get(item='Atlas').category, self.books)
+        # bulk_create sends no signals, the importer indexes the rows itself
+        self.assertEquals(list(search_listings('train')), [train])
+
+    def test_invalid_rows_are_reported_and_the_rest_imported(self):
+        result = self.import_csv(
+            "item,starting_bid,category,ends_at\n"
+            "Good,10,Toys,\n"
+            ",10,Toys,\n"
+            "Free,0,Toys,\n"
+            "Lost,10,Garden,\n"
+            "Late,10,Toys,2000-01-01 00:00\n"
+        )
+        self.assertEquals((result.created, result.rejected), (1, 4))
+        self.assertEquals([error['line'] for error in result.errors], [3, 4, 5, 6])
+        self.assertIn('item', result.errors[0]['errors'])
+        self.assertIn('starting_bid', result.errors[1]['errors'])
+        self.assertIn('category', result.errors[2]['errors'])
+        self.assertEquals(result.errors[3]['errors']['ends_at'], ["End time must be in the future"])
+        self.assertEquals(list(Listing.objects.values_list('item', flat=True)), ['Good'])
+
+    def test_jsonl_in_batches(self):
+        lines = [json.dumps({'item': f'Item {i}', 'starting_bid': i + 1, 'category': 'toys'}) for i in range(5)]
+        lines.insert(2, '[1, 2]')
+        result = import_listings(read_rows(StringIO('\n'.join(lines)), JSONL), self.seller, batch_size=2)
+        self.assertEquals((result.created, result.rejected), (5, 1))
+        self.assertEquals(result.errors[0]['line'], 3)
+        self.assertEquals(Listing.objects.filter(seller=self.seller).count(), 5)
+
+    def test_limit(self):
+        result = self.import_csv("item,starting_bid,category\nA,1,Toys\nB,1,Toys\nC,1,Toys\nD,1,Toys\n", limit=2)
+        self.assertTrue(result.truncated)
+        self.assertEquals(result.skipped, 2)
+        self.assertEquals(Listing.objects.count(), 2)
+        result = self.import_csv("item,starting_bid,category\nE,1,Toys\n", limit=2)
+        self.assertEquals((result.truncated, result.skipped), (False, 0))
+
+    def test_browse_pages_are_invalidated(self):
+        versions = get_version('catalog'), get_version('category', self.toys.id), get_version('category', self.books.id)
+        self.import_csv("item,starting_bid,category\nA,1,Toys\n")
+        self.assertNotEqual(get_version('catalog'), versions[0])
+        self.assertNotEqual(get_version('category', self.toys.id), versions[1])
+        self.assertEquals(get_version('category', self.books.id), versions[2])
+
+    def test_images_from_archive(self):
+        archive = zipfile.ZipFile(make_archive(**{'photos/train.png': make_image(), 'broken.png': b'not an image'}))
+        result = self.import_csv(
+            "item,starting_bid,category,img\n"
+            "Train,10,Toys,photos/train.png\n"
+            "Broken,10,Toys,broken.png\n"
+            "Missing,10,Toys,missing.png\n"
+            "Plain,10,Toys,\n",
+            archive=archive, workers=2,
+        )
+        self.assertEquals((result.created, result.rejected), (2, 2))
+        self.assertEquals([error['line'] for error in result.errors], [3, 4])
+        train = Listing.objects.get(item='Train')
+        self.assertTrue(default_storage.exists(train.img.name))
+        self.assertEquals(train.img_variants, {'source': train.img.name, 'widths': [250, 400, 600]})
+        self.assertEquals(Listing.objects.get(item='Plain').img.name, 'default_img.png')
+
+    def test_image_without_archive(self):
+        result = self.import_csv("item,starting_bid,category,img\nTrain,10,Toys,train.png\n")
+        self.assertEquals(result.errors[0]['errors'], {'img': ["No image archive was uploaded"]})
+
+    def test_failed_batch_removes_its_images(self):
+        archive = zipfile.ZipFile(make_archive(**{'lamp.png': make_image()}))
+        with mock.patch.object(Listing.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.import_csv("item,starting_bid,category,img\nLamp,10,Toys,lamp.png\n", archive=archive)
+        self.assertFalse(default_storage.exists('lamp.png'))
+        for width in WIDTHS:
+            for ext in FORMATS:
+                self.assertFalse(default_storage.exists(variant_name('lamp.png', width, ext)))
+
+    def test_unreadable_file_removes_the_images_of_its_batch(self):
+        def rows():
+            yield 2, {'item': 'Kite', 'starting_bid': '10', 'category': 'Toys', 'img': 'kite.png'}
+            raise ImportFailed("line 3: unreadable")
+        archive = zipfile.ZipFile(make_archive(**{'kite.png': make_image()}))
+        with self.assertRaises(ImportFailed):
+            import_listings(rows(), self.seller, archive)
+        self.assertFalse(Listing.objects.exists())
+        self.assertFalse(default_storage.exists('kite.png'))
+
+    def test_api_import(self):
+        url = reverse('api listings import')
+        rows = SimpleUploadedFile('listings.csv', b"item,starting_bid,category,img\nTrain,10,Toys,train.png\nBad,x,Toys,\n")
+        self.assertEquals(self.client.post(url, {'file': rows}).status_code, 401)
+        self.client.force_login(self.seller)
+        rows.seek(0)
+        images = SimpleUploadedFile('images.zip', make_archive(**{'train.png': make_image()}).getvalue())
+        response = self.client.post(url, {'file': rows, 'images': images})
+        # the rows are imported by the worker
+        self.assertEquals(response.status_code, 202)
+        data = response.json()
+        self.assertEquals(data['status'], 'pending')
+        self.assertEquals(response['Location'], data['url'])
+        self.assertFalse(Listing.objects.exists())
+
+        run_pending()
+        data = self.client.get(data['url']).json()
+        self.assertEquals(data['status'], 'done')
+        self.assertEquals((data['created'], data['rejected'], data['truncated'], data['skipped']), (1, 1, False, 0))
+        self.assertEquals(data['errors'][0]['line'], 3)
+        self.assertEquals(Listing.objects.get().item, 'Train')
+        # the uploads are removed once imported
+        self.assertEquals(default_storage.listdir(UPLOAD_DIR)[1], [])
+        # and the import is not run again
+        run_import(data['id'])
+        self.assertEquals(Listing.objects.count(), 1)
+
+    def test_api_import_reports_rows_past_the_limit(self):
+        self.client.force_login(self.seller)
+        rows = SimpleUploadedFile('listings.csv', b"item,starting_bid,category\nA,1,Toys\nB,1,Toys\nC,1,Toys\n")
+        with mock.patch.object(api, 'IMPORT_LIMIT', 1):
+            url = self.client.post(reverse('api listings import'), {'file': rows}).json()['url']
+        run_pending()
+        data = self.client.get(url).json()
+        self.assertEquals((data['created'], data['truncated'], data['skipped']), (1, True, 2))
+
+    def test_api_import_failure_is_reported(self):
+        self.client.force_login(self.seller)
+        rows = SimpleUploadedFile('listings.csv', b"item,starting_bid,category\n\xff\xfe,1,Toys\n")
+        url = self.client.post(reverse('api listings import'), {'file': rows}).json()['url']
+        run_pending()
+        data = self.client.get(url).json()
+        self.assertEquals((data['status'], data['error']), ('failed', "File is not UTF-8 text"))
+
+    def test_api_import_status_is_private(self):
+        self.client.force_login(self.seller)
+        rows = SimpleUploadedFile('listings.csv', b"item,starting_bid,category\nKite,1,Toys\n")
+        url = self.client.post(reverse('api listings import'), {'file': rows}).json()['url']
+        self.client.force_login(User.objects.create(username='other'))
+        self.assertEquals(self.client.get(url).status_code, 404)
+
+    def test_api_rejects_unknown_files(self):
+        self.client.force_login(self.seller)
+        response = self.client.post(reverse('api listings import'), {'file': SimpleUploadedFile('listings.xlsx', b'...')})
+        self.assertEquals(response.status_code, 400)
+        self.assertIn('Unsupported file type', response.json()['error'])
+        rows = SimpleUploadedFile('listings.csv', b"item,starting_bid,category\n")
+        response = self.client.post(reverse('api listings import'), {'file': rows, 'images': SimpleUploadedFile('images.zip', b'...')})
+        self.assertEquals(response.status_code, 400)
+        self.assertIn('not a zip file', response.json()['error'])
+        self.assertFalse(ListingImport.objects.exists())
+
+    def test_command(self):
+        path = f'{MEDIA_DIR}/listings.jsonl'
+        with open(path, 'w') as file:
+            file.write(json.dumps({'item': 'Kite', 'starting_bid': '4.00', 'category': 'Toys'}) + '\n')
+        out = StringIO()
+        call_command('import_listings', path, seller='seller', stdout=out)
+        self.assertIn('created 1 listings', out.getvalue())
+        self.assertEquals(Listing.objects.get().item, 'Kite')
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_DIR, ignore_errors=True)
@@ -0,0 +1,86 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+from auctions.models import *
+from auctions.jobs import *
+from auctions.bids import place_bid
+
+calls = []
+
+@handler('test_record')
+def record(value):
+    calls.append(value)
+
+@handler('test_fail')
+def fail():
+    raise RuntimeError('boom')
+
+class TestJobs(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueued_job_runs_once(self):
+        enqueue('test_record', value=1)
+        self.assertEquals(run_pending(), 1)
+        self.assertEquals(calls, [1])
+        # finished jobs are removed
+        self.assertFalse(Job.objects.exists())
+        self.assertEquals(run_pending(), 0)
+
+    def test_delayed_job_waits(self):
+        enqueue('test_record', delay=timedelta(minutes=1), value=1)
+        self.assertEquals(run_pending(), 0)
+
+    def test_failed_job_retried_with_backoff(self):
+        job = enqueue('test_fail')
+        with self.assertLogs('auctions.jobs', 'ERROR'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEquals(job.status, Job.PENDING)
+        self.assertEquals(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+    def test_job_fails_after_max_attempts(self):
+        job = enqueue('test_fail', max_attempts=1)
+        with self.assertLogs('auctions.jobs', 'ERROR'):
+            run_pending()
+        job.refresh_from_db()
+        self.assertEquals(job.status, Job.FAILED)
+
+    def test_expired_lease_is_reclaimed(self):
+        # a worker died while running the job
+        job = enqueue('test_record', value=2)
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, attempts=1, locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEquals(run_pending(), 1)
+        self.assertEquals(calls, [2])
+
+    def test_lost_job_fails_after_max_attempts(self):
+        # the worker died on the last attempt, without recording it
+        job = enqueue('test_record', max_attempts=5, value=4)
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, attempts=5, locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEquals(run_pending(), 0)
+        self.assertEquals(calls, [])
+        job.refresh_from_db()
+        self.assertEquals((job.status, job.attempts, job.locked_until), (Job.FAILED, 5, None))
+        self.assertIn('last attempt', job.last_error)
+
+    def test_claimed_job_not_handed_out_twice(self):
+        enqueue('test_record', value=3)
+        self.assertEquals(len(claim()), 1)
+        self.assertEquals(claim(), [])
+
+    def test_bid_notifies_watchers(self):
+        seller = User.objects.create(username='seller')
+        bidder = User.objects.create(username='bidder', email='bidder@email.com')
+        watcher = User.objects.create(username='watcher', email='watcher@email.com')
+        category = Category.objects.create(category='test category')
+        listing = Listing.objects.create(item='Item 1', starting_bid=1.00, seller=seller, category=category)
+        Watchlist.objects.create(user=watcher, listing=listing)
+        Watchlist.objects.create(user=bidder, listing=listing)
+        place_bid(listing.id, bidder, Decimal('2.00'))
+        run_pending()
+        self.assertEquals([message.to for message in mail.outbox], [['watcher@email.com']])
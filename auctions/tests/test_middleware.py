@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from auctions.models import *
+from auctions.middleware import METRICS, InstrumentationMiddleware, render_metrics
+
+class TestInstrumentation(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for metric in METRICS:
+            metric.clear()
+        self.user1 = User.objects.create(username='user1')
+        self.category1 = Category.objects.create(category='test category')
+        self.listing1 = Listing.objects.create(item='Item 1', starting_bid=1.00, seller=self.user1, category=self.category1)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('index'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries, \d+ repeated"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+
+    def test_query_count_recorded(self):
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertIn('desc="0 queries, 0 repeated"', response['Server-Timing'])
+
+    def test_repeated_statements_counted(self):
+        def n_plus_one(request):
+            for listing in Listing.objects.all():
+                Listing.objects.filter(pk=listing.pk).exists()
+                Listing.objects.filter(pk=listing.pk).exists()
+            return HttpResponse()
+        response = InstrumentationMiddleware(n_plus_one)(RequestFactory().get('/'))
+        self.assertIn('desc="3 queries, 1 repeated"', response['Server-Timing'])
+
+    @override_settings(AUCTIONS_METRICS_TOKEN='secret')
+    def test_metrics_histograms(self):
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('# TYPE auctions_request_duration_seconds histogram', body)
+        self.assertIn('auctions_request_duration_seconds_count{view="index"} 2', body)
+        self.assertIn('auctions_db_queries_bucket{view="index",le="+Inf"} 2', body)
+        # scrapes are not measured
+        self.assertNotIn('view="metrics"', body)
+
+    @override_settings(AUCTIONS_METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEquals(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEquals(response.status_code, 200)
+
+    def test_metrics_closed_without_token(self):
+        self.assertEquals(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEquals(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_metrics_added_up_across_processes(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(AUCTIONS_METRICS_DIR=directory):
+            self.client.get(reverse('index'))
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+            # another worker's registry, as written by flush_metrics
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump({
+                    'auctions_request_duration_seconds': {'index': [[0] * 10 + [1], 7.5, 1], 'search': [[1] * 11, 0.001, 1]},
+                    'auctions_duplicate_queries_total': {'index': 3},
+                }, file)
+            # left half written by a killed worker
+            with open(os.path.join(directory, '2.json'), 'w') as file:
+                file.write('{"auctions_db')
+            body = render_metrics()
+        self.assertIn('auctions_request_duration_seconds_count{view="index"} 2', body)
+        self.assertIn('auctions_request_duration_seconds_bucket{view="index",le="10.0"} 2', body)
+        self.assertIn('auctions_request_duration_seconds_count{view="search"} 1', body)
+        self.assertIn('auctions_duplicate_queries_total{view="index"} 3', body)
+        self.assertIn('auctions_db_queries_count{view="index"} 1', body)
@@ -0,0 +1,251 @@
+import json
+import os
+import tempfile
+import time
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from auctions.models import *
+from auctions.search import index_listings
+from auctions.jobs import run_pending
+from auctions import urls
+
+# seeded volume; every view is measured against a sparse and a dense case of the same shape
+LISTINGS = 10000
+HOT_BIDS = 60
+HOT_COMMENTS = 60
+HEAVY_WATCHES = 40
+# time budgets are generous defaults for a CI runner; scale them for slower machines
+TIME_SCALE = float(os.environ.get('PERF_TIME_SCALE', '1'))
+
+# url name -> (most queries, most seconds) for a cold cache. raise a query budget only
+# together with the change that needs it
+BUDGETS = {
+    'index': (2, 1.0),
+    'login': (1, 0.5),
+    'logout': (1, 0.5),
+    'register': (1, 0.5),
+    'create': (5, 0.5),
+    'listing': (6, 1.0),
+    'listing comments': (1, 0.5),
+    'listing events': (0, 0.5),
+    'watchlist': (3, 1.0),
+    'user listings': (3, 1.0),
+    'category': (2, 1.0),
+    'search': (2, 1.0),
+    'metrics': (0, 0.5),
+    'api listings': (1, 1.0),
+    'api listings batch': (1, 1.0),
+    'api listings import': (5, 0.5),
+    'api listings import status': (2, 0.5),
+    'api listing': (1, 0.5),
+    'api listing bids': (2, 0.5),
+    'api listing comments': (2, 0.5),
+    'api watchlist': (2, 1.0),
+    'api watchlist bulk': (11, 1.0),
+    'api watchlist item': (8, 0.5),
+    'api categories': (1, 0.5),
+}
+
+
+class TestQueryBudgets(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.light = User.objects.create(username='light')
+        cls.heavy = User.objects.create(username='heavy')
+        cls.sparse_category = Category.objects.create(category='sparse')
+        cls.dense_category = Category.objects.create(category='dense')
+
+        # one listing in the sparse category at a unique price, everything else in the dense one
+        cls.quiet = Listing.objects.create(item='Quiet rare item', starting_bid=Decimal('99999.00'), seller=cls.light, category=cls.sparse_category)
+        Listing.objects.bulk_create([
+            Listing(
+                item=f'Common item {i}',
+                description='A realistic description of a listed item',
+                starting_bid=Decimal('10.00') + i % 500,
+                current_price=Decimal('10.00') + i % 500,
+                seller=cls.heavy,
+                category=cls.dense_category,
+            )
+            for i in range(LISTINGS)
+        ], batch_size=1000)
+        dense = list(Listing.objects.filter(category=cls.dense_category).order_by('id'))
+        cls.hot = dense[-1]
+
+        # one bid on every other listing, and a bidding war on the hot one
+        Bid.objects.bulk_create([
+            Bid(auction=listing, bidder=cls.light, bid=listing.starting_bid + 1) for listing in dense[::2]
+        ], batch_size=1000)
+        Bid.objects.bulk_create([
+            Bid(auction=cls.hot, bidder=cls.light if i % 2 else cls.heavy, bid=cls.hot.starting_bid + i + 1)
+            for i in range(HOT_BIDS)
+        ])
+        Listing.objects.filter(pk__in=[listing.pk for listing in dense[::2]]).update(bid_count=1)
+        top = Bid.objects.filter(auction=cls.hot).order_by('-bid').first()
+        Listing.objects.filter(pk=cls.hot.pk).update(current_bid=top, current_price=top.bid, bid_count=HOT_BIDS + 1)
+
+        Comment.objects.bulk_create([
+            Comment(auction=cls.hot, author=cls.light, comment=f'Comment {i}') for i in range(HOT_COMMENTS)
+        ] + [
+            Comment(auction=listing, author=cls.heavy, comment='Is this still available?') for listing in dense[::10]
+        ], batch_size=1000)
+
+        # light watches the quiet listing and one other; heavy watches the hot one and many more
+        Watchlist.objects.create(user=cls.light, listing=cls.quiet)
+        Watchlist.objects.create(user=cls.light, listing=dense[0])
+        for listing in [cls.hot] + dense[:HEAVY_WATCHES - 1]:
+            Watchlist.objects.create(user=cls.heavy, listing=listing)
+        cls.dense_ids = [listing.id for listing in dense[:HEAVY_WATCHES]]
+
+        # search: "rare" matches one listing, "common" a full page of them
+        index_listings(Listing.objects.filter(pk__in=[cls.quiet.pk] + cls.dense_ids))
+
+    def measure(self, url, user=None, method='get', **kwargs):
+        # cold cache, so cached fragments cannot hide the queries behind a page
+        cache.clear()
+        if user:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(url, **kwargs)
+            elapsed = time.perf_counter() - start
+        self.assertLess(response.status_code, 400, url)
+        # the session lookup of a logged in client is not the view's doing
+        count = len([query for query in queries if 'django_session' not in query['sql']])
+        return count, elapsed
+
+    def assertWithinBudget(self, name, sparse, dense):
+        most_queries, most_seconds = BUDGETS[name]
+        (sparse_queries, _), (dense_queries, dense_seconds) = sparse, dense
+        self.assertEquals(dense_queries, sparse_queries, f"{name}: query count grows with the number of rows")
+        self.assertLessEqual(dense_queries, most_queries, f"{name}: {dense_queries} queries, budget {most_queries}")
+        self.assertLessEqual(dense_seconds, most_seconds * TIME_SCALE, f"{name}: {dense_seconds:.3f}s, budget {most_seconds}s")
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEquals(names - set(BUDGETS), set())
+
+    def test_index(self):
+        url = reverse('index')
+        self.assertWithinBudget('index', self.measure(url, data={'min_price': '99999'}), self.measure(url))
+
+    def test_category(self):
+        self.assertWithinBudget(
+            'category',
+            self.measure(reverse('category', args=[self.sparse_category.id])),
+            self.measure(reverse('category', args=[self.dense_category.id])),
+        )
+
+    def test_search(self):
+        url = reverse('search')
+        self.assertWithinBudget('search', self.measure(url, data={'q': 'rare'}), self.measure(url, data={'q': 'common'}))
+
+    def test_listing(self):
+        self.assertWithinBudget(
+            'listing',
+            self.measure(reverse('listing', args=[self.quiet.id]), self.light),
+            self.measure(reverse('listing', args=[self.hot.id]), self.heavy),
+        )
+
+    def test_listing_comments(self):
+        self.assertWithinBudget(
+            'listing comments',
+            self.measure(reverse('listing comments', args=[self.quiet.id])),
+            self.measure(reverse('listing comments', args=[self.hot.id])),
+        )
+
+    def test_watchlist(self):
+        url = reverse('watchlist')
+        self.assertWithinBudget('watchlist', self.measure(url, self.light), self.measure(url, self.heavy))
+
+    def test_user_listings(self):
+        url = reverse('user listings')
+        self.assertWithinBudget('user listings', self.measure(url, self.light), self.measure(url, self.heavy))
+
+    def test_api_listings(self):
+        url = reverse('api listings')
+        self.assertWithinBudget('api listings', self.measure(url, data={'min_price': '99999'}), self.measure(url))
+
+    def test_api_listings_batch(self):
+        url = reverse('api listings batch')
+        self.assertWithinBudget(
+            'api listings batch',
+            self.measure(url, data={'ids': str(self.quiet.id)}),
+            self.measure(url, data={'ids': ','.join(map(str, self.dense_ids))}),
+        )
+
+    def test_api_listing(self):
+        self.assertWithinBudget(
+            'api listing',
+            self.measure(reverse('api listing', args=[self.quiet.id])),
+            self.measure(reverse('api listing', args=[self.hot.id])),
+        )
+
+    def test_api_listing_bids(self):
+        self.assertWithinBudget(
+            'api listing bids',
+            self.measure(reverse('api listing bids', args=[self.quiet.id])),
+            self.measure(reverse('api listing bids', args=[self.hot.id])),
+        )
+
+    def test_api_listing_comments(self):
+        self.assertWithinBudget(
+            'api listing comments',
+            self.measure(reverse('api listing comments', args=[self.quiet.id])),
+            self.measure(reverse('api listing comments', args=[self.hot.id])),
+        )
+
+    def test_api_watchlist(self):
+        url = reverse('api watchlist')
+        self.assertWithinBudget('api watchlist', self.measure(url, self.light), self.measure(url, self.heavy))
+
+    def test_api_watchlist_bulk(self):
+        url = reverse('api watchlist bulk')
+        def bulk(ids):
+            body = json.dumps({'add': ids, 'remove': []})
+            return self.measure(url, self.light, 'post', data=body, content_type='application/json')
+        # kept below the size at which sqlite splits the pair inserts into batches
+        self.assertWithinBudget('api watchlist bulk', bulk(self.dense_ids[1:2]), bulk(self.dense_ids[2:12]))
+
+    def test_api_listings_import(self):
+        url = reverse('api listings import')
+        def upload(count):
+            rows = ''.join(f'Imported item {i},A listing from a catalog,5.00,dense\n' for i in range(count))
+            data = {'file': SimpleUploadedFile('listings.csv', f'item,description,starting_bid,category\n{rows}'.encode())}
+            return self.measure(url, self.light, 'post', data=data)
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            # the rows are imported by the worker, the request only stores the file
+            self.assertWithinBudget('api listings import', upload(1), upload(5000))
+            run_pending()
+            status = [reverse('api listings import status', args=[importing.id]) for importing in ListingImport.objects.order_by('id')]
+            self.assertWithinBudget('api listings import status', self.measure(status[0], self.light), self.measure(status[1], self.light))
+
+    def test_api_watchlist_item(self):
+        self.assertWithinBudget(
+            'api watchlist item',
+            self.measure(reverse('api watchlist item', args=[self.quiet.id]), self.light, 'delete'),
+            self.measure(reverse('api watchlist item', args=[self.hot.id]), self.heavy, 'delete'),
+        )
+
+    def test_static_pages(self):
+        for name, user in (('login', None), ('register', None), ('create', self.light), ('logout', self.light),
+                           ('api categories', None)):
+            with self.subTest(name):
+                queries, seconds = self.measure(reverse(name), user)
+                self.assertWithinBudget(name, (queries, seconds), (queries, seconds))
+
+    @override_settings(AUCTIONS_METRICS_TOKEN='secret')
+    def test_metrics(self):
+        measured = self.measure(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertWithinBudget('metrics', measured, measured)
+
+    def test_listing_events(self):
+        measured = self.measure(reverse('listing events', args=[self.hot.id]))
+        self.assertWithinBudget('listing events', measured, measured)
@@ -0,0 +1,76 @@
+from django.test import TestCase
+from auctions.models import *
+from auctions.recommendations import *
+
+class TestRecommendations(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.user3 = User.objects.create(username='user3')
+        self.category1 = Category.objects.create(category='test category')
+        self.listings = [
+            Listing.objects.create(item=f'Item {i}', starting_bid=1.00, seller=self.user1, category=self.category1)
+            for i in range(4)
+        ]
+
+    def watch(self, user, *indexes):
+        for i in indexes:
+            Watchlist.objects.create(user=user, listing=self.listings[i])
+
+    def pairs(self):
+        return {(row.listing_id, row.other_id): row.watchers for row in SharedWatch.objects.all()}
+
+    def test_watch_creates_pairs_both_ways(self):
+        self.watch(self.user1, 0, 1)
+        self.assertEquals(self.pairs(), {
+            (self.listings[0].id, self.listings[1].id): 1,
+            (self.listings[1].id, self.listings[0].id): 1,
+        })
+
+    def test_watchers_counted_per_user(self):
+        self.watch(self.user1, 0, 1)
+        self.watch(self.user2, 0, 1)
+        self.assertEquals(self.pairs()[(self.listings[0].id, self.listings[1].id)], 2)
+
+    def test_unwatch_decrements_and_removes_pairs(self):
+        self.watch(self.user1, 0, 1)
+        self.watch(self.user2, 0, 1)
+        Watchlist.objects.filter(user=self.user1, listing=self.listings[1]).delete()
+        self.assertEquals(self.pairs()[(self.listings[0].id, self.listings[1].id)], 1)
+        Watchlist.objects.filter(user=self.user2, listing=self.listings[0]).delete()
+        self.assertEquals(self.pairs(), {})
+
+    def test_deleting_a_user_removes_their_pairs(self):
+        self.watch(self.user3, 0, 1, 2)
+        self.watch(self.user2, 0, 1)
+        self.user3.delete()
+        self.assertEquals(self.pairs(), {
+            (self.listings[0].id, self.listings[1].id): 1,
+            (self.listings[1].id, self.listings[0].id): 1,
+        })
+        SharedWatch.objects.all().delete()
+        rebuild()
+        self.assertEquals(len(self.pairs()), 2)
+
+    def test_rebuild_matches_incremental(self):
+        self.watch(self.user1, 0, 1, 2)
+        self.watch(self.user2, 0, 2)
+        self.watch(self.user3, 3)
+        incremental = self.pairs()
+        SharedWatch.objects.all().delete()
+        self.assertEquals(rebuild(batch_size=2), len(incremental))
+        self.assertEquals(self.pairs(), incremental)
+
+    def test_similar_listings_ranked_in_one_query(self):
+        self.watch(self.user1, 0, 1, 2)
+        self.watch(self.user2, 0, 2)
+        with self.assertNumQueries(1):
+            similar = similar_listings(self.listings[0])
+            [str(listing.category) for listing in similar]
+        self.assertEquals(similar, [self.listings[2], self.listings[1]])
+
+    def test_similar_listings_skip_already_watched(self):
+        self.watch(self.user1, 0, 1, 2)
+        self.watch(self.user2, 0, 2)
+        self.assertEquals(similar_listings(self.listings[0], self.user2), [self.listings[1]])
@@ -0,0 +1,77 @@
+import time
+from decimal import Decimal
+from django.db import router
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from auctions.models import *
+from auctions.replicas import *
+from auctions import categories
+
+def routed(request):
+    return HttpResponse(','.join(router.db_for_read(model) for model in (Listing, Category, User)))
+
+@override_settings(DATABASE_REPLICAS=['replica'], AUCTIONS_REPLICA_STICKY_SECONDS=10)
+class TestReplicaRouting(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.view = replica_reads(routed)
+
+    def test_safe_reads_go_to_the_replica(self):
+        response = self.view(self.factory.get('/'))
+        # users never come from a replica
+        self.assertEquals(response.content, b'replica,replica,default')
+
+    def test_writes_and_undecorated_reads_go_to_the_primary(self):
+        self.assertEquals(self.view(self.factory.post('/')).content, b'default,default,default')
+        self.assertEquals(routed(self.factory.get('/')).content, b'default,default,default')
+        with reading_replica(self.factory.get('/')):
+            self.assertEquals(router.db_for_write(Listing), 'default')
+
+    def test_pinned_client_reads_the_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = str(time.time() + 5)
+        self.assertEquals(self.view(request).content, b'default,default,default')
+        # an expired pin no longer applies
+        request.COOKIES[STICKY_COOKIE] = str(time.time() - 1)
+        self.assertEquals(self.view(request).content, b'replica,replica,default')
+
+    def test_replica_fills_are_cached_briefly(self):
+        self.assertEquals(cache_timeout(3600), 3600)
+        with reading_replica(self.factory.get('/')):
+            self.assertEquals(cache_timeout(3600), 10)
+            self.assertEquals(cache_timeout(None), 10)
+
+    def test_writes_pin_the_client(self):
+        user = User.objects.create(username='bidder')
+        seller = User.objects.create(username='seller')
+        category = Category.objects.create(category='Toys')
+        listing = Listing.objects.create(item='Item', starting_bid=Decimal('1.00'), seller=seller, category=category)
+        self.client.force_login(user)
+        response = self.client.post(reverse('listing', args=[listing.id]), {'button': 'comment', 'comment': 'Hi', 'auction': listing.id, 'author': user.id})
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEquals(cookie['max-age'], 10)
+        self.assertGreater(float(cookie.value), time.time())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        # the pin still keeps stale cached pages from the writer
+        response = self.client.post(reverse('login'), {'username': 'x', 'password': 'y'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEquals(self.view(self.factory.get('/')).content, b'default,default,default')
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class TestReplicaViews(TestCase):
+    # the primary stands in for a replica, the pages must work the same
+
+    def test_browse_pages(self):
+        categories._local = (None, None)
+        category = Category.objects.create(category='Toys')
+        seller = User.objects.create(username='seller')
+        listing = Listing.objects.create(item='Item', starting_bid=Decimal('1.00'), seller=seller, category=category)
+        for url in (reverse('index'), reverse('category', args=[category.id]), reverse('listing', args=[listing.id])):
+            with self.subTest(url):
+                self.assertEquals(self.client.get(url).status_code, 200)
+        # a category list read from the replica is not kept in process
+        self.assertEquals(categories._local, (None, None))
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.urls import reverse
+from auctions.models import *
+from auctions.search import *
+
+class TestSearch(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.category1 = Category.objects.create(category='Toys')
+        self.category2 = Category.objects.create(category='Home')
+        self.train = Listing.objects.create(
+            item='Wooden train set',
+            description='Hand painted engine and carriages',
+            starting_bid=10.00,
+            seller=self.user1,
+            category=self.category1
+        )
+        self.pan = Listing.objects.create(
+            item='Cast iron pan',
+            description='Great for a train journey breakfast',
+            starting_bid=20.00,
+            seller=self.user1,
+            category=self.category2
+        )
+
+    def test_tokenize(self):
+        self.assertEquals(tokenize('Wooden, TRAIN-set!'), ['wooden', 'train', 'set'])
+
+    def test_title_match_ranks_first(self):
+        self.assertEquals(list(search_listings('train').order_by('-rank', '-id')), [self.train, self.pan])
+
+    def test_prefix_match(self):
+        self.assertEquals(list(search_listings('wood')), [self.train])
+
+    def test_all_terms_required(self):
+        self.assertEquals(list(search_listings('train breakfast')), [self.pan])
+
+    def test_filters(self):
+        self.assertEquals(list(search_listings('train', category=self.category2.id)), [self.pan])
+        self.pan.closed = True
+        self.pan.save(update_fields=['closed'])
+        self.assertEquals(list(search_listings('train', status=OPEN)), [self.train])
+        self.assertEquals(list(search_listings('train', status=CLOSED)), [self.pan])
+
+    def test_empty_query(self):
+        self.assertEquals(list(search_listings('  ')), [])
+
+    def test_index_follows_edits(self):
+        self.train.item = 'Steam locomotive'
+        self.train.save()
+        self.assertEquals(list(search_listings('wooden')), [])
+        self.assertEquals(list(search_listings('locomotive')), [self.train])
+
+    def test_search_GET(self):
+        response = self.client.get(reverse('search'), {'q': 'train'})
+        self.assertEquals(response.status_code, 200)
+        self.assertTemplateUsed(response, 'auctions/search.html')
+        self.assertEquals(response.context['listings'], [self.train, self.pan])
+
+    def test_search_GET_without_terms(self):
+        # the navbar box submits an empty q; relevance is the default sort
+        for query in ('', '!!'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('search'), {'q': query})
+                self.assertEquals(response.status_code, 200)
+                self.assertEquals(response.context['listings'], [])
+
+    def test_ranked_results_paginate(self):
+        from auctions.feeds import listing_feed
+        first = listing_feed(search_listings('train'), page_size=1, ordering=('-rank', '-id'))
+        second = listing_feed(search_listings('train'), first.next_cursor, page_size=1, ordering=('-rank', '-id'))
+        self.assertEquals(first.items + second.items, [self.train, self.pan])
+        self.assertFalse(second.has_next)
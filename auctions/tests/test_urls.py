@@ -28,6 +28,14 @@ class TestUrls(SimpleTestCase):
         url = reverse('listing', args=[1])
         self.assertEquals(resolve(url).func, listing)
 
+    def test_listing_comments_url_resolves(self):
+        url = reverse('listing comments', args=[1])
+        self.assertEquals(resolve(url).func, listing_comments)
+
+    def test_listing_events_url_resolves(self):
+        url = reverse('listing events', args=[1])
+        self.assertEquals(resolve(url).func, listing_events)
+
     def test_watchlist_url_resolves(self):
         url = reverse('watchlist')
         self.assertEquals(resolve(url).func, watchlist)
@@ -38,4 +46,8 @@ class TestUrls(SimpleTestCase):
 
     def test_category_url_resolves(self):
         url = reverse('category', args=[0])
-        self.assertEquals(resolve(url).func, search_category)
\ No newline at end of file
+        self.assertEquals(resolve(url).func, search_category)
+
+    def test_search_url_resolves(self):
+        url = reverse('search')
+        self.assertEquals(resolve(url).func, search)
\ No newline at end of file
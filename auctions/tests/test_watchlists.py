@@ -0,0 +1,81 @@
+import json
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from auctions.models import *
+from auctions.recommendations import rebuild
+from auctions.watchlists import bulk_update, _insert_watches
+
+class TestWatchlists(TestCase):
+
+    def setUp(self):
+        self.user1 = User.objects.create(username='user1')
+        self.user2 = User.objects.create(username='user2')
+        self.category1 = Category.objects.create(category='test category')
+        self.listings = [
+            Listing.objects.create(item=f'Item {i}', starting_bid=1.00, seller=self.user1, category=self.category1)
+            for i in range(4)
+        ]
+        self.ids = [listing.id for listing in self.listings]
+
+    def pairs(self):
+        return {(row.listing_id, row.other_id): row.watchers for row in SharedWatch.objects.all()}
+
+    def assertPairsMatchRebuild(self):
+        incremental = self.pairs()
+        SharedWatch.objects.all().delete()
+        rebuild()
+        self.assertEquals(self.pairs(), incremental)
+
+    def test_duplicate_watch_rejected(self):
+        Watchlist.objects.create(user=self.user1, listing=self.listings[0])
+        with self.assertRaises(IntegrityError):
+            Watchlist.objects.create(user=self.user1, listing=self.listings[0])
+
+    def test_bulk_add_and_remove(self):
+        Watchlist.objects.create(user=self.user1, listing=self.listings[0])
+        added, removed = bulk_update(self.user1, add=self.ids[1:3] + [999], remove=[self.ids[0], self.ids[3]])
+        self.assertEquals((added, removed), (self.ids[1:3], [self.ids[0]]))
+        self.assertEquals(set(self.user1.watchlist.values_list('listing_id', flat=True)), set(self.ids[1:3]))
+
+    def test_bulk_changes_keep_pairs_consistent(self):
+        Watchlist.objects.create(user=self.user2, listing=self.listings[0])
+        bulk_update(self.user1, add=self.ids)
+        bulk_update(self.user2, add=self.ids[1:3])
+        self.assertPairsMatchRebuild()
+        bulk_update(self.user1, remove=self.ids[:3])
+        self.assertPairsMatchRebuild()
+
+    def test_rows_inserted_by_another_request_are_not_counted(self):
+        # a row a concurrent request added after this one looked is not reported as inserted
+        Watchlist.objects.bulk_create([Watchlist(user=self.user1, listing=self.listings[0])])
+        self.assertEquals(_insert_watches(self.user1, set(self.ids[:2])), {self.ids[1]})
+        self.assertEquals(self.user1.watchlist.count(), 2)
+
+    def test_bulk_update_query_count_is_constant(self):
+        bulk_update(self.user1, add=self.ids[:2])
+        bulk_update(self.user2, add=self.ids[:2])
+        with CaptureQueriesContext(connection) as one:
+            bulk_update(self.user1, add=self.ids[2:3], remove=self.ids[:1])
+        with self.assertNumQueries(len(one.captured_queries)):
+            bulk_update(self.user2, add=self.ids[2:], remove=self.ids[:2])
+
+    def test_bulk_endpoint(self):
+        self.client.force_login(self.user1)
+        response = self.client.post(reverse('api watchlist bulk'), json.dumps({'add': self.ids[:2], 'remove': []}), content_type='application/json')
+        self.assertEquals(response.json(), {'added': self.ids[:2], 'removed': []})
+        response = self.client.post(reverse('api watchlist bulk'), json.dumps({'add': 'all'}), content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+
+    def test_watchlist_page_query_count_does_not_grow(self):
+        self.client.force_login(self.user1)
+        bulk_update(self.user1, add=self.ids[:1])
+        # the first request also fills the category cache
+        self.client.get(reverse('watchlist'))
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('watchlist'))
+        bulk_update(self.user1, add=self.ids)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get(reverse('watchlist'))
+        self.assertEquals(len(response.context['listings']), 4)
@@ -2,7 +2,7 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 
-from . import views
+from . import views, api
 
 urlpatterns = [
     path("", views.index, name="index"),
@@ -11,7 +11,22 @@ urlpatterns = [
     path("register", views.register, name="register"),
     path("create", views.create, name="create"),
     path("listing/<int:listing_id>", views.listing, name="listing"),
+    path("listing/<int:listing_id>/comments", views.listing_comments, name="listing comments"),
+    path("listing/<int:listing_id>/events", views.listing_events, name="listing events"),
     path("watchlist", views.watchlist, name="watchlist"),
     path("my_listings", views.user_listings, name="user listings"),
     path("category/<int:category_id>", views.search_category, name="category"),
+    path("search", views.search, name="search"),
+    path("metrics", views.metrics, name="metrics"),
+    path("api/listings", api.listings, name="api listings"),
+    path("api/listings/batch", api.listings_batch, name="api listings batch"),
+    path("api/listings/import", api.listings_import, name="api listings import"),
+    path("api/listings/import/<int:import_id>", api.listings_import_status, name="api listings import status"),
+    path("api/listings/<int:listing_id>", api.listing, name="api listing"),
+    path("api/listings/<int:listing_id>/bids", api.listing_bids, name="api listing bids"),
+    path("api/listings/<int:listing_id>/comments", api.listing_comments, name="api listing comments"),
+    path("api/watchlist", api.watchlist, name="api watchlist"),
+    path("api/watchlist/bulk", api.watchlist_bulk, name="api watchlist bulk"),
+    path("api/watchlist/<int:listing_id>", api.watchlist_item, name="api watchlist item"),
+    path("api/categories", api.category_list, name="api categories"),
 ]
@@ -1,29 +1,57 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.http import urlencode
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from django.db import IntegrityError
 
 from .models import *
 from .forms import *
+from .feeds import listing_feed, alisting_feed, comment_feed
+from .fragments import listing_body, alisting_body, acard_grid
+from .categories import get_categories
+from .bids import place_bid
+from .closing import close_auction
+from .recommendations import similar_listings, asimilar_listings
+from .search import search_listings
+from .browse import parse_browse, SEARCH_SORTS
+from .middleware import render_metrics
+from .replicas import replica_reads
+from .conditional import conditional_page
+from . import events
+
+# async views: the read paths run on the event loop under ASGI. request.user, the templates
+# (context processors) and the cached fragment builders are sync and run in a thread
+
+async def get_user(request):
+    # the signed in user, or None; loading request.user reads the session and user tables
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+
+async def render_async(request, template, context):
+    return await sync_to_async(render)(request, template, context)
+
+def async_login_required(view):
+    # login_required for async views
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if await get_user(request) is None:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
 
 # function that retrieves 3 similarly watched items "Users who watched this also watched __"
 def get_shared_watched_items(user, listing):
-    # get list of users that aren't current user AND watch this listing
-    users_watching_listing = Watchlist.objects.filter(listing=listing).exclude(user=user)
-    users = []
-    for watched_listing in users_watching_listing:
-        users.append(watched_listing.user.id)
-    # get distinct list of watchlist items that are watched by these users, excluding this listing
-    # limit list of listings to 3 results
-    other_watched_listings = Watchlist.objects.filter(user__in=users).exclude(listing=listing).distinct('listing')
-    listings = []
-    for other_listing in other_watched_listings:
-        if len(listings) < 3:
-            listings.append(other_listing.listing)
-    return listings
+    # read from the precomputed shared watch table, skipping items the user already watches
+    return similar_listings(listing, user)
 
 def check_if_watched(user, listing):
     return user.watchlist.filter(listing = listing)
@@ -40,9 +68,45 @@ def check_if_winner(user, listing):
         pass
     return False
 
-def listing(request, listing_id):
-    listing = Listing.objects.get(pk=listing_id)
-    comments = Comment.objects.filter(auction=listing)
+def listing_context(body, watched, seller, winner):
+    listing = body["listing"]
+    return {
+        "listing": listing,
+        "comments": body["comments"],
+        "comments_cursor": body["comments_cursor"],
+        "bid_form": NewBidForm(),
+        "watch_form": NewWatchForm(),
+        "comment_form": NewCommentForm(),
+        "watched": watched,
+        "seller": seller,
+        "closed": listing.closed,
+        "winner": winner
+    }
+
+@conditional_page('listing', lambda kwargs: kwargs['listing_id'], anonymous_only=True)
+@replica_reads
+async def listing(request, listing_id):
+    # bids, comments, watches and closing are handled by the sync view
+    if request.method == "POST":
+        return await sync_to_async(update_listing)(request, listing_id)
+
+    # shared listing data comes from the fragment cache, only the per-user state is queried
+    body = await alisting_body(listing_id)
+    listing = body["listing"]
+    user = await get_user(request)
+    if user is not None:
+        watched = await user.watchlist.filter(listing = listing).aexists()
+        # the seller and the current bidder are joined into the cached listing
+        context = listing_context(body, watched, check_if_seller(user, listing), check_if_winner(user, listing))
+        if watched:
+            context["listings"] = await asimilar_listings(listing, user)
+    else:
+        context = listing_context(body, False, False, False)
+    return await render_async(request, "auctions/listing.html", context)
+
+def update_listing(request, listing_id):
+    body = listing_body(listing_id)
+    listing = body["listing"]
     # if logged in
     if request.user.is_authenticated:
         user = request.user
@@ -56,17 +120,7 @@ def listing(request, listing_id):
         winner = False
 
     # set common context
-    context = {
-        "listing": listing,
-        "comments": comments,
-        "bid_form": NewBidForm(),
-        "watch_form": NewWatchForm(),
-        "comment_form": NewCommentForm(),
-        "watched": watched,
-        "seller": seller,
-        "closed": listing.closed,
-        "winner": winner
-    }
+    context = listing_context(body, watched, seller, winner)
 
     # add similar watched items if watched
     if watched:
@@ -77,14 +131,13 @@ def listing(request, listing_id):
 
         # close auction functionality for seller only
         if request.POST.get("button") == "Close" and seller:
-            listing.closed = True
-            listing.save()
+            close_auction(listing)
 
         # watch item functionality
         elif request.POST.get("button") == "Watchlist":
             if not watched:
-                # create a watch item
-                Watchlist.objects.create(
+                # create a watch item, a double click finds the one the first click made
+                Watchlist.objects.get_or_create(
                     user = user,
                     listing = listing
                 )
@@ -96,27 +149,18 @@ def listing(request, listing_id):
         elif request.POST.get("button") == "comment":
             form = NewCommentForm(request.POST)
             if form.is_valid():
-                form.save()
+                comment = form.save()
+                events.publish(listing.id, 'comment', author=str(comment.author), comment=comment.comment)
 
         # bid functionality
         else:
             form = NewBidForm(request.POST)
             if form.is_valid():
-                # retrieve bid data
-                new_bid_amt = form.cleaned_data['bid']
-                # bid checks: bid must be greater than starting and current bid
-                if (new_bid_amt > listing.starting_bid):
-                    if (new_bid_amt > listing.get_current_bid()):
-                        # save bid 
-                        new_bid = form.save()
-                        # set current bid to the new saved bid
-                        listing.current_bid = new_bid
-                        listing.save()
-                        return HttpResponseRedirect(reverse('listing', args=[listing_id]))
-                    else:
-                        context["bid_error"] = "Bid must exceed current"
-                else:
-                    context["bid_error"] = "Bid must exceed starting bid and current bid"
+                # validate and commit the bid in a single transaction
+                result = place_bid(listing.id, user, form.cleaned_data['bid'])
+                if result.accepted:
+                    return HttpResponseRedirect(reverse('listing', args=[listing_id]))
+                context["bid_error"] = result.message
 
             # handling of invalid form
             else:
@@ -130,48 +174,119 @@ def listing(request, listing_id):
 
 
     # if POST but not logged in
-    elif request.method == 'POST':
+    else:
         context["error"] = "You must be logged in"
 
-    # return method for GET request or POST (not logged in)
+    # return method for POST (not logged in)
     return render(request, "auctions/listing.html", context)
 
-def index(request):
-    listings = Listing.objects.all()
+# further pages of a listing's comments, loaded by the "Older comments" button
+def listing_comments(request, listing_id):
+    page = comment_feed(listing_id, request.GET.get("cursor"))
     context = {
-        "listings": listings,
+        "comments": page.items,
+        "comments_cursor": page.next_cursor,
+        "listing_id": listing_id
+    }
+    # a bare fragment: skip the context processors the full pages need
+    return HttpResponse(render_to_string("auctions/comments.html", context))
+
+# prometheus text exposition of the request histograms kept by the instrumentation middleware.
+# closed until AUCTIONS_METRICS_TOKEN is configured
+def metrics(request):
+    token = settings.AUCTIONS_METRICS_TOKEN
+    if not token or not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
+
+# live updates are streamed by the ASGI app (auctions.events); when serving over WSGI
+# answer 204 so browsers stop reconnecting
+def listing_events(request, listing_id):
+    return HttpResponse(status=204)
+
+@conditional_page('catalog')
+@replica_reads
+async def index(request):
+    browse, browse_form = parse_browse(request.GET)
+    grid = await acard_grid("catalog", "", Listing.objects.all(), request.GET.get("cursor"), browse)
+    context = {
+        "cards": grid["html"],
+        "listings": grid.get("listings"),
+        "next_cursor": grid["next_cursor"],
+        "browse_form": browse_form,
+        "page_params": browse.params,
         "title": "Active Listings"
     }
-    return render(request, "auctions/index.html", context)
+    return await render_async(request, "auctions/index.html", context)
 
-def search_category(request, category_id):
-    listings = Listing.objects.filter(category = category_id)
-    category = str(Category.objects.get(id = category_id))
+@conditional_page('category', lambda kwargs: kwargs['category_id'])
+@replica_reads
+async def search_category(request, category_id):
+    # the category name comes from the cached navigation list
+    category = next((c for c in await sync_to_async(get_categories)() if c.id == category_id), None)
+    if category is None:
+        category = await Category.objects.aget(id = category_id)
+    browse, browse_form = parse_browse(request.GET)
+    grid = await acard_grid("category", category_id, Listing.objects.filter(category = category_id), request.GET.get("cursor"), browse)
     context = {
-        "listings": listings,
+        "cards": grid["html"],
+        "listings": grid.get("listings"),
+        "next_cursor": grid["next_cursor"],
+        "browse_form": browse_form,
+        "page_params": browse.params,
         "title": f"Category: {category}"
     }
-    return render(request, "auctions/index.html", context)
+    return await render_async(request, "auctions/index.html", context)
 
-@login_required
-def watchlist(request):
+def search(request):
+    query = request.GET.get("q", "").strip()
+    category = request.GET.get("category", "")
+    if not category.isdigit():
+        category = ""
+    browse, browse_form = parse_browse(request.GET, SEARCH_SORTS)
+    results = browse.apply(search_listings(query, category=category or None))
+    page = listing_feed(results, request.GET.get("cursor"), ordering=browse.ordering)
+    page_params = urlencode({"q": query, "category": category})
+    if browse.params:
+        page_params += "&" + browse.params
+    context = {
+        "listings": page.items,
+        "next_cursor": page.next_cursor,
+        "page_params": page_params,
+        "browse_form": browse_form,
+        "query": query,
+        "category": category,
+        "title": f'Search: "{query}"'
+    }
+    return render(request, "auctions/search.html", context)
+
+@async_login_required
+async def watchlist(request):
     user = request.user
-    watched_items = Watchlist.objects.filter(user_id = user)
-    listings = []
-    for i in watched_items:
-        listings.append(i.listing)
+    # join through the watchlist instead of dereferencing each watch row,
+    # (user, listing) is unique so the join yields each listing once
+    watched_listings = Listing.objects.filter(watchlist__user = user.pk)
+    browse, browse_form = parse_browse(request.GET)
+    page = await alisting_feed(browse.apply(watched_listings), request.GET.get("cursor"), ordering=browse.ordering)
     context = {
-        "listings": listings,
+        "listings": page.items,
+        "next_cursor": page.next_cursor,
+        "browse_form": browse_form,
+        "page_params": browse.params,
         "title": "Watched Items"
     }
-    return render(request, "auctions/index.html", context)
+    return await render_async(request, "auctions/index.html", context)
 
 @login_required
 def user_listings(request):
     user = request.user
-    user_listings = Listing.objects.filter(seller = user)
+    browse, browse_form = parse_browse(request.GET)
+    page = listing_feed(browse.apply(Listing.objects.filter(seller = user)), request.GET.get("cursor"), ordering=browse.ordering)
     context = {
-        "user_listings": user_listings
+        "user_listings": page.items,
+        "next_cursor": page.next_cursor,
+        "browse_form": browse_form,
+        "page_params": browse.params
     }
     return render(request, "auctions/user_listings.html", context)
 
@@ -0,0 +1,45 @@
+from django.db import connection, transaction
+
+from .models import Listing, Watchlist
+from . import recommendations
+
+# most listings a single bulk request may add or remove
+BULK_LIMIT = 500
+
+
+def _insert_watches(user, listing_ids):
+    # inserts the missing watch rows and returns the listing ids of the rows this call created.
+    # the unique (user, listing) constraint skips rows a concurrent request inserted first;
+    # those were counted in the shared watch pairs by that request and must not be again
+    if not listing_ids:
+        return set()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {connection.ops.quote_name(Watchlist._meta.db_table)} (user_id, listing_id) '
+                'SELECT %s, unnest(%s) ON CONFLICT (user_id, listing_id) DO NOTHING RETURNING listing_id',
+                [user.id, sorted(listing_ids)]
+            )
+            return {row[0] for row in cursor.fetchall()}
+    # the other databases used here allow one writer at a time, so the rows missing inside
+    # this transaction are exactly the rows it inserts
+    existing = set(user.watchlist.filter(listing__in=listing_ids).values_list('listing_id', flat=True))
+    inserted = set(listing_ids) - existing
+    Watchlist.objects.bulk_create([Watchlist(user=user, listing_id=listing_id) for listing_id in inserted], ignore_conflicts=True)
+    return inserted
+
+
+def bulk_update(user, add=(), remove=()):
+    # set-based watchlist change: one insert for the additions and one delete for the removals.
+    # ids in both lists cancel out, unknown listings are ignored. returns (added, removed) ids
+    add, remove = set(add), set(remove)
+    add, remove = add - remove, remove - add
+    with transaction.atomic(), recommendations.batch():
+        added = _insert_watches(user, set(Listing.objects.filter(pk__in=add).values_list('id', flat=True)))
+        removed = set(user.watchlist.filter(listing__in=remove).values_list('listing_id', flat=True))
+        user.watchlist.filter(listing__in=removed).delete()
+        if added:
+            recommendations.record_watches(user.id, added)
+        if removed:
+            recommendations.remove_watches(user.id, removed)
+    return sorted(added), sorted(removed)
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# live listing updates (server-sent events) are served next to the Django app
+from auctions.events import with_listing_events
+
+application = with_listing_events(django_application)
@@ -0,0 +1,57 @@
+"""
+Gunicorn settings, used as ``gunicorn -c commerce/gunicorn.py``.
+
+GUNICORN_PROFILE picks the deployment:
+
+- ``wsgi`` (default): sync workers serving ``commerce.wsgi``, the deployment before the
+  async views. Live listing events are not streamed; pages fall back to reloading.
+- ``asgi``: uvicorn workers serving ``commerce.asgi``. Async views run on each worker's
+  event loop, so a slow query holds a coroutine instead of the whole worker, and live
+  listing events are streamed. Switch once ``manage.py bench_deployments`` shows it ahead
+  on the production database.
+
+WEB_CONCURRENCY sets the number of worker processes and PORT the port, as usual, under
+either profile. With more than one asgi worker, set REDIS_URL: without it live listing
+events only reach subscribers of the worker that published them.
+
+The wsgi profile keeps database connections open between requests (CONN_MAX_AGE). The asgi
+profile opens one per request; put a pooler such as pgbouncer in front of the database to
+keep that cheap.
+
+The workers write their request metrics to AUCTIONS_METRICS_DIR, a fresh directory for each
+server unless one is given, and ``/metrics`` adds them up.
+"""
+
+import os
+import tempfile
+
+profile = os.environ.get('GUNICORN_PROFILE', 'wsgi')
+
+if profile == 'asgi':
+    wsgi_app = 'commerce.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'commerce.wsgi:application'
+    worker_class = 'sync'
+    # one thread per worker, so a persistent connection is one per worker too
+    os.environ.setdefault('CONN_MAX_AGE', '500')
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# idle keep-alive connections from the router or load balancer
+keepalive = 5
+# sync workers are killed after this many seconds on one request; uvicorn workers only
+# have to answer the heartbeat, so event streams may stay open longer
+timeout = 30
+graceful_timeout = 30
+
+# set before the workers are forked, they read it with the rest of the settings
+os.environ.setdefault('AUCTIONS_METRICS_DIR', os.path.join(tempfile.gettempdir(), f'auctions-metrics-{os.getpid()}'))
+
+
+def on_starting(server):
+    # counts left by an earlier run of the server would be added to this one's
+    directory = os.environ['AUCTIONS_METRICS_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.json.tmp')):
+            os.remove(os.path.join(directory, name))
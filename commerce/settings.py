@@ -44,8 +44,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auctions.middleware.InstrumentationMiddleware',
+    'auctions.replicas.sticky_writes',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'auctions.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -91,8 +93,53 @@ DATABASES = {
 }
 
 import dj_database_url
-db_from_env = dj_database_url.config(conn_max_age=500)
+# connections are re-used across requests for CONN_MAX_AGE seconds and checked before each
+# request so a connection dropped by the server or a pooler is replaced. a persistent connection
+# belongs to the thread that opened it, which suits sync workers only: under ASGI the sync code of
+# every request runs on a thread of its own and each would keep a connection open until the
+# database runs out. so the default is a connection per request, commerce/gunicorn.py turns
+# persistence on for its wsgi profile, and the asgi profile should reach the database through
+# a transaction pooler such as pgbouncer (DATABASE_URL pointing at the pooler) to keep connecting cheap
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 0))
+db_from_env = dj_database_url.config(conn_max_age=CONN_MAX_AGE)
 DATABASES['default'].update(db_from_env)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# read replicas, as comma separated urls, become the aliases replica_0, replica_1, ...
+# safe reads of the browse views go to one of them (auctions.replicas)
+DATABASE_REPLICAS = []
+for i, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES[f'replica_{i}'] = dict(
+        dj_database_url.parse(url.strip(), conn_max_age=CONN_MAX_AGE),
+        CONN_HEALTH_CHECKS=True,
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(f'replica_{i}')
+
+DATABASE_ROUTERS = ['auctions.replicas.ReplicaRouter']
+
+# seconds a client reads only from the primary, and is never served stale cached pages,
+# after writing. at least the replication lag
+AUCTIONS_REPLICA_STICKY_SECONDS = int(os.environ.get('AUCTIONS_REPLICA_STICKY_SECONDS', 10))
+
+# Cache
+# a shared redis cache when REDIS_URL is set, otherwise a per-process in-memory stand-in
+# (development, tests). keys are prefixed per deployment and versioned, so bumping
+# CACHE_VERSION orphans every entry at once after an incompatible change
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache' if os.environ.get('REDIS_URL')
+                   else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'auctions'),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'commerce'),
+        'VERSION': int(os.environ.get('CACHE_VERSION', 1)),
+        'TIMEOUT': 300,
+    }
+}
+
+# sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
 AUTH_USER_MODEL = 'auctions.User'
 
@@ -141,4 +188,37 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Email, sent by the background notification jobs
+# https://docs.djangoproject.com/en/3.0/topics/email/
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'auctions@localhost')
+
+
+# Live listing events
+# dotted path of the broker fanning bid, close and comment events out to subscribers.
+# with REDIS_URL set, events go through redis pub/sub and reach every web worker, also
+# when the clock or job worker publishes them. without it they stay in the publishing
+# process, so only subscribers on the same web worker see them: set REDIS_URL whenever the
+# asgi profile runs more than one worker (commerce/gunicorn.py)
+
+AUCTIONS_EVENT_REDIS_URL = os.environ.get('REDIS_URL', '')
+AUCTIONS_EVENT_BROKER = os.environ.get(
+    'AUCTIONS_EVENT_BROKER',
+    'auctions.events.RedisBroker' if AUCTIONS_EVENT_REDIS_URL else 'auctions.events.InProcessBroker'
+)
+
+
+# Instrumentation
+# the /metrics endpoint requires "Authorization: Bearer <token>" and is closed while no token is set
+
+AUCTIONS_METRICS_TOKEN = os.environ.get('AUCTIONS_METRICS_TOKEN', '')
+
+# a directory shared by the worker processes of one server, so /metrics reports all of them
+# and not only the worker that answered the scrape. commerce/gunicorn.py sets one up
+
+AUCTIONS_METRICS_DIR = os.environ.get('AUCTIONS_METRICS_DIR', '')
\ No newline at end of file